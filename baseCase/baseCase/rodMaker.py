@@ -1,49 +1,195 @@
-######### This script helps you in the creation of a blockMeshDict for 
+######### This script helps you in the creation of a blockMeshDict for
 ######### a 1D or 2D (r-z). The 2D rod can have discrete pellets or a smeared
-######### column. The script reads the input from a file named 
+######### column. The script reads the input from a file named
 ######### 'rodDict', which should be placed in the same folder
 ######### as this script. Read the comment section on the input file for more
 ######### information about how the rod is modeled.
+#########
+######### The script can also be imported: makeRodMesh builds the mesh
+######### description of a rodDict in memory (vertices as NumPy arrays) and
+######### writeBlockMeshDict writes it in a single write. writeRodMeshes
+######### writes the meshes of many rodDicts (e.g. the geometries of a
+######### parametric sweep) in one process, building the topology shared by
+######### rods that only differ in their dimensions once.
 
 import math
 from collections import defaultdict
+import io
 import os
 import re
 
-# importing the module 
-import ast 
+import numpy as np
+
+# Write the polyMesh of 1D and 2Dsmeared rods directly instead of running
+# blockMesh on the blockMeshDict. Off until the direct polyMesh has been
+# compared with the blockMesh output (benchmarks/check_polymesh.py)
+writePolyMeshDirectly = False
+
+# importing the module
+import ast
+
+# Vertices of each kind of section, in the order blockMesh indexes them.
+# Each vertex is given by the name of its radius, its wedge side (-1 for the
+# front side, 1 for the back side) and the name of its height
+hexVertices = [
+    ('rInner', -1, 'bottom'), ('rOuter', -1, 'bottom'),
+    ('rOuter',  1, 'bottom'), ('rInner',  1, 'bottom'),
+    ('rInner', -1, 'top'), ('rOuter', -1, 'top'),
+    ('rOuter',  1, 'top'), ('rInner',  1, 'top'),
+]
+
+dishVertices = [
+    ('rInner', -1, 'dishBottom'), ('rDish', -1, 'bottom'),
+    ('rDish',   1, 'bottom'), ('rInner',  1, 'dishBottom'),
+    ('rInner', -1, 'dishTop'), ('rDish', -1, 'top'),
+    ('rDish',   1, 'top'), ('rInner',  1, 'dishTop'),
+]
+
+landVertices = [
+    ('rLand', -1, 'bottom'), ('rLand', 1, 'bottom'),
+    ('rLand', -1, 'top'), ('rLand', 1, 'top'),
+]
+
+chamferVertices = [
+    ('rOuter', -1, 'chamferBottom'), ('rOuter', 1, 'chamferBottom'),
+    ('rOuter', -1, 'chamferTop'), ('rOuter', 1, 'chamferTop'),
+]
+
+pelletVertices = {
+    'flat': hexVertices,
+    'chamfered': [(r.replace('rOuter', 'rLand'), side, h) for r, side, h in hexVertices] + chamferVertices,
+    'dished': dishVertices + landVertices,
+    'dishedChamfered': dishVertices + landVertices + chamferVertices,
+}
+
+capVertices = [
+    ('axis',    1, 'bottom'), ('rInner', -1, 'bottom'),
+    ('rInner',  1, 'bottom'), ('axis',    1, 'bottom'),
+    ('axis',    1, 'top'), ('rInner', -1, 'top'),
+    ('rInner',  1, 'top'), ('axis',    1, 'top'),
+    ('rOuter', -1, 'bottom'), ('rOuter', 1, 'bottom'),
+    ('rOuter', -1, 'top'), ('rOuter', 1, 'top'),
+]
+
+# Faces of a hex block or cell (x min, x max, y min, y max, z min, z max),
+# oriented outward as in the hex cell model of OpenFOAM
+hexFaces = [[0, 4, 7, 3], [1, 2, 6, 5], [0, 1, 5, 4], [3, 7, 6, 2], [0, 3, 2, 1], [4, 5, 6, 7]]
+
+# Hex blocks of each kind of section, as local vertex indices
+innerHex = [0, 1, 2, 3, 4, 5, 6, 7]
+middleHex = [1, 8, 9, 2, 5, 10, 11, 6]
+outerHex = [8, 12, 13, 9, 10, 14, 15, 11]
+
+# Entries of the rodDict that only set the coordinates of the vertices.
+# Rods that differ only in these entries (and not in the kinds of pellets and
+# caps they have) share the same blocks, patches and polyMesh faces
+coordinateEntries = [
+    'wedgeAngle', 'convertToMeters',
+    'rInnerFuel', 'rOuterFuel', 'rInnerClad', 'rOuterClad',
+    'heightFuel', 'heightClad', 'offsetFuel', 'offsetClad',
+    'bottomCapHeight', 'topCapHeight',
+    'rDishFuel', 'chamferWidth', 'rCurvatureDish', 'heightChamferFuel',
+]
 
 def readRodDict(inputFile="rodDict"):
-    # Reading the data from the rodDict file 
-    with open(inputFile) as f: 
-        data = f.read()       
-    # Reconstructing the data as a dictionary 
-    return ast.literal_eval(data) 
+    # Reading the data from the rodDict file
+    with open(inputFile) as f:
+        data = f.read()
+    # Reconstructing the data as a dictionary
+    return ast.literal_eval(data)
+
+def topologyKey(rodDict):
+    # Key of the topology of a rod: the entries that are not coordinates,
+    # plus the parts of the coordinate entries that select blocks and patches
+    # (kinds of pellets, hollow fuel blocks, caps)
+    entries = {name: value for name, value in rodDict.items() if name not in coordinateEntries}
+    pelletTypes = []
+    if rodDict['geometryType'] == '2Ddiscrete':
+        pelletTypes = [getPelletType(rodDict, i) for i in range(rodDict['nBlocksFuel'])]
+    hollowFuel = [r > 0.0 for r in rodDict['rInnerFuel']]
+    caps = [rodDict['bottomCapHeight'] > 0, rodDict['topCapHeight'] > 0]
+    return repr((sorted(entries.items()), pelletTypes, hollowFuel, caps))
+
+def rodTopology(rodDict):
+    # Blocks, patches and mergePatchPairs of a rod, shared by every rod with
+    # the same topologyKey. sectionText caches the text of the blockMeshDict
+    # sections that depend only on them
+    patchDict = defaultdict(list)
+    mergePatchDict = defaultdict(list)
+    startIndex = collectFuelPatches(rodDict, patchDict, mergePatchDict, 0)
+    collectCladPatches(rodDict, patchDict, mergePatchDict, startIndex)
+
+    return {
+        'blocks': rodBlocks(rodDict),
+        'patches': patchDict,
+        'mergePatchPairs': mergePatchDict,
+        'sectionText': {},
+    }
+
+def makeRodMesh(rodDict, topology=None):
+    # Build the mesh description of a rod:
+    # -vertices: one (nSections, nVertices, 3) array per block
+    # -blocks: one (hex vertex indices, zone name, number of cells) per block
+    # -edges: one (arc end vertex indices, arc points) per dished fuel block
+    # -patches and mergePatchPairs: as collected by collectFuelPatches and
+    #  collectCladPatches
+    # The topology (see rodTopology) can be given to reuse it across rods
+    if topology is None:
+        topology = rodTopology(rodDict)
+
+    return dict(
+        topology,
+        convertToMeters=rodDict['convertToMeters'],
+        vertices=rodVertices(rodDict),
+        edges=rodEdges(rodDict),
+    )
+
+def meshPoints(mesh):
+    # All vertices of a mesh description as one (nVertices, 3) array
+    return np.concatenate([section.reshape(-1, 3) for section in mesh['vertices']])
+
+def topologySectionText(mesh, writeSection):
+    # Text of a section that only depends on the topology, written once per
+    # topology shared by several meshes
+    sectionText = mesh.setdefault('sectionText', {})
+    if writeSection.__name__ not in sectionText:
+        file = io.StringIO()
+        writeSection(file, mesh)
+        sectionText[writeSection.__name__] = file.getvalue()
+    return sectionText[writeSection.__name__]
+
+def blockMeshDictText(mesh):
+    # Serialize a mesh description into an in-memory buffer
+    file = io.StringIO()
+    writeHeader(file)
+    writeConvertToMeters(file, mesh['convertToMeters'])
+    writeVerticesSection(file, mesh)
+    file.write(topologySectionText(mesh, writeBlockSection))
+    writeEdgeSection(file, mesh)
+    file.write(topologySectionText(mesh, writePatchSection))
+    return file.getvalue()
 
 def writeBlockMeshDict(rodDict, outputFile="blockMeshDict"):
+    text = blockMeshDictText(makeRodMesh(rodDict))
     with open(outputFile, "w") as file:
-        writeHeader(file)
-        writeConvertToMeters(file, rodDict['convertToMeters'])
-        writeVerticesSection(file, rodDict)
-        writeBlockSection(file, rodDict)
-        writeEdgeSection(file, rodDict)
-        writePatchSection(file, rodDict)
-
-def writeHeader(file):
+        file.write(text)
+
+def writeHeader(file, className="dictionary", objectName="blockMeshDict", entries=()):
     header = [
         "/*--------------------------------*- C++ -*----------------------------------*\\",
         "| ========                 |                                                 |",
-        "| \      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |",
-        "|  \    /   O peration     | Version:  5.0                                   |",
-        "|   \  /    A nd           | Web:      www.OpenFOAM.org                      |",
-        "|    \/     M anipulation  |                                                 |",
-        "\*---------------------------------------------------------------------------*/",
+        "| \\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |",
+        "|  \\    /   O peration     | Version:  5.0                                   |",
+        "|   \\  /    A nd           | Web:      www.OpenFOAM.org                      |",
+        "|    \\/     M anipulation  |                                                 |",
+        "\\*---------------------------------------------------------------------------*/",
         "FoamFile",
         "{",
         "    version     9.0;",
         "    format      ascii;",
-        "    class       dictionary;",
-        "    object      blockMeshDict;",
+        "    class       " + className + ";",
+        *["    " + entry + ";" for entry in entries],
+        "    object      " + objectName + ";",
         "}",
         "// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //"
     ]
@@ -52,11 +198,70 @@ def writeHeader(file):
 def writeConvertToMeters(file, convertToMeters):
     file.write(f"\nconvertToMeters {convertToMeters}; \n\n")
 
+def getPelletType(rodDict, i):
+    rDish = rodDict['rDishFuel'][i]
+    wCham = rodDict['chamferWidth'][i]
+
+    if rDish > 0.0 and wCham > 0.0:
+        return 'dishedChamfered'
+    elif rDish > 0.0:
+        return 'dished'
+    elif wCham > 0.0:
+        return 'chamfered'
+    else:
+        return 'flat'
+
+def getDishHeight(rodDict, i):
+    # Calculate height of dish based on curvature radius
+    angleDish = math.acos(rodDict['rDishFuel'][i]/rodDict['rCurvatureDish'][i])
+    return rodDict['rCurvatureDish'][i]*(1 - math.sin(angleDish))
+
+def sectionOffsets(offset, height, n):
+    # Bottom offsets of n stacked sections, and the offset above the last one
+    offsets = np.cumsum(np.concatenate(([float(offset)], np.full(n, float(height)))))
+    return offsets[:-1], offsets[-1]
+
+def sectionHeights(offsets, height, hDish=0.0, hChamfer=0.0):
+    height = float(height)
+    return {
+        'bottom': offsets,
+        'top': offsets + height,
+        'dishBottom': offsets + hDish,
+        'dishTop': offsets - hDish + height,
+        'chamferBottom': offsets + hChamfer,
+        'chamferTop': offsets + height - hChamfer,
+    }
+
+def wedgeFactors(wedgeAngle):
+    wedgeAngleDegree = float(wedgeAngle)
+    wedgeAngleRadiant = wedgeAngleDegree/180*math.pi
+
+    # Correction for wedge volume
+    # Relevant only for large wedge angles
+    sinAngle = math.sin(wedgeAngleRadiant/2)
+    cosAngle = math.cos(wedgeAngleRadiant/2)
+    correction = math.sqrt(sinAngle/(wedgeAngleRadiant/2))
+    return sinAngle, cosAngle, correction
+
+def sectionVertices(vertices, wedgeAngle, radii, heights):
+    # Vertices of n sections of the same kind, vectorized over the sections
+    sinAngle, cosAngle, correction = wedgeFactors(wedgeAngle)
+    points = np.empty((len(heights['bottom']), len(vertices), 3))
+
+    for j, (radius, side, height) in enumerate(vertices):
+        r = float(radii[radius])
+        points[:, j, 0] = r*cosAngle*correction
+        points[:, j, 1] = side*(r*sinAngle*correction)
+        points[:, j, 2] = heights[height]
+
+    return points
+
 # Vertices section
-def writeVerticesSection(file, rodDict):
-    file.write("vertices \n(\n")
+def rodVertices(rodDict):
+    vertices = []
+    wedgeAngle = rodDict['wedgeAngle']
 
-    # Write fuel vertices
+    # Fuel vertices
     offset  = rodDict['offsetFuel']
     for i in range(rodDict['nBlocksFuel']):
 
@@ -64,657 +269,249 @@ def writeVerticesSection(file, rodDict):
         if rodDict['geometryType'] == '2Ddiscrete':
             n = rodDict['nPelletsFuel'][i]
 
-        rIn  = rodDict['rInnerFuel'][i]
-        rOut = rodDict['rOuterFuel'][i]
-        h    = rodDict['heightFuel'][i]/(n)
+        radii = {'rInner': rodDict['rInnerFuel'][i], 'rOuter': rodDict['rOuterFuel'][i]}
+        h = rodDict['heightFuel'][i]/(n)
+        offsets, offset = sectionOffsets(offset, h, n)
 
         if(rodDict['geometryType'] == '2Ddiscrete'):
-            rDish = rodDict['rDishFuel'][i]
-            hChamfer = rodDict['heightChamferFuel'][i]
-            wCham = rodDict['chamferWidth'][i]
-            rCurvature = rodDict['rCurvatureDish'][i]
-
-            # Calculate height of dish based on curvature radius
-            angleDish = math.acos(rDish/rCurvature)
-            hDish = rCurvature*(1 - math.sin(angleDish))
-            
-            rLand = rOut
-            pelletType = 'flat'
-
-            if rDish > 0.0 and wCham > 0.0:
-                pelletType = 'dishedChamfered'
-                rLand = rOut - wCham
-            elif rDish > 0.0:
-                pelletType = 'dished'
-                rLand = rOut
-            elif wCham > 0.0:
-                pelletType = 'chamfered'                        
-                rLand = rOut - wCham
-            else:
-                pelletType = 'flat'                        
-                rLand = rOut
-
-            for sectionI in range(n):
-                writePelletVertices(pelletType, rodDict['wedgeAngle'], rIn, rDish, hDish, rLand, hChamfer, rOut, h, offset, file)
-                offset = offset + h
+            pelletType = getPelletType(rodDict, i)
+            radii['rDish'] = rodDict['rDishFuel'][i]
+            radii['rLand'] = radii['rOuter']
+            if pelletType in ['chamfered', 'dishedChamfered']:
+                radii['rLand'] = radii['rOuter'] - rodDict['chamferWidth'][i]
+
+            heights = sectionHeights(offsets, h, getDishHeight(rodDict, i), rodDict['heightChamferFuel'][i])
+            vertices.append(sectionVertices(pelletVertices[pelletType], wedgeAngle, radii, heights))
         else:
-            for sectionI in range(n):
-                writeVertices(rodDict['wedgeAngle'], rIn, rOut, h, offset, file) 
-                offset = offset + h     
+            vertices.append(sectionVertices(hexVertices, wedgeAngle, radii, sectionHeights(offsets, h)))
 
-    # Write clad vertices
-    offset  = rodDict['offsetClad']   
+    # Clad vertices
+    offset  = rodDict['offsetClad']
+    nBlocksClad = rodDict['nBlocksClad']
 
     # Adjust if bottom cap is present
     if(rodDict['bottomCapHeight'] > 0):
-        rIn  = rodDict['rInnerClad'][0]
-        rOut = rodDict['rOuterClad'][0]
-        h    = rodDict['bottomCapHeight']
+        radii = {'axis': 0.0, 'rInner': rodDict['rInnerClad'][0], 'rOuter': rodDict['rOuterClad'][0]}
+        h = rodDict['bottomCapHeight']
 
         offset -= float(rodDict['bottomCapHeight'])
-        writeCapVertices(rodDict['wedgeAngle'], rIn, rOut, h, offset, file)
-        offset = offset + h    
+        offsets, offset = sectionOffsets(offset, h, 1)
+        vertices.append(sectionVertices(capVertices, wedgeAngle, radii, sectionHeights(offsets, h)))
 
-    # Write clad verices between caps (if present)
-    for i in range(rodDict['nBlocksClad']):    
-        rIn  = rodDict['rInnerClad'][i]
-        rOut = rodDict['rOuterClad'][i]
-        h    = rodDict['heightClad'][i]
+    # Clad vertices between caps (if present)
+    for i in range(nBlocksClad):
+        radii = {'rInner': rodDict['rInnerClad'][i], 'rOuter': rodDict['rOuterClad'][i]}
+        h = rodDict['heightClad'][i]
 
-        writeVertices(rodDict['wedgeAngle'], rIn, rOut, h, offset, file)
-        offset = offset + h
+        offsets, offset = sectionOffsets(offset, h, 1)
+        vertices.append(sectionVertices(hexVertices, wedgeAngle, radii, sectionHeights(offsets, h)))
 
-    # Adjust if bottom cap is present
+    # Adjust if top cap is present
     if(rodDict['topCapHeight'] > 0):
-        rIn  = rodDict['rInnerClad'][rodDict['nBlocksClad']-1]
-        rOut = rodDict['rOuterClad'][rodDict['nBlocksClad']-1]
-        h    = rodDict['topCapHeight']
-
-        writeCapVertices(rodDict['wedgeAngle'], rIn, rOut, h, offset, file)
-        offset = offset + h
-
-    file.write(");\n\n")
-
-def writeVertices(wedgeAngle, rInner, rOuter, height, offset, file):
-    
-    #### Prepare input data ####
-    wedgeAngleDegree = float(wedgeAngle)
-    wedgeAngleRadiant = wedgeAngleDegree/180*math.pi
-    rInner = float(rInner)
-    rOuter = float(rOuter)
-    height = float(height)
-    offset = float(offset)
-
-    # Prepare list of points
-    pointList = []
+        radii = {'axis': 0.0, 'rInner': rodDict['rInnerClad'][nBlocksClad-1], 'rOuter': rodDict['rOuterClad'][nBlocksClad-1]}
+        h = rodDict['topCapHeight']
 
-    # Correction for wedge volume
-    # Relevant only for large wedge angles
-    sinAngle = math.sin(wedgeAngleRadiant/2)
-    cosAngle = math.cos(wedgeAngleRadiant/2)
-    correction = math.sqrt(sinAngle/(wedgeAngleRadiant/2))
+        offsets, offset = sectionOffsets(offset, h, 1)
+        vertices.append(sectionVertices(capVertices, wedgeAngle, radii, sectionHeights(offsets, h)))
 
-    # Coordinates for vertices
-    rInnerX = rInner*cosAngle*correction
-    rInnerY = rInner*sinAngle*correction
-    rOuterX = rOuter*cosAngle*correction
-    rOuterY = rOuter*sinAngle*correction
-
-    # Define block vertices for each block        
-    pointList.append([rInnerX, -rInnerY, offset])
-    pointList.append([rOuterX, -rOuterY, offset])
-    pointList.append([rOuterX,  rOuterY, offset])
-    pointList.append([rInnerX,  rInnerY, offset])
-
-    pointList.append([rInnerX, -rInnerY, offset + height])
-    pointList.append([rOuterX, -rOuterY, offset + height])
-    pointList.append([rOuterX,  rOuterY, offset + height])
-    pointList.append([rInnerX,  rInnerY, offset + height])
-
-    # Write fuel vertices
-    numberPoints = len(pointList)
-    for i in range(numberPoints):
-        newLine = "    (" 
-        newLine += str(pointList[i][0]) + " "
-        newLine += str(pointList[i][1]) + " " 
-        newLine += str(pointList[i][2]) + ")" 
-        newLine += "\n"
-    
-        file.write(newLine)
+    return vertices
 
-    file.write("\n")
+def numberStrings(values):
+    # str() of every value of an int64 or float64 array, as an object array.
+    # Each distinct value is formatted once; float values are compared by
+    # their bits to keep the sign of -0.0
+    bits, inverse = np.unique(values.view(np.int64), return_inverse=True)
+    strings = np.array([str(v) for v in bits.view(values.dtype).tolist()], dtype=object)
+    return strings[inverse.reshape(values.shape)]
 
-def writePelletVertices(pelletType, wedgeAngle, rInner, rDish, hDish, rLand, hChamfer, rOuter, height, offset, file):
-    
-    #### Prepare input data ####
-    wedgeAngleDegree = float(wedgeAngle)
-    wedgeAngleRadiant = wedgeAngleDegree/180*math.pi
-    rInner = float(rInner)
-    rOuter = float(rOuter)
-    height = float(height)
-    offset = float(offset)
+def joinColumns(strings):
+    # Join the strings along the last axis with spaces
+    line = strings[..., 0]
+    for j in range(1, strings.shape[-1]):
+        line = line + " " + strings[..., j]
+    return line
 
-    # Prepare list of points
-    pointList = []
+def writeVerticesSection(file, mesh):
+    lines = ["vertices \n(\n"]
 
-    # Correction for wedge volume
-    # Relevant only for large wedge angles
-    sinAngle = math.sin(wedgeAngleRadiant/2)
-    cosAngle = math.cos(wedgeAngleRadiant/2)
-    correction = math.sqrt(sinAngle/(wedgeAngleRadiant/2))
-
-    # Coordinates for vertices
-    rInnerX = rInner*cosAngle*correction
-    rInnerY = rInner*sinAngle*correction
-    rDishX = rDish*cosAngle*correction
-    rDishY = rDish*sinAngle*correction
-    rLandX = rLand*cosAngle*correction
-    rLandY = rLand*sinAngle*correction
-    rOuterX = rOuter*cosAngle*correction
-    rOuterY = rOuter*sinAngle*correction
-
-    if pelletType == 'dishedChamfered':
-        # Define block vertices for each block        
-        pointList.append([rInnerX, -rInnerY, offset + hDish])
-        pointList.append([rDishX, -rDishY, offset])
-        pointList.append([rDishX,  rDishY, offset])
-        pointList.append([rInnerX,  rInnerY, offset + hDish])
-
-        pointList.append([rInnerX, -rInnerY, offset - hDish + height])
-        pointList.append([rDishX, -rDishY, offset + height])
-        pointList.append([rDishX,  rDishY, offset + height])
-        pointList.append([rInnerX,  rInnerY, offset - hDish + height])
-
-        pointList.append([rLandX, -rLandY, offset])
-        pointList.append([rLandX,  rLandY, offset])
-
-        pointList.append([rLandX, -rLandY, offset + height])
-        pointList.append([rLandX,  rLandY, offset + height])
-
-        pointList.append([rOuterX, -rOuterY, offset + hChamfer])
-        pointList.append([rOuterX,  rOuterY, offset + hChamfer])
-
-        pointList.append([rOuterX, -rOuterY, offset + height - hChamfer])
-        pointList.append([rOuterX,  rOuterY, offset + height - hChamfer])
-
-    elif pelletType == 'dished':
-        # Define block vertices for each block        
-        pointList.append([rInnerX, -rInnerY, offset + hDish])
-        pointList.append([rDishX, -rDishY, offset])
-        pointList.append([rDishX,  rDishY, offset])
-        pointList.append([rInnerX,  rInnerY, offset + hDish])
-
-        pointList.append([rInnerX, -rInnerY, offset - hDish + height])
-        pointList.append([rDishX, -rDishY, offset + height])
-        pointList.append([rDishX,  rDishY, offset + height])
-        pointList.append([rInnerX,  rInnerY, offset - hDish + height])
-
-        pointList.append([rOuterX, -rOuterY, offset])
-        pointList.append([rOuterX,  rOuterY, offset])
-
-        pointList.append([rOuterX, -rOuterY, offset + height])
-        pointList.append([rOuterX,  rOuterY, offset + height])
-
-    elif pelletType == 'chamfered':  
-        # Define block vertices for each block        
-        pointList.append([rInnerX, -rInnerY, offset])
-        pointList.append([rLandX, -rLandY, offset])
-        pointList.append([rLandX,  rLandY, offset])
-        pointList.append([rInnerX,  rInnerY, offset])
-
-        pointList.append([rInnerX, -rInnerY, offset + height])
-        pointList.append([rLandX, -rLandY, offset + height])
-        pointList.append([rLandX,  rLandY, offset + height])
-        pointList.append([rInnerX,  rInnerY, offset + height])
-
-        pointList.append([rOuterX, -rOuterY, offset + hChamfer])
-        pointList.append([rOuterX,  rOuterY, offset + hChamfer])
-
-        pointList.append([rOuterX, -rOuterY, offset + height - hChamfer])
-        pointList.append([rOuterX,  rOuterY, offset + height - hChamfer])
-
-    elif pelletType == 'flat':  
-        # Define block vertices for each block        
-        pointList.append([rInnerX, -rInnerY, offset])
-        pointList.append([rOuterX, -rOuterY, offset])
-        pointList.append([rOuterX,  rOuterY, offset])
-        pointList.append([rInnerX,  rInnerY, offset])
-
-        pointList.append([rInnerX, -rInnerY, offset + height])
-        pointList.append([rOuterX, -rOuterY, offset + height])
-        pointList.append([rOuterX,  rOuterY, offset + height])
-        pointList.append([rInnerX,  rInnerY, offset + height])
-
-    # Write fuel vertices
-    numberPoints = len(pointList)
-    for i in range(numberPoints):
-        newLine = "    (" 
-        newLine += str(pointList[i][0]) + " "
-        newLine += str(pointList[i][1]) + " " 
-        newLine += str(pointList[i][2]) + ")" 
-        newLine += "\n"
-    
-        file.write(newLine)
-
-    file.write("\n")
-
-def writeCapVertices(wedgeAngle, rInner, rOuter, height, offset, file):
-    
-    #### Prepare input data ####
-    wedgeAngleDegree = float(wedgeAngle)
-    wedgeAngleRadiant = wedgeAngleDegree/180*math.pi
-    rInner = float(rInner)
-    rOuter = float(rOuter)
-    height = float(height)
-    offset = float(offset)
+    # A blank line after the vertices of each section
+    for sections in mesh['vertices']:
+        sectionLines = "    (" + joinColumns(numberStrings(sections)) + ")\n"
+        sectionLines[:, -1] += "\n"
+        lines.extend(sectionLines.ravel().tolist())
 
-    # Prepare list of points
-    pointList = []
+    lines.append(");\n\n")
+    file.write("".join(lines))
 
-    # Correction for wedge volume
-    # Relevant only for large wedge angles
-    sinAngle = math.sin(wedgeAngleRadiant/2)
-    cosAngle = math.cos(wedgeAngleRadiant/2)
-    correction = math.sqrt(sinAngle/(wedgeAngleRadiant/2))
-
-    # Coordinates for vertices
-    rInnerX = rInner*cosAngle*correction
-    rInnerY = rInner*sinAngle*correction
-    rOuterX = rOuter*cosAngle*correction
-    rOuterY = rOuter*sinAngle*correction
-
-    # Define block vertices for each block        
-    pointList.append([0, 0, offset])
-    pointList.append([rInnerX, -rInnerY, offset])
-    pointList.append([rInnerX,  rInnerY, offset])
-    pointList.append([0,  0, offset])
-
-    pointList.append([0, 0, offset + height])
-    pointList.append([rInnerX, -rInnerY, offset + height])
-    pointList.append([rInnerX,  rInnerY, offset + height])
-    pointList.append([0,  0, offset + height])
-
-    # pointList.append([rInnerX, -rInnerY, offset])
-    pointList.append([rOuterX, -rOuterY, offset])
-    pointList.append([rOuterX,  rOuterY, offset])
-    # pointList.append([rInnerX,  rInnerY, offset])
-
-    # pointList.append([rInnerX, -rInnerY, offset + height])
-    pointList.append([rOuterX, -rOuterY, offset + height])
-    pointList.append([rOuterX,  rOuterY, offset + height])
-    # pointList.append([rInnerX,  rInnerY, offset + height])
-
-    # Write fuel vertices
-    numberPoints = len(pointList)
-    for i in range(numberPoints):
-        newLine = "    (" 
-        newLine += str(pointList[i][0]) + " "
-        newLine += str(pointList[i][1]) + " " 
-        newLine += str(pointList[i][2]) + ")" 
-        newLine += "\n"
-    
-        file.write(newLine)
-
-    file.write("\n")
-    
 # Block section
-def writeBlockSection(file, rodDict):
-    
-    # Write fuel blocks
+def sectionBlocks(startIndex, hexes, zoneName, cells, n, nVertices):
+    # Hex blocks of n consecutive sections with nVertices vertices each
+    starts = startIndex + nVertices*np.arange(n)
+    indices = (starts[:, None, None] + np.array(hexes)[None]).reshape(-1, 8)
+    return (indices, zoneName, np.tile(cells, (n, 1))), startIndex + n*nVertices
+
+def rodBlocks(rodDict):
+    blocks = []
     startIndex = 0
-    file.write("blocks \n(\n")
 
+    # Fuel blocks
     for i in range(rodDict['nBlocksFuel']):
 
         meshR = rodDict['nCellsRFuel'][i]
-        meshZ = rodDict['nCellsZFuel'][i] 
+        meshZ = rodDict['nCellsZFuel'][i]
         name = rodDict['blockNameFuel'][i]
 
-        n = 1
-        if rodDict['geometryType'] == '2Ddiscrete':
-            n = rodDict['nPelletsFuel'][i]
-
         if(rodDict['geometryType'] == '2Ddiscrete'):
-            meshDishR = rodDict['nCellsRDish'][i] 
-            meshLandR = rodDict['nCellsRLand'][i] 
-            meshChamferR = rodDict['nCellsRChamfer'][i] 
+            n = rodDict['nPelletsFuel'][i]
+            meshDishR = rodDict['nCellsRDish'][i]
+            meshLandR = rodDict['nCellsRLand'][i]
+            meshChamferR = rodDict['nCellsRChamfer'][i]
 
-            rDish = rodDict['rDishFuel'][i]
-            wCham = rodDict['chamferWidth'][i]
-            pelletType = 'flat'
-            if rDish > 0.0 and wCham > 0.0:
-                pelletType = 'dishedChamfered'
-            elif rDish > 0.0:
-                pelletType = 'dished'
-            elif wCham > 0.0:
-                pelletType = 'chamfered'   
+            pelletType = getPelletType(rodDict, i)
+            if pelletType == 'flat':
+                hexes, cells = [innerHex], [[meshLandR, 1, meshZ]]
+            elif pelletType == 'chamfered':
+                hexes, cells = [innerHex, middleHex], [[meshLandR, 1, meshZ], [meshChamferR, 1, meshZ]]
+            elif pelletType == 'dished':
+                hexes, cells = [innerHex, middleHex], [[meshDishR, 1, meshZ], [meshLandR, 1, meshZ]]
             else:
-                pelletType = 'flat'       
-
-            for sectionI in range(n):
-                writePelletBlock(pelletType, startIndex, name, meshDishR, meshLandR, meshChamferR, meshZ, file)
-                if pelletType == 'dishedChamfered':
-                    startIndex += 16
-                elif pelletType == 'flat':
-                    startIndex += 8
-                else:
-                    startIndex += 12
+                hexes = [innerHex, middleHex, outerHex]
+                cells = [[meshDishR, 1, meshZ], [meshLandR, 1, meshZ], [meshChamferR, 1, meshZ]]
 
+            block, startIndex = sectionBlocks(startIndex, hexes, name, cells, n, len(pelletVertices[pelletType]))
         else:
-            for sectionI in range(n):
-                writeBlock(startIndex, name, meshR, meshZ, file)
-                startIndex += 8
-        
+            block, startIndex = sectionBlocks(startIndex, [innerHex], name, [[meshR, 1, meshZ]], 1, 8)
+        blocks.append(block)
+
     # Adjust if bottom cap is present
     if(rodDict['bottomCapHeight'] > 0):
-        meshR = rodDict['nCellsRClad'][0] 
+        meshR = rodDict['nCellsRClad'][0]
         meshRInnerPart = rodDict['nCellsRBottomCap']
         meshZ = rodDict['nCellsZBottomCap']
-        name = rodDict['blockNameClad'][0] 
+        name = rodDict['blockNameClad'][0]
 
-        writeCapBlock(startIndex, name, meshR, meshRInnerPart, meshZ, file)
-        startIndex += 12
+        cells = [[meshRInnerPart, 1, meshZ], [meshR, 1, meshZ]]
+        block, startIndex = sectionBlocks(startIndex, [innerHex, middleHex], name, cells, 1, 12)
+        blocks.append(block)
 
-    # Write clad blocks between caps
+    # Clad blocks between caps
     for i in range(rodDict['nBlocksClad']):
-        meshR = rodDict['nCellsRClad'][i] 
-        meshZ = rodDict['nCellsZClad'][i] 
+        meshR = rodDict['nCellsRClad'][i]
+        meshZ = rodDict['nCellsZClad'][i]
         name = rodDict['blockNameClad'][i]
-        
-        writeBlock(startIndex, name, meshR, meshZ, file)
-        startIndex += 8
 
-    # Adjust if bottom cap is present
+        block, startIndex = sectionBlocks(startIndex, [innerHex], name, [[meshR, 1, meshZ]], 1, 8)
+        blocks.append(block)
+
+    # Adjust if top cap is present
     if(rodDict['topCapHeight'] > 0):
-        meshR = rodDict['nCellsRClad'][rodDict['nBlocksClad']-1] 
+        meshR = rodDict['nCellsRClad'][rodDict['nBlocksClad']-1]
         meshRInnerPart = rodDict['nCellsRTopCap']
         meshZ = rodDict['nCellsZTopCap']
-        name = rodDict['blockNameClad'][rodDict['nBlocksClad']-1] 
-
-        writeCapBlock(startIndex, name, meshR, meshRInnerPart, meshZ, file)
-        startIndex += 12
-
-    file.write(");\n\n")    
-
-def writeBlock(startIndex, zoneName, meshX, meshZ, file):
-
-    index = startIndex
-    newLine = "    hex ( " 
-
-    for i in range(8):
-        newLine += str(index) + " "
-        index += 1
+        name = rodDict['blockNameClad'][rodDict['nBlocksClad']-1]
 
-    newLine += ") " + str(zoneName) + " ("
-    newLine +=  str(meshX) + " 1 " + str(meshZ) 
-    newLine += ") simpleGrading (1 1 1)"
+        cells = [[meshRInnerPart, 1, meshZ], [meshR, 1, meshZ]]
+        block, startIndex = sectionBlocks(startIndex, [innerHex, middleHex], name, cells, 1, 12)
+        blocks.append(block)
 
-    file.write(newLine + "\n")
-
-def writePelletBlock(pelletType, startIndex, zoneName, meshDishX, meshLandX, meshChamferX, meshZ, file):
-
-    index = startIndex
-    newLine = "    hex ( " 
-
-    # First block - only block for flat pellet
-    for i in range(8):
-        newLine += str(index) + " "
-        index += 1
-
-    newLine += ") " + str(zoneName) + " ("
-    if pelletType == 'flat' or pelletType == 'chamfered':
-        newLine +=  str(meshLandX) + " 1 " + str(meshZ) 
-    else:
-        newLine +=  str(meshDishX) + " 1 " + str(meshZ) 
-    newLine += ") simpleGrading (1 1 1)"
+    return blocks
 
-    file.write(newLine + "\n")
+def writeBlockSection(file, mesh):
+    lines = ["blocks \n(\n"]
 
-    if not(pelletType == 'flat'):
-        # Write land or chamfer piece depending on pellet type
-        index = startIndex
-        newLine = "    hex ( " 
+    for indices, zoneName, cells in mesh['blocks']:
+        blockLines = "    hex ( " + joinColumns(numberStrings(indices)) + " ) " + str(zoneName)
+        blockLines = blockLines + " (" + joinColumns(numberStrings(cells)) + ") simpleGrading (1 1 1)\n"
+        lines.extend(blockLines.tolist())
 
-        newLine += str(index+1) + " "
-        newLine += str(index+8) + " "
-        newLine += str(index+9) + " "
-        newLine += str(index+2) + " "
-
-        newLine += str(index+5) + " "
-        newLine += str(index+10) + " "
-        newLine += str(index+11) + " "
-        newLine += str(index+6) + " "
-
-        newLine += ") " + str(zoneName) + " ("
-        if pelletType == 'chamfered':
-            newLine +=  str(meshChamferX) + " 1 " + str(meshZ) 
-        else:
-            newLine +=  str(meshLandX) + " 1 " + str(meshZ) 
-        newLine += ") simpleGrading (1 1 1)"
-
-        file.write(newLine + "\n")
-
-    if pelletType == 'dishedChamfered':
-        # Write chamfer piece
-        index = startIndex
-        newLine = "    hex ( " 
-
-        newLine += str(index+8) + " "
-        newLine += str(index+12) + " "
-        newLine += str(index+13) + " "
-        newLine += str(index+9) + " "
-
-        newLine += str(index+10) + " "
-        newLine += str(index+14) + " "
-        newLine += str(index+15) + " "
-        newLine += str(index+11) + " "
-
-        newLine += ") " + str(zoneName) + " ("
-        newLine +=  str(meshChamferX) + " 1 " + str(meshZ) 
-        newLine += ") simpleGrading (1 1 1)"
-
-        file.write(newLine + "\n")
-        
-def writeCapBlock(startIndex, zoneName, meshX, meshXInnerPart, meshZ, file):
-
-    index = startIndex
-    newLine = "    hex ( " 
-
-    for i in range(8):
-        newLine += str(index) + " "
-        index += 1
-
-    newLine += ") " + str(zoneName) + " ("
-    newLine +=  str(meshXInnerPart) + " 1 " + str(meshZ) 
-    newLine += ") simpleGrading (1 1 1)"
-
-    file.write(newLine + "\n")
-
-    # Write second piece
-    index = startIndex
-    newLine = "    hex ( " 
-
-    newLine += str(index+1) + " "
-    newLine += str(index+8) + " "
-    newLine += str(index+9) + " "
-    newLine += str(index+2) + " "
-
-    newLine += str(index+5) + " "
-    newLine += str(index+10) + " "
-    newLine += str(index+11) + " "
-    newLine += str(index+6) + " "
-
-    newLine += ") " + str(zoneName) + " ("
-    newLine +=  str(meshX) + " 1 " + str(meshZ) 
-    newLine += ") simpleGrading (1 1 1)"
-
-    file.write(newLine + "\n")
+    lines.append(");\n\n")
+    file.write("".join(lines))
 
 # Edge section
-def writeEdgeSection(file, rodDict):
-    # Write fuel edges
-    startIndex = 0
-    file.write("edges \n(\n")
+def rodEdges(rodDict):
+    # Arcs of the dished pellet faces
+    edges = []
+    if(rodDict['geometryType'] != '2Ddiscrete'):
+        return edges
 
+    sinAngle, cosAngle, correction = wedgeFactors(rodDict['wedgeAngle'])
+    startIndex = 0
     offset = rodDict['offsetFuel']
-    if(rodDict['geometryType'] == '2Ddiscrete'):
 
-        for i in range(rodDict['nBlocksFuel']):
-            
-            rDish = rodDict['rDishFuel'][i]
-            wCham = rodDict['chamferWidth'][i]
-
-            pelletType = 'flat'
-            if rDish > 0.0 and wCham > 0.0:
-                pelletType = 'dishedChamfered'
-            elif rDish > 0.0:
-                pelletType = 'dished'
-            elif wCham > 0.0:
-                pelletType = 'chamfered'   
-            else:
-                pelletType = 'flat'     
-
-            if pelletType == 'dished' or pelletType == 'dishedChamfered':
-                n = rodDict['nPelletsFuel'][i]
-
-                rDish = rodDict['rDishFuel'][i]
-                h     = rodDict['heightFuel'][i]/(n)
-
-                rCurvature = rodDict['rCurvatureDish'][i]
-
-                # Calculate height of dish based on curvature radius
-                angleDish = math.acos(rDish/rCurvature)
+    for i in range(rodDict['nBlocksFuel']):
 
-                # Calculate height of arc point based on curvature radius
-                angleArcPoint = math.acos(rDish/rCurvature/2.0)
-                hArcPoint = rCurvature*(math.sin(angleArcPoint) - math.sin(angleDish))
-                rArcPoint = rDish/2.0
+        pelletType = getPelletType(rodDict, i)
+        n = rodDict['nPelletsFuel'][i]
+        nVertices = len(pelletVertices[pelletType])
+        h = rodDict['heightFuel'][i]/(n)
 
-                for sectionI in range(n):
-                    writeFuelEdge(startIndex, rodDict['wedgeAngle'], rArcPoint, hArcPoint, h, offset, file)
-                    offset = offset + h
+        offsets, nextOffset = sectionOffsets(offset, h, n)
+        starts = startIndex + nVertices*np.arange(n)
+        startIndex += n*nVertices
+        offset = nextOffset
 
-                    if pelletType == 'dishedChamfered':
-                        startIndex += 16
-                    else:
-                        startIndex += 12
+        if pelletType == 'dished' or pelletType == 'dishedChamfered':
+            rDish = rodDict['rDishFuel'][i]
+            rCurvature = rodDict['rCurvatureDish'][i]
 
-            elif pelletType == 'chamfered':
-                n = rodDict['nPelletsFuel'][i]
-                h     = rodDict['heightFuel'][i]/(n)
+            # Calculate height of dish based on curvature radius
+            angleDish = math.acos(rDish/rCurvature)
 
-                for sectionI in range(n):
-                    offset = offset + h
-                    startIndex += 12
+            # Calculate height of arc point based on curvature radius
+            angleArcPoint = math.acos(rDish/rCurvature/2.0)
+            hArcPoint = rCurvature*(math.sin(angleArcPoint) - math.sin(angleDish))
+            rArcPoint = float(rDish/2.0)
 
-            elif pelletType == 'flat':
-                n = rodDict['nPelletsFuel'][i]
-                h     = rodDict['heightFuel'][i]/(n)
+            if(hArcPoint <= 1e-9):
+                continue
 
-                for sectionI in range(n):
-                    offset = offset + h
-                    startIndex += 8
+            # Coordinates for edge arc point
+            rArcPointX = rArcPoint*cosAngle*correction
+            rArcPointY = rArcPoint*sinAngle*correction
 
+            # Arcs between the vertices of the bottom and top dish faces
+            indices = starts[:, None, None] + np.array([[0, 1], [3, 2], [4, 5], [7, 6]])
+            points = np.empty((n, 4, 3))
+            points[:, :, 0] = rArcPointX
+            points[:, :, 1] = [-rArcPointY, rArcPointY, -rArcPointY, rArcPointY]
+            points[:, :2, 2] = (hArcPoint + offsets)[:, None]
+            points[:, 2:, 2] = (float(h) - hArcPoint + offsets)[:, None]
+            edges.append((indices, points))
 
-    file.write(");\n\n")
+    return edges
 
-def writeFuelEdge(startIndex, wedgeAngle, rArcPoint, hArcPoint, height, offset, file):
-    
-    #### Prepare input data ####
-    wedgeAngleDegree = float(wedgeAngle)
-    wedgeAngleRadiant = wedgeAngleDegree/180*math.pi
-    rArcPoint = float(rArcPoint)
-    hArcPoint = float(hArcPoint)
-    height = float(height)
-    offset = float(offset)
-    index = int(startIndex)
-
-    if(hArcPoint > 1e-9):
-
-        # Correction for wedge volume
-        # Relevant only for large wedge angles
-        sinAngle = math.sin(wedgeAngleRadiant/2)
-        cosAngle = math.cos(wedgeAngleRadiant/2)
-        correction = math.sqrt(sinAngle/(wedgeAngleRadiant/2))
-
-        # Coordinates for edge arc point
-        rArcPointX = rArcPoint*cosAngle*correction
-        rArcPointY = rArcPoint*sinAngle*correction
-
-        # Write fuel edges
-        newLine = "    arc " + str(index + 0) + " " + str(index + 1)
-        newLine += "(" 
-        newLine += str(rArcPointX) + " "
-        newLine += str(-rArcPointY) + " " 
-        newLine += str(hArcPoint + offset) + ")" 
-        newLine += "\n"
-
-        file.write(newLine)
-
-        newLine = "    arc " + str(index + 3) + " " + str(index + 2)
-        newLine += "(" 
-        newLine += str(rArcPointX) + " "
-        newLine += str(rArcPointY) + " " 
-        newLine += str(hArcPoint + offset) + ")" 
-        newLine += "\n"
-
-        file.write(newLine)
-
-        newLine = "    arc " + str(index + 4) + " " + str(index + 5)
-        newLine += "(" 
-        newLine += str(rArcPointX) + " "
-        newLine += str(-rArcPointY) + " " 
-        newLine += str(height - hArcPoint + offset) + ")" 
-        newLine += "\n"
-
-        file.write(newLine)
-
-        newLine = "    arc " + str(index + 7) + " " + str(index + 6)
-        newLine += "(" 
-        newLine += str(rArcPointX) + " "
-        newLine += str(rArcPointY) + " " 
-        newLine += str(height - hArcPoint + offset) + ")" 
-        newLine += "\n"
-
-        file.write(newLine)
-
-        file.write("\n")
-     
-# Patch section     
-def writePatchSection(file, rodDict):
-
-    # Collect boundaries into patchDict (defaultDict allows to append to entries)
-    patchDict = defaultdict(list)
+def writeEdgeSection(file, mesh):
+    lines = ["edges \n(\n"]
 
-    # Prepare mergePatchDict (one slave patch for each master patch)
-    mergePatchDict = defaultdict(list)
-    
-    # Initialize index
-    startIndex = 0
+    # A blank line after the arcs of each pellet
+    for indices, points in mesh['edges']:
+        arcLines = "    arc " + joinColumns(numberStrings(indices)) + "(" + joinColumns(numberStrings(points)) + ")\n"
+        arcLines[:, -1] += "\n"
+        lines.extend(arcLines.ravel().tolist())
 
-    # Collect fuel patches
-    startIndex = collectFuelPatches(rodDict, patchDict, mergePatchDict, startIndex)
+    lines.append(");\n\n")
+    file.write("".join(lines))
 
-    # Collect fuel patches
-    startIndex = collectCladPatches(rodDict, patchDict, mergePatchDict, startIndex)
+# Patch section
+def writePatchSection(file, mesh):
+    lines = []
 
     # Write boundaries
-    file.write("boundary \n(\n")
-    for patchName in patchDict:
-        patchFaces = patchDict[patchName]
-        writePatch(patchName, patchFaces, file)
+    lines.append("boundary \n(\n")
+    for patchName in mesh['patches']:
+        patchFaces = mesh['patches'][patchName]
+        writePatch(patchName, patchFaces, lines)
 
-    file.write(");\n\n")
+    lines.append(");\n\n")
 
     # Write mergePatchPairs
-    file.write("mergePatchPairs \n(\n")
-    for masterPatchName in mergePatchDict:
-        slavePatchName = mergePatchDict[masterPatchName]
-        file.write("\t(")
-        file.write(masterPatchName + " " + slavePatchName)
-        file.write(")\n")
+    lines.append("mergePatchPairs \n(\n")
+    for masterPatchName in mesh['mergePatchPairs']:
+        slavePatchName = mesh['mergePatchPairs'][masterPatchName]
+        lines.append("\t(" + masterPatchName + " " + slavePatchName + ")\n")
 
-    file.write(");\n\n")
+    lines.append(");\n\n")
+    file.write("".join(lines))
 
 def collectFuelPatches(rodDict, patchDict, mergePatchDict, startIndex):
     
@@ -1118,55 +915,383 @@ def collectCladPatches(rodDict, patchDict, mergePatchDict, startIndex):
             startIndex += 8
 
     return startIndex
-                
-def writePatch(patchName, patchFaces, file):
 
-    file.write("    " + str(patchName) + "\n")
-    file.write("    {" + "\n")
-    file.write("        type " + patchFaces[0][0] + ";\n")
-    
+def writePatch(patchName, patchFaces, lines):
+
+    lines.append("    " + str(patchName) + "\n")
+    lines.append("    {" + "\n")
+    lines.append("        type " + patchFaces[0][0] + ";\n")
+
     if(patchFaces[0][0] == "regionCoupledOFFBEAT" ):
-        file.write("        neighbourPatch " + patchFaces[0][1] + ";\n")
-        file.write("        neighbourRegion region0;\n")
-        file.write("        owner " + patchFaces[0][2] +";\n")
+        lines.append("        neighbourPatch " + patchFaces[0][1] + ";\n")
+        lines.append("        neighbourRegion region0;\n")
+        lines.append("        owner " + patchFaces[0][2] +";\n")
         if(patchName == "cladInner" or patchName == "fuelOuter"):
-            file.write("        updateAMI true;\n")
+            lines.append("        updateAMI true;\n")
         else:
-            file.write("        updateAMI false;\n")
+            lines.append("        updateAMI false;\n")
 
-    file.write("        faces " + "\n")
-    file.write("        (" + "\n")
+    lines.append("        faces " + "\n")
+    lines.append("        (" + "\n")
 
     # Write face (there might be more than one per patch)
     for face in patchFaces:
+        lines.append("            (%d %d %d %d)\n" % tuple(face[3:7]))
+
+    lines.append("        );" + "\n")
+    lines.append("    }" + "\n\n")
+
+# polyMesh section
+def hexGridPoints(corners, nCells):
+    # Points of the structured grid of a hex block with straight edges and
+    # uniform grading, as an (nZ+1, nY+1, nX+1, 3) array
+    nX, nY, nZ = nCells
+    s = (np.arange(nX + 1)/nX)[None, None, :]
+    t = (np.arange(nY + 1)/nY)[None, :, None]
+    u = (np.arange(nZ + 1)/nZ)[:, None, None]
+    weights = np.stack(np.broadcast_arrays(
+        (1 - s)*(1 - t)*(1 - u), s*(1 - t)*(1 - u), s*t*(1 - u), (1 - s)*t*(1 - u),
+        (1 - s)*(1 - t)*u, s*(1 - t)*u, s*t*u, (1 - s)*t*u), axis=-1)
+    return weights @ corners
+
+def hexFaceGrid(pointIds, faceI):
+    # Point ids on a face of a hex block, for the faces in hexFaces order
+    return [pointIds[:, :, 0], pointIds[:, :, -1], pointIds[:, 0, :],
+            pointIds[:, -1, :], pointIds[0], pointIds[-1]][faceI]
+
+def matchFaceGrids(idsA, idsB, points):
+    # Pair the points of two coincident face grids, trying every orientation
+    # of the second grid. Returns None if the faces do not conform
+    size = np.ptp(points[idsA.ravel()], axis=0).max()
+    for transpose in [False, True]:
+        ids = idsB.T if transpose else idsB
+        for flipped in [ids, ids[::-1], ids[:, ::-1], ids[::-1, ::-1]]:
+            if flipped.shape == idsA.shape and np.allclose(points[idsA], points[flipped], rtol=0, atol=1e-9*size):
+                return idsA.ravel(), flipped.ravel()
+    return None
+
+def collapseFaceGrid(ids, points):
+    # Pair the points of a face grid that coincide along one of its
+    # directions (a block face collapsed to a line, e.g. on the axis).
+    # Returns None if the face is not collapsed
+    size = np.ptp(points[ids.ravel()], axis=0).max()
+    for grid in [ids, ids.T]:
+        first = np.broadcast_to(grid[:, :1], grid.shape)
+        if np.allclose(points[grid], points[first], rtol=0, atol=1e-9*size):
+            return first.ravel(), grid.ravel()
+    return None
+
+def mergeLabels(nPoints, pairs):
+    # Smallest point id of every group of merged points
+    labels = np.arange(nPoints)
+    if not pairs:
+        return labels
+    a = np.concatenate([pair[0] for pair in pairs])
+    b = np.concatenate([pair[1] for pair in pairs])
+    while True:
+        smallest = np.minimum(labels[a], labels[b])
+        newLabels = labels.copy()
+        np.minimum.at(newLabels, a, smallest)
+        np.minimum.at(newLabels, b, smallest)
+        newLabels = newLabels[newLabels]
+        if np.array_equal(newLabels, labels):
+            return labels
+        labels = newLabels
+
+def blockGridPoints(vertices, hexes, hexCells):
+    # Structured grid of every hex block, points numbered block by block.
+    # Returns the points and the (nZ+1, nY+1, nX+1) point ids of every block
+    gridPoints = []
+    gridIds = []
+    nPoints = 0
+    for hexIndices, nCells in zip(hexes, hexCells):
+        grid = hexGridPoints(vertices[hexIndices], nCells)
+        gridPoints.append(grid.reshape(-1, 3))
+        gridIds.append(nPoints + np.arange(len(gridPoints[-1])).reshape(grid.shape[:3]))
+        nPoints += len(gridPoints[-1])
+    return np.concatenate(gridPoints), gridIds
+
+def triangleLast(faces):
+    # Rotate the quads with two equal consecutive point ids (a collapsed
+    # edge) so the repeated id is in the last two columns; the first three
+    # are then the triangle, in the same orientation
+    repeated = faces == np.roll(faces, -1, axis=1)
+    rows = np.flatnonzero(repeated.any(axis=1))
+    shift = repeated[rows].argmax(axis=1) + 2
+    faces = faces.copy()
+    faces[rows] = np.take_along_axis(faces[rows], (np.arange(4) + shift[:, None]) % 4, axis=1)
+    return faces
+
+def makePolyMesh(rodDict, mesh=None, template=None):
+    # Build the polyMesh that blockMesh would generate from the blockMeshDict
+    # of a 1D or 2Dsmeared rod: the blocks are meshed with straight edges,
+    # the points of block faces shared by two blocks and of the merged patch
+    # pairs are merged, the block faces of no patch on the axis are collapsed,
+    # and the faces are numbered in upper-triangular order.
+    # Returns None for rods that need blockMesh (2Ddiscrete rods, merged
+    # patch pairs whose faces do not conform, or other faces of no patch).
+    # mesh is the mesh description of the rod, if already built. template is
+    # the polyMesh of a rod with the same topologyKey: its faces, owner,
+    # neighbour, patches and cellZones are reused and only the points are
+    # computed, provided the points it merged still coincide
+    if rodDict['geometryType'] not in ['1D', '2Dsmeared']:
+        return None
+
+    if mesh is None:
+        mesh = makeRodMesh(rodDict)
+    vertices = meshPoints(mesh)
+
+    if template is not None:
+        points, gridIds = blockGridPoints(vertices, template['hexes'], template['hexCells'])
+        a, b = template['mergedPoints']
+        size = np.ptp(points, axis=0).max()
+        if not np.allclose(points[a], points[b], rtol=0, atol=1e-9*size):
+            return None
+        return dict(template, points=points[template['keptPoints']]*float(rodDict['convertToMeters']))
+
+    hexes = np.concatenate([indices for indices, zoneName, cells in mesh['blocks']])
+    hexCells = np.concatenate([cells for indices, zoneName, cells in mesh['blocks']])
+    hexZones = [zoneName for indices, zoneName, cells in mesh['blocks'] for hexIndices in indices]
+    points, gridIds = blockGridPoints(vertices, hexes, hexCells)
+    nPoints = len(points)
+
+    # Block faces, by the set of their vertex labels
+    blockFaces = defaultdict(list)
+    for hexI, hexIndices in enumerate(hexes.tolist()):
+        for faceI, face in enumerate(hexFaces):
+            blockFaces[frozenset(hexIndices[v] for v in face)].append((hexI, faceI))
+
+    # Merge the points of the block faces shared by two blocks
+    pairs = []
+    for shared in blockFaces.values():
+        for (hexA, faceA), (hexB, faceB) in zip(shared[:-1], shared[1:]):
+            pairs.append(matchFaceGrids(hexFaceGrid(gridIds[hexA], faceA), hexFaceGrid(gridIds[hexB], faceB), points))
+
+    # Merge the points of the merged patch pairs, if they conform
+    for masterName, slaveName in mesh['mergePatchPairs'].items():
+        master = [blockFaces[frozenset(face[3:7])][0] for face in mesh['patches'][masterName]]
+        slave = [blockFaces[frozenset(face[3:7])][0] for face in mesh['patches'][slaveName]]
+        if len(master) != 1 or len(slave) != 1:
+            return None
+        pairs.append(matchFaceGrids(hexFaceGrid(gridIds[master[0][0]], master[0][1]), hexFaceGrid(gridIds[slave[0][0]], slave[0][1]), points))
+
+    # Collapse the block faces of no patch to lines (the faces of the inner
+    # blocks on the axis), so the cells next to them are prisms; any other
+    # face of no patch would need the default patch of blockMesh
+    patchFaces = {frozenset(face[3:7]) for faces in mesh['patches'].values() for face in faces}
+    for key, shared in blockFaces.items():
+        if len(shared) == 1 and key not in patchFaces:
+            hexI, faceI = shared[0]
+            pairs.append(collapseFaceGrid(hexFaceGrid(gridIds[hexI], faceI), points))
+
+    if any(pair is None for pair in pairs):
+        return None
+
+    mergedPoints = [np.concatenate([pair[i] for pair in pairs] or [np.empty(0, dtype=int)]) for i in [0, 1]]
+    labels = mergeLabels(nPoints, pairs)
+    kept = labels == np.arange(nPoints)
+    pointMap = (np.cumsum(kept) - 1)[labels]
+
+    # Cells of every block, x fastest, then y and z as blockMesh numbers them
+    cellPoints = []
+    cellHex = []
+    for hexI, ids in enumerate(gridIds):
+        corners = [ids[:-1, :-1, :-1], ids[:-1, :-1, 1:], ids[:-1, 1:, 1:], ids[:-1, 1:, :-1],
+                   ids[1:, :-1, :-1], ids[1:, :-1, 1:], ids[1:, 1:, 1:], ids[1:, 1:, :-1]]
+        cellPoints.append(np.stack(corners, axis=-1).reshape(-1, 8))
+        cellHex.append(np.full(len(cellPoints[-1]), hexI))
+    cellPoints = pointMap[np.concatenate(cellPoints)]
+    cellHex = np.concatenate(cellHex)
+    nCells = len(cellPoints)
+
+    # Faces of every cell, outward, matched by their sorted point ids. The
+    # faces collapsed to a line are dropped, and the faces with a collapsed
+    # edge are triangles
+    cellFaces = cellPoints[:, hexFaces].reshape(-1, 4)
+    faceCell = np.repeat(np.arange(nCells), 6)
+    faceHexFace = np.tile(np.arange(6), nCells)
+    keys = np.sort(cellFaces, axis=1)
+    valid = (keys[:, 1:] != keys[:, :-1]).sum(axis=1) >= 2
+    cellFaces = triangleLast(cellFaces[valid])
+    faceCell = faceCell[valid]
+    faceHexFace = faceHexFace[valid]
+    keys = keys[valid]
+    order = np.lexsort(keys.T[::-1])
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], np.any(keys[1:] != keys[:-1], axis=1))))
+    counts = np.diff(np.append(starts, len(keys)))
+    if counts.max() > 2:
+        return None
+
+    # Internal faces, oriented from the lower to the higher cell
+    firsts = order[starts]
+    seconds = order[starts + counts - 1]
+    internal = counts == 2
+    owner = faceCell[firsts[internal]]
+    neighbour = faceCell[seconds[internal]]
+    upper = np.lexsort((neighbour, owner))
+    faces = [cellFaces[firsts[internal]][upper]]
+    owners = [owner[upper]]
+    neighbour = neighbour[upper]
+
+    # Boundary faces, patch by patch in the order of the blockMeshDict
+    patchOfBlockFace = np.full((len(hexes), 6), len(mesh['patches']))
+    orderInPatch = np.zeros((len(hexes), 6), dtype=int)
+    for patchI, patchName in enumerate(mesh['patches']):
+        for faceI, face in enumerate(mesh['patches'][patchName]):
+            hexI, hexFaceI = blockFaces[frozenset(face[3:7])][0]
+            patchOfBlockFace[hexI, hexFaceI] = patchI
+            orderInPatch[hexI, hexFaceI] = faceI
+
+    boundary = firsts[~internal]
+    boundaryHex = cellHex[faceCell[boundary]]
+    boundaryPatch = patchOfBlockFace[boundaryHex, faceHexFace[boundary]]
+    boundary = boundary[np.lexsort((boundary, orderInPatch[boundaryHex, faceHexFace[boundary]], boundaryPatch))]
+    nFaces = np.bincount(patchOfBlockFace[cellHex[faceCell[boundary]], faceHexFace[boundary]], minlength=len(mesh['patches']) + 1)
+    faces.append(cellFaces[boundary])
+    owners.append(faceCell[boundary])
+
+    if nFaces[-1] > 0:
+        return None
+
+    # The merged patch pairs are left without faces and are not written
+    patches = []
+    startFace = len(neighbour)
+    for patchI, patchName in enumerate(mesh['patches']):
+        if nFaces[patchI] > 0:
+            patches.append((patchName, mesh['patches'][patchName][0], nFaces[patchI], startFace))
+            startFace += nFaces[patchI]
+
+    cellZones = {}
+    for zoneName in dict.fromkeys(hexZones):
+        zoneHexes = [hexI for hexI, name in enumerate(hexZones) if name == zoneName]
+        cellZones[zoneName] = np.flatnonzero(np.isin(cellHex, zoneHexes))
+
+    return {
+        'points': points[kept]*float(rodDict['convertToMeters']),
+        'faces': np.concatenate(faces),
+        'owner': np.concatenate(owners),
+        'neighbour': neighbour,
+        'patches': patches,
+        'cellZones': cellZones,
+        # To compute the points of other rods with the same topology
+        'hexes': hexes,
+        'hexCells': hexCells,
+        'mergedPoints': mergedPoints,
+        'keptPoints': kept,
+        # Text of the files that do not depend on the points
+        'fileText': {},
+    }
+
+def polyMeshFileText(className, objectName, lines, entries=()):
+    file = io.StringIO()
+    writeHeader(file, className, objectName, ['location    "constant/polyMesh"', *entries])
+    file.write("\n\n" + "".join(lines) + "\n\n// ************************************************************************* //\n")
+    return file.getvalue()
+
+def polyMeshTopologyText(polyMesh):
+    # Text of the faces, owner, neighbour, boundary and cellZones files
+    faces = polyMesh['faces']
+    owner = polyMesh['owner']
+    neighbour = polyMesh['neighbour']
+    fileText = {}
+
+    faceStrings = numberStrings(faces)
+    # Triangles repeat their last point id, see triangleLast
+    faceLines = np.where(faces[:, 2] == faces[:, 3],
+                         "3(" + joinColumns(faceStrings[:, :3]) + ")\n",
+                         "4(" + joinColumns(faceStrings) + ")\n")
+    fileText['faces'] = polyMeshFileText("faceList", "faces", [f"{len(faces)}\n(\n", *faceLines.tolist(), ")"])
+
+    note = f'note        "nPoints:{len(polyMesh["points"])}  nCells:{owner.max() + 1}  nFaces:{len(faces)}  nInternalFaces:{len(neighbour)}"'
+    for objectName, labels in [("owner", owner), ("neighbour", neighbour)]:
+        labelLines = (numberStrings(labels) + "\n").tolist() if len(labels) else []
+        fileText[objectName] = polyMeshFileText("labelList", objectName, [f"{len(labels)}\n(\n", *labelLines, ")"], [note])
+
+    lines = [f"{len(polyMesh['patches'])}\n(\n"]
+    for patchName, (patchType, neighbourPatch, patchOwner, *face), nFaces, startFace in polyMesh['patches']:
+        lines.append(f"    {patchName}\n    {{\n        type            {patchType};\n")
+        if patchType in ['wedge', 'empty']:
+            lines.append(f"        inGroups        List<word> 1({patchType});\n")
+        if patchType == "regionCoupledOFFBEAT":
+            lines.append(f"        neighbourPatch  {neighbourPatch};\n")
+            lines.append("        neighbourRegion region0;\n")
+            lines.append(f"        owner           {patchOwner};\n")
+            updateAMI = "true" if patchName in ["cladInner", "fuelOuter"] else "false"
+            lines.append(f"        updateAMI       {updateAMI};\n")
+        lines.append(f"        nFaces          {nFaces};\n        startFace       {startFace};\n    }}\n")
+    lines.append(")")
+    fileText['boundary'] = polyMeshFileText("polyBoundaryMesh", "boundary", lines)
+
+    lines = [f"{len(polyMesh['cellZones'])}\n(\n"]
+    for zoneName, cellLabels in polyMesh['cellZones'].items():
+        labelText = " ".join(numberStrings(cellLabels).tolist())
+        lines.append(f"{zoneName}\n{{\n    type cellZone;\n    cellLabels List<label> {len(cellLabels)}({labelText});\n}}\n")
+    lines.append(")")
+    fileText['cellZones'] = polyMeshFileText("regIOobject", "cellZones", lines)
+    return fileText
+
+def writePolyMesh(polyMesh, folder=os.path.join("constant", "polyMesh")):
+    os.makedirs(folder, exist_ok=True)
+    points = polyMesh['points']
+    pointLines = "(" + joinColumns(numberStrings(points)) + ")\n"
+    fileText = {'points': polyMeshFileText("vectorField", "points", [f"{len(points)}\n(\n", *pointLines.tolist(), ")"])}
+
+    # The other files are shared by the polyMeshes made from the same template
+    topologyText = polyMesh.setdefault('fileText', {})
+    if not topologyText:
+        topologyText.update(polyMeshTopologyText(polyMesh))
+    fileText.update(topologyText)
+
+    for objectName, text in fileText.items():
+        with open(os.path.join(folder, objectName), "w") as f:
+            f.write(text)
+
+def writeRodMeshes(rodDicts, caseFolders):
+    # Write the mesh of every rodDict in its case folder: system/blockMeshDict,
+    # and constant/polyMesh if makePolyMesh supports the rod. The topology
+    # (blocks, patches and polyMesh faces) is built once for the rods with the
+    # same topologyKey, and only the coordinates are computed per rod.
+    # Returns the case folders that still need blockMesh
+    topologies = {}
+    templates = {}
+    needBlockMesh = []
+
+    for rodDict, caseFolder in zip(rodDicts, caseFolders):
+        key = topologyKey(rodDict)
+        if key not in topologies:
+            topologies[key] = rodTopology(rodDict)
+        mesh = makeRodMesh(rodDict, topologies[key])
+
+        os.makedirs(os.path.join(caseFolder, "system"), exist_ok=True)
+        with open(os.path.join(caseFolder, "system", "blockMeshDict"), "w") as file:
+            file.write(blockMeshDictText(mesh))
+
+        polyMesh = None
+        if writePolyMeshDirectly:
+            if key in templates:
+                polyMesh = makePolyMesh(rodDict, mesh, templates[key])
+            if polyMesh is None:
+                polyMesh = makePolyMesh(rodDict, mesh)
+                if polyMesh is not None:
+                    templates.setdefault(key, polyMesh)
+
+        if polyMesh is not None:
+            writePolyMesh(polyMesh, os.path.join(caseFolder, "constant", "polyMesh"))
+        else:
+            needBlockMesh.append(caseFolder)
 
-        v1 = face[3]
-        v2 = face[4]
-        v3 = face[5]
-        v4 = face[6]
-
-        file.write("            (" + str(v1) + " "
-                                    + str(v2) + " "
-                                    + str(v3) + " "
-                                    + str(v4)  + ")" + "\n")
-
-    file.write("        );" + "\n")
-    file.write("    }" + "\n\n")
+    return needBlockMesh
 
 ################################
 ############# MAIN #############
 ################################
 
-rodDict = readRodDict('rodDict')
-writeBlockMeshDict(rodDict, 'blockMeshDict')
-  
-
-
-
-
-
-
-
-
-
+if __name__ == "__main__":
+    rodDict = readRodDict('rodDict')
+    writeBlockMeshDict(rodDict, 'blockMeshDict')
 
+    # Allrun only runs blockMesh if constant/polyMesh was not written here
+    polyMesh = makePolyMesh(rodDict) if writePolyMeshDirectly else None
+    if polyMesh is not None:
+        writePolyMesh(polyMesh)
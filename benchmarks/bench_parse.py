@@ -0,0 +1,90 @@
+"""
+Compare the line-by-line and the bulk volFieldValue.dat parsers.
+
+Usage: python benchmarks/bench_parse.py [n_rows] [n_repeats]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from parse import parse_volFieldValue_dat, read_volFieldValue_dat
+
+
+def write_dat_file(path, n_rows):
+    """Write a synthetic volFieldValue.dat file in the OpenFOAM layout."""
+    time_values = np.linspace(0, 5e7, n_rows)
+    temperature = 600 + 400 * np.exp(-time_values / 1e7)
+    burnup = time_values * 1e-3
+    with open(path, "w") as file:
+        file.write("# Volume field value (averageTemperatureAndBurnup)\n")
+        file.write("# Time        \tvolAverage(T)\tvolAverage(Bu)\n")
+        for row in zip(time_values, temperature, burnup):
+            file.write("%g\t%.6e\t%.6e\n" % row)
+
+
+# Lines the parsers must treat alike: nan and inf values are kept, lines with
+# a non-numeric value or a wrong number of columns are skipped
+edge_case_lines = [
+    "0\t600\t0\n",
+    "1\tnan\t1\n",
+    "2\tinf\t-inf\n",
+    "3\tNA\t3\n",
+    "4\tabc\t4\n",
+    "5\t\t5\n",
+    "6\t600\n",
+    "7\t600\t7\t7\n",
+    "8\t-nan\t8\n",
+]
+
+
+def assert_parsers_agree(path):
+    rows = parse_volFieldValue_dat(path)
+    columns = read_volFieldValue_dat(path)
+    for name, values in columns.items():
+        expected = [row[name] for row in rows]
+        assert np.array_equal(values, expected, equal_nan=True), name
+
+
+def best_time(function, path, n_repeats):
+    elapsed = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        function(path)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def bench_parse(n_rows, n_repeats):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "volFieldValue.dat")
+        write_dat_file(path, n_rows)
+
+        # Both parsers must agree before they are timed
+        edge_case_path = os.path.join(folder, "edge_cases.dat")
+        with open(edge_case_path, "w") as file:
+            file.writelines(edge_case_lines)
+        assert_parsers_agree(edge_case_path)
+        assert_parsers_agree(path)
+
+        results = [
+            ("line-by-line", best_time(parse_volFieldValue_dat, path, n_repeats)),
+            ("bulk", best_time(read_volFieldValue_dat, path, n_repeats)),
+        ]
+
+    print(f"Parsing a volFieldValue.dat file of {n_rows} rows")
+    line_time = results[0][1]
+    for name, elapsed in results:
+        print(
+            f"{name:>12}: {n_rows / elapsed / 1e6:7.3f} M rows/s, "
+            f"speedup {line_time / elapsed:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    bench_parse(n_rows, n_repeats)
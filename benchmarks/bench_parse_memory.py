@@ -0,0 +1,136 @@
+"""
+Measure the peak memory of parse.py on synthetic campaigns of growing size,
+with the original row-dict implementation and the streaming writer. Every
+case also has T and Bu probes files, so the probe tensors are part of the
+measurement of the streaming variant.
+
+Usage: python benchmarks/bench_parse_memory.py [n_rows_per_case] [n_cases ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from parse import (
+    extract_parameters_from_directory,
+    find_cases,
+    parse_volFieldValue_dat,
+    process_simulation_data,
+    vol_field_files,
+)
+
+n_probes = 20  # Axial probes per case
+
+
+def write_probes(case_folder, time_values, rng):
+    """Write the T and Bu probes files of a case, with n_probes probes."""
+    probes_folder = os.path.join(case_folder, "postProcessing", "probes", "0")
+    os.makedirs(probes_folder)
+    header = "".join(f"Probe {i} (0 0 {i * 0.01:.2f})\n" for i in range(n_probes))
+    header += "Time" + "".join(f" {i}" for i in range(n_probes))
+    profile = np.sin(np.linspace(0, np.pi, n_probes))
+    for field, values in [
+        ("T", 600 + 400 * profile + rng.normal(0, 1, (len(time_values), n_probes))),
+        ("Bu", np.outer(time_values * 1e-4, profile)),
+    ]:
+        np.savetxt(
+            os.path.join(probes_folder, field),
+            np.column_stack([time_values, values]),
+            fmt="%.9g",
+            header=header,
+        )
+
+
+def write_campaign(folder, n_cases, n_rows):
+    """
+    Write n_cases case folders with a volFieldValue.dat and probes files of
+    n_rows rows.
+    """
+    rng = np.random.default_rng(0)
+    time_values = np.cumsum(rng.uniform(1e3, 1e5, n_rows))
+    for i in range(n_cases):
+        name = (
+            f"lhgr_{20 + i * 1e-3:.3f}_fuelRadius_4.1_gap_80.0_clad_0.6_coolant_580.0"
+        )
+        dat_folder = os.path.join(
+            folder, name, "postProcessing", "averageTemperatureAndBurnup", "0"
+        )
+        os.makedirs(dat_folder)
+        data = np.column_stack(
+            [time_values, 900 + rng.normal(0, 1, n_rows), time_values * 1e-4]
+        )
+        np.savetxt(
+            os.path.join(dat_folder, "volFieldValue.dat"),
+            data,
+            fmt="%.9g",
+            delimiter="\t",
+            header="Time\tvolAverage(T)\tvolAverage(Bu)",
+        )
+        write_probes(os.path.join(folder, name), time_values, rng)
+
+
+def parse_rows(base_folder, output_csv):
+    """The original parse.py: one dict per row, one DataFrame at the end."""
+    data = []
+    for name, case_path in find_cases(base_folder):
+        params = extract_parameters_from_directory(name)
+        dat_file_path = os.path.join(case_path, vol_field_files(case_path)[0])
+        for result in parse_volFieldValue_dat(dat_file_path):
+            data.append({**params, **result})
+    pd.DataFrame(data).to_csv(output_csv, index=False)
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its largest child process, in MB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024  # kilobytes on Linux
+
+
+def run_variant(variant, base_folder, output_csv):
+    """Run one variant in a fresh process and return (seconds, peak RSS MB)."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--variant", variant, base_folder, output_csv],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    elapsed, peak = output.strip().splitlines()[-1].split()
+    return float(elapsed), float(peak)
+
+
+def bench_parse_memory(n_rows, case_counts):
+    print(f"Peak memory of parse.py with {n_rows} rows per case")
+    for n_cases in case_counts:
+        with tempfile.TemporaryDirectory(dir=".") as folder:
+            base_folder = os.path.join(folder, "simulation_cases")
+            write_campaign(base_folder, n_cases, n_rows)
+            for variant in ["rows", "streaming"]:
+                output_csv = os.path.join(folder, f"{variant}.csv")
+                elapsed, peak = run_variant(variant, base_folder, output_csv)
+                print(
+                    f"{n_cases:6d} cases, {variant:>9}: {peak:8.1f} MB peak RSS, "
+                    f"{elapsed:6.2f} s"
+                )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--variant":
+        variant, base_folder, output_csv = sys.argv[2:5]
+        start = time.perf_counter()
+        if variant == "rows":
+            parse_rows(base_folder, output_csv)
+        else:
+            # One worker, so the peak is not spread over the pool processes
+            process_simulation_data(base_folder, output_csv, max_workers=1)
+        print(f"{time.perf_counter() - start} {peak_rss_mb()}")
+    else:
+        n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+        case_counts = [int(n) for n in sys.argv[2:]] or [250, 1000, 4000]
+        bench_parse_memory(n_rows, case_counts)
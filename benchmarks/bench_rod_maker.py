@@ -0,0 +1,212 @@
+"""
+Measure how rodMaker.py scales on synthetic 2Ddiscrete rods of growing
+length, for each pellet type, with and without end caps. For every rod the
+generation time of each stage (patch and block topology, vertex and edge
+coordinates, blockMeshDict text), the peak memory and the size of the
+blockMeshDict are recorded; a series is flagged when one of them grows
+faster than max_exponent in the number of pellets. Each rod is measured in a
+fresh process, so its peak RSS does not include the previous rods.
+
+Usage: python benchmarks/bench_rod_maker.py [n_pellets ...]
+"""
+
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mesh_cache import load_rod_maker
+
+rod_maker_path = os.path.join("baseCase", "baseCase", "rodMaker.py")
+pellet_types = ["flat", "chamfered", "dished", "dishedChamfered"]
+cap_options = ["none", "both"]
+pellets_per_block = 100  # Fuel blocks of a rod, e.g. enrichment zones
+pellet_height = 10.0  # mm
+repeats = 3  # The best time of the repeats is kept
+max_exponent = 1.3  # Growth in the number of pellets flagged as superlinear
+
+
+def synthetic_rod_dict(n_pellets, pellet_type, caps):
+    """A 2Ddiscrete rod of n_pellets pellets of one type, in mm."""
+    n_blocks = math.ceil(n_pellets / pellets_per_block)
+    pellets = [pellets_per_block] * (n_blocks - 1)
+    pellets.append(n_pellets - sum(pellets))
+    dished = pellet_type in ["dished", "dishedChamfered"]
+    chamfered = pellet_type in ["chamfered", "dishedChamfered"]
+    stack_height = n_pellets * pellet_height
+
+    rod_dict = {
+        "geometryType": "2Ddiscrete",
+        "wedgeAngle": 2.0,
+        "convertToMeters": 0.001,
+        "nBlocksFuel": n_blocks,
+        "nBlocksClad": 2,
+        "blockNameFuel": [f"fuel{i}" for i in range(n_blocks)],
+        "blockNameClad": ["cladding", "cladding"],
+        "rInnerFuel": [0.0] * n_blocks,
+        "rInnerClad": [4.18, 4.18],
+        "rOuterFuel": [4.1] * n_blocks,
+        "rOuterClad": [4.75, 4.75],
+        "heightFuel": [n * pellet_height for n in pellets],
+        "heightClad": [stack_height, 200.0],
+        "offsetFuel": 0.0,
+        "offsetClad": 0.0,
+        "mergeCladPatchPairs": True,
+        "mergeFuelPatchPairs": False,
+        "nCellsRFuel": [20] * n_blocks,
+        "nCellsRClad": [5, 5],
+        "nPelletsFuel": pellets,
+        "nCellsZFuel": [4] * n_blocks,
+        "nCellsZClad": [n_pellets, 10],
+        "bottomCapHeight": 0,
+        "topCapHeight": 0,
+        "rDishFuel": [3.2975 if dished else 0.0] * n_blocks,
+        "chamferWidth": [0.4295 if chamfered else 0.0] * n_blocks,
+        "rCurvatureDish": [43.66] * n_blocks,
+        "heightChamferFuel": [0.16] * n_blocks,
+        "nCellsRDish": [15] * n_blocks,
+        "nCellsRLand": [8] * n_blocks,
+        "nCellsRChamfer": [7] * n_blocks,
+    }
+    if caps == "both":
+        rod_dict.update(
+            bottomCapHeight=10.0,
+            nCellsRBottomCap=10,
+            nCellsZBottomCap=5,
+            topCapHeight=10.0,
+            nCellsRTopCap=10,
+            nCellsZTopCap=5,
+        )
+    return rod_dict
+
+
+def best_time(function):
+    """Best wall time of repeats calls of function, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_rss():
+    """Peak RSS of this process, in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux
+
+
+def measure(rod_maker, rod_dict, output_file):
+    """Return the stage times, the peak memory and the output size."""
+    # Memory first, while the peak RSS is still the one after the imports
+    baseline = peak_rss()
+    rod_maker.writeBlockMeshDict(rod_dict, output_file)
+    peak = peak_rss() - baseline
+
+    topology = rod_maker.rodTopology(rod_dict)
+    mesh = rod_maker.makeRodMesh(rod_dict, topology)
+    stages = {
+        "topology": best_time(lambda: rod_maker.rodTopology(rod_dict)),
+        "coordinates": best_time(lambda: rod_maker.makeRodMesh(rod_dict, topology)),
+        # A fresh section cache, so the topology sections are written each time
+        "text": best_time(
+            lambda: rod_maker.blockMeshDictText(dict(mesh, sectionText={}))
+        ),
+        "total": best_time(lambda: rod_maker.writeBlockMeshDict(rod_dict, output_file)),
+    }
+    return stages, peak, os.path.getsize(output_file)
+
+
+def run_measure(n_pellets, pellet_type, caps, output_file):
+    """Measure one rod in a fresh process."""
+    output = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--measure",
+            str(n_pellets),
+            pellet_type,
+            caps,
+            output_file,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def growth_exponent(sizes, values):
+    """
+    Exponent of the power law fitted to values against sizes, leaving out
+    the smallest size (dominated by fixed costs) when there are three or more.
+    """
+    sizes, values = np.array(sizes, dtype=float), np.array(values, dtype=float)
+    if len(sizes) > 2:
+        sizes, values = sizes[1:], values[1:]
+    if len(sizes) < 2 or values.min() <= 0:
+        return float("nan")
+    return np.polyfit(np.log(sizes), np.log(values), 1)[0]
+
+
+def bench_rod_maker(pellet_counts):
+    flagged = []
+    with tempfile.TemporaryDirectory() as folder:
+        output_file = os.path.join(folder, "blockMeshDict")
+        for pellet_type in pellet_types:
+            for caps in cap_options:
+                print(f"{pellet_type} pellets, caps: {caps}")
+                series = {"time": [], "memory": [], "size": []}
+                for n_pellets in pellet_counts:
+                    stages, peak, size = run_measure(
+                        n_pellets, pellet_type, caps, output_file
+                    )
+                    series["time"].append(stages["total"])
+                    series["memory"].append(peak)
+                    series["size"].append(size)
+                    print(
+                        f"{n_pellets:6d} pellets: "
+                        + ", ".join(
+                            f"{stage} {seconds * 1e3:8.1f} ms"
+                            for stage, seconds in stages.items()
+                        )
+                        + f", peak {peak / 2**20:7.1f} MiB, "
+                        f"output {size / 2**20:7.2f} MiB"
+                    )
+
+                exponents = {
+                    name: growth_exponent(pellet_counts, values)
+                    for name, values in series.items()
+                }
+                print(
+                    "  growth exponent: "
+                    + ", ".join(
+                        f"{name} {exponent:.2f}" for name, exponent in exponents.items()
+                    )
+                )
+                for name, exponent in exponents.items():
+                    if exponent > max_exponent:
+                        flagged.append(f"{pellet_type}/{caps} {name} ({exponent:.2f})")
+
+    if flagged:
+        print(f"Superlinear growth (exponent > {max_exponent}): " + "; ".join(flagged))
+        sys.exit(1)
+    print(f"No superlinear growth (all exponents <= {max_exponent}).")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        n_pellets, pellet_type, caps, output_file = sys.argv[2:6]
+        rod_maker = load_rod_maker(rod_maker_path)
+        rod_dict = synthetic_rod_dict(int(n_pellets), pellet_type, caps)
+        print(json.dumps(measure(rod_maker, rod_dict, output_file)))
+        sys.exit()
+
+    pellet_counts = [int(n) for n in sys.argv[1:]] or [100, 300, 1000, 3000]
+    bench_rod_maker(sorted(pellet_counts))
@@ -0,0 +1,62 @@
+"""
+Compare the time needed to stage simulation cases with each staging mode,
+on the filesystem of the current folder. The modes are run in turn for
+several rounds and the best time of each is kept, as the timings of small
+file operations are noisy. Run it where the campaign is staged before
+changing staging_mode in run.py: the fastest mode depends on the filesystem.
+
+Usage: python benchmarks/bench_staging.py [base_case_folder] [n_cases]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from staging import STAGING_MODES, stage_case
+
+rounds = 3  # The best time of the rounds is kept
+
+
+def disk_usage(folder):
+    """Return the bytes allocated for the regular files below folder."""
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            stat = os.lstat(os.path.join(root, name))
+            if stat.st_nlink == 1:  # Linked files are shared with the base case
+                total += stat.st_blocks * 512
+    return total
+
+
+def bench_staging(base_case_folder, n_cases):
+    times = {mode: [] for mode in STAGING_MODES}
+    usage = {}
+    for _ in range(rounds):
+        for mode in STAGING_MODES:
+            with tempfile.TemporaryDirectory(dir=".") as output:
+                start = time.perf_counter()
+                for i in range(n_cases):
+                    stage_case(
+                        base_case_folder, os.path.join(output, f"case_{i}"), mode
+                    )
+                times[mode].append(time.perf_counter() - start)
+                usage[mode] = disk_usage(output)
+
+    print(f"Staging {n_cases} cases from {base_case_folder}, best of {rounds}")
+    best = {mode: min(elapsed) for mode, elapsed in times.items()}
+    for mode in STAGING_MODES:
+        print(
+            f"{mode:>9}: {best[mode] / n_cases * 1e3:7.3f} ms/case "
+            f"(worst {max(times[mode]) / n_cases * 1e3:7.3f}), "
+            f"{usage[mode] / n_cases / 1024:7.1f} KiB/case, "
+            f"speedup vs copy {best['copy'] / best[mode]:5.2f}x"
+        )
+    print(f"Fastest on this filesystem: {min(best, key=best.get)}")
+
+
+if __name__ == "__main__":
+    base_case_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join("baseCase", "baseCase")
+    n_cases = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    bench_staging(base_case_folder, n_cases)
@@ -0,0 +1,350 @@
+"""
+Check the polyMesh that rodMaker.py writes directly for 1D and 2Dsmeared
+rods. Every mesh is checked for closed cells (by face areas and by edges),
+faces without repeated points, positive volumes, the upper-triangular face
+order and the rod volume; where blockMesh is
+installed, it is also compared with the blockMesh output of the same
+blockMeshDict (cell volumes, patch faces and cell zones, in any order).
+
+Usage: python benchmarks/check_polymesh.py [base_case_folder]
+"""
+
+import copy
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mesh_cache import load_rod_maker, read_rod_dict
+
+
+def reference_rod_dicts(rod_dict):
+    """Variants of the base case rodDict covering the supported options."""
+    smeared = dict(rod_dict, geometryType="2Dsmeared", wedgeAngle=2.0)
+    capped = dict(
+        smeared,
+        bottomCapHeight=5.0,
+        nCellsRBottomCap=6,
+        nCellsZBottomCap=3,
+        topCapHeight=7.0,
+        nCellsRTopCap=6,
+        nCellsZTopCap=4,
+    )
+    stacked = dict(
+        capped,
+        nBlocksFuel=2,
+        blockNameFuel=["fuel", "fuelTop"],
+        rInnerFuel=[0.0, 0.0],
+        rOuterFuel=rod_dict["rOuterFuel"] * 2,
+        heightFuel=[1500.0, 1500.0],
+        nCellsRFuel=rod_dict["nCellsRFuel"] * 2,
+        nCellsZFuel=[5, 3],
+    )
+    uncoupled = dict(
+        stacked,
+        rInnerFuel=[0.0, 1.0],
+        mergeFuelPatchPairs=False,
+        mergeCladPatchPairs=False,
+    )
+    return {
+        "1D": copy.deepcopy(rod_dict),
+        "2Dsmeared": smeared,
+        "2Dsmeared_caps": capped,
+        "2Dsmeared_stacked": stacked,
+        "2Dsmeared_uncoupled": uncoupled,
+    }
+
+
+def read_foam_list(path):
+    """Read the list of an ASCII polyMesh file as a list of number lists."""
+    with open(path) as file:
+        text = file.read()
+    text = text[text.index("}", text.index("FoamFile")) + 1 :]
+    start = re.search(r"\n\s*\d+\s*\(", text).end()
+    body = text[start : text.rindex(")")]
+    items = re.findall(r"\(([^()]*)\)", body)
+    if not items:
+        return [[float(value)] for value in body.split()]
+    return [[float(value) for value in item.split()] for item in items]
+
+
+def read_boundary(path):
+    """Return {patch: (type, nFaces, startFace)} of a boundary file."""
+    with open(path) as file:
+        text = file.read()
+    patches = {}
+    pattern = r"(\w+)\s*\{[^}]*?type\s+(\w+);[^}]*?nFaces\s+(\d+);\s*startFace\s+(\d+);"
+    for name, patch_type, n_faces, start_face in re.findall(pattern, text):
+        patches[name] = (patch_type, int(n_faces), int(start_face))
+    return patches
+
+
+def read_cell_zones(path):
+    """Return {zone: cell labels} of a cellZones file."""
+    with open(path) as file:
+        text = file.read()
+    zones = {}
+    pattern = r"(\w+)\s*\{\s*type\s+cellZone;\s*cellLabels\s+List<label>\s*(\d+)\s*\(([^)]*)\)"
+    for name, _, labels in re.findall(pattern, text):
+        zones[name] = np.array(labels.split(), dtype=int)
+    return zones
+
+
+def read_poly_mesh(folder):
+    points = np.array(read_foam_list(os.path.join(folder, "points")))
+    faces = [
+        np.array(face, dtype=int)
+        for face in read_foam_list(os.path.join(folder, "faces"))
+    ]
+    owner = np.array(read_foam_list(os.path.join(folder, "owner")), dtype=int).ravel()
+    neighbour = np.array(
+        read_foam_list(os.path.join(folder, "neighbour")), dtype=int
+    ).ravel()
+    return {
+        "points": points,
+        "faces": faces,
+        "owner": owner,
+        "neighbour": neighbour,
+        "patches": read_boundary(os.path.join(folder, "boundary")),
+        "cell_zones": read_cell_zones(os.path.join(folder, "cellZones")),
+    }
+
+
+def face_geometry(mesh):
+    """Centres and area vectors of the faces of a mesh."""
+    centres = np.array([mesh["points"][face].mean(axis=0) for face in mesh["faces"]])
+    areas = np.array(
+        [
+            0.5
+            * np.cross(mesh["points"][face], mesh["points"][np.roll(face, -1)]).sum(
+                axis=0
+            )
+            for face in mesh["faces"]
+        ]
+    )
+    return centres, areas
+
+
+def cell_geometry(mesh, centres, areas):
+    """Volumes, centres and closure error (sum of outward areas) of the cells."""
+    n_cells = mesh["owner"].max() + 1
+    n_internal = len(mesh["neighbour"])
+    volumes = np.zeros(n_cells)
+    closure = np.zeros((n_cells, 3))
+    centre_sums = np.zeros((n_cells, 3))
+    n_faces = np.zeros(n_cells)
+    flux = (centres * areas).sum(axis=1) / 3
+    np.add.at(volumes, mesh["owner"], flux)
+    np.add.at(volumes, mesh["neighbour"], -flux[:n_internal])
+    np.add.at(closure, mesh["owner"], areas)
+    np.add.at(closure, mesh["neighbour"], -areas[:n_internal])
+    np.add.at(centre_sums, mesh["owner"], centres)
+    np.add.at(centre_sums, mesh["neighbour"], centres[:n_internal])
+    np.add.at(n_faces, mesh["owner"], 1)
+    np.add.at(n_faces, mesh["neighbour"], 1)
+    return volumes, centre_sums / n_faces[:, None], closure
+
+
+def rod_volume(rod_dict):
+    """Volume of the fuel and cladding wedge described by a rodDict."""
+    angle = math.radians(rod_dict["wedgeAngle"])
+    # rodMaker.py corrects the wedge vertices so the wedge area is exact
+    sector = (
+        math.sin(angle / 2) * math.cos(angle / 2) * math.sin(angle / 2) / (angle / 2)
+    )
+    volume = 0.0
+    for part in ["Fuel", "Clad"]:
+        for r_inner, r_outer, height in zip(
+            rod_dict["rInner" + part],
+            rod_dict["rOuter" + part],
+            rod_dict["height" + part],
+        ):
+            volume += sector * (r_outer**2 - r_inner**2) * height
+    r_outer = rod_dict["rOuterClad"]
+    volume += sector * r_outer[0] ** 2 * rod_dict["bottomCapHeight"]
+    volume += sector * r_outer[-1] ** 2 * rod_dict["topCapHeight"]
+    return volume * rod_dict["convertToMeters"] ** 3
+
+
+def open_cells(mesh):
+    """Number of cells with an edge not shared by exactly two of their faces."""
+    n_cells = mesh["owner"].max() + 1
+    edges = [{} for _ in range(n_cells)]
+    cells = list(zip(mesh["owner"], mesh["neighbour"])) + [
+        (owner,) for owner in mesh["owner"][len(mesh["neighbour"]) :]
+    ]
+    for face, face_cells in zip(mesh["faces"], cells):
+        for edge in zip(face.tolist(), np.roll(face, -1).tolist()):
+            edge = tuple(sorted(edge))
+            for cell in face_cells:
+                edges[cell][edge] = edges[cell].get(edge, 0) + 1
+    return sum(any(n != 2 for n in cell.values()) for cell in edges)
+
+
+def check_mesh(mesh, rod_dict):
+    """Return a list of the structural errors of a mesh."""
+    errors = []
+    owner, neighbour = mesh["owner"], mesh["neighbour"]
+    centres, areas = face_geometry(mesh)
+    volumes, cell_centres, closure = cell_geometry(mesh, centres, areas)
+    scale = np.ptp(mesh["points"], axis=0).max()
+
+    if np.any(owner[: len(neighbour)] >= neighbour):
+        errors.append("internal face with owner >= neighbour")
+    if np.any(np.diff(owner[: len(neighbour)] * (len(owner) + 1) + neighbour) <= 0):
+        errors.append("internal faces not in upper-triangular order")
+    if volumes.min() <= 0:
+        errors.append(f"non-positive cell volume {volumes.min():g}")
+    face_area = np.linalg.norm(areas, axis=1).max()
+    if np.abs(closure).max() > 1e-9 * face_area:
+        errors.append(f"open cells, closure error {np.abs(closure).max():g}")
+    n_open = open_cells(mesh)
+    if n_open:
+        errors.append(f"{n_open} cells not closed by their face edges")
+    if any(len(set(face.tolist())) != len(face) for face in mesh["faces"]):
+        errors.append("face with a repeated point")
+    direction = cell_centres[neighbour] - cell_centres[owner[: len(neighbour)]]
+    if np.any((direction * areas[: len(neighbour)]).sum(axis=1) <= 0):
+        errors.append("internal face pointing toward its owner")
+    outward = centres[len(neighbour) :] - cell_centres[owner[len(neighbour) :]]
+    boundary_areas = areas[len(neighbour) :]
+    non_zero = np.linalg.norm(boundary_areas, axis=1) > 1e-12 * scale**2
+    if np.any((outward * boundary_areas).sum(axis=1)[non_zero] <= 0):
+        errors.append("boundary face pointing inward")
+    expected = rod_volume(rod_dict)
+    if not math.isclose(volumes.sum(), expected, rel_tol=1e-9):
+        errors.append(f"rod volume {volumes.sum():g} instead of {expected:g}")
+    n_faces = sum(n for _, n, _ in mesh["patches"].values())
+    if len(neighbour) + n_faces != len(mesh["faces"]):
+        errors.append("patches do not cover the boundary faces")
+    return errors
+
+
+def sorted_rows(values, centres):
+    """Rows of values sorted by the rounded centres they belong to."""
+    rounded = np.round(centres / np.abs(centres).max(), 5)
+    return values[np.lexsort(rounded.T[::-1])]
+
+
+def compare_meshes(direct, reference):
+    """Return a list of the differences between two meshes, in any order."""
+    differences = []
+    for name in ["points", "faces", "owner", "neighbour"]:
+        if len(direct[name]) != len(reference[name]):
+            differences.append(
+                f"{len(direct[name])} {name} instead of {len(reference[name])}"
+            )
+    if set(direct["patches"]) != set(reference["patches"]):
+        differences.append(
+            f"patches {sorted(direct['patches'])} instead of {sorted(reference['patches'])}"
+        )
+    if differences:
+        return differences
+
+    geometry = []
+    for mesh in [direct, reference]:
+        centres, areas = face_geometry(mesh)
+        volumes, cell_centres, _ = cell_geometry(mesh, centres, areas)
+        geometry.append((centres, areas, volumes, cell_centres))
+    scale = np.ptp(reference["points"], axis=0).max()
+
+    (centres, areas, volumes, cell_centres), reference_geometry = geometry
+    reference_centres, reference_areas, reference_volumes, reference_cell_centres = (
+        reference_geometry
+    )
+    cells = np.column_stack([cell_centres, volumes])
+    reference_cells = np.column_stack([reference_cell_centres, reference_volumes])
+    if not np.allclose(
+        sorted_rows(cells, cell_centres),
+        sorted_rows(reference_cells, reference_cell_centres),
+        rtol=1e-4,
+        atol=1e-5 * scale,
+    ):
+        differences.append("cell centres or volumes differ")
+
+    for name, (patch_type, n_faces, start) in reference["patches"].items():
+        direct_type, direct_n_faces, direct_start = direct["patches"][name]
+        if (direct_type, direct_n_faces) != (patch_type, n_faces):
+            differences.append(
+                f"patch {name}: {direct_type} with {direct_n_faces} faces "
+                f"instead of {patch_type} with {n_faces}"
+            )
+            continue
+        if n_faces == 0:
+            continue
+        patch = slice(direct_start, direct_start + n_faces)
+        reference_patch = slice(start, start + n_faces)
+        faces = np.column_stack([centres[patch], areas[patch]])
+        reference_faces = np.column_stack(
+            [reference_centres[reference_patch], reference_areas[reference_patch]]
+        )
+        if not np.allclose(
+            sorted_rows(faces, centres[patch]),
+            sorted_rows(reference_faces, reference_centres[reference_patch]),
+            rtol=1e-4,
+            atol=1e-5 * scale**2,
+        ):
+            differences.append(f"patch {name}: face centres or areas differ")
+
+    for name, cells in reference["cell_zones"].items():
+        direct_cells = direct["cell_zones"].get(name, [])
+        if len(direct_cells) != len(cells) or not np.allclose(
+            np.sort(volumes[direct_cells]),
+            np.sort(reference_volumes[cells]),
+            rtol=1e-4,
+        ):
+            differences.append(f"cell zone {name} differs")
+    return differences
+
+
+def check_polymesh(base_case_folder):
+    rod_maker = load_rod_maker(os.path.join(base_case_folder, "rodMaker.py"))
+    rod_dict = read_rod_dict(os.path.join(base_case_folder, "rodDict"))
+    has_block_mesh = shutil.which("blockMesh") is not None
+    if not has_block_mesh:
+        print("blockMesh not found, only checking the mesh structure")
+
+    n_failed = 0
+    for name, reference_dict in reference_rod_dicts(rod_dict).items():
+        with tempfile.TemporaryDirectory() as case_folder:
+            poly_mesh_folder = os.path.join(case_folder, "direct")
+            poly_mesh = rod_maker.makePolyMesh(reference_dict)
+            if poly_mesh is None:
+                print(f"{name:>20}: not supported by the direct writer")
+                continue
+            rod_maker.writePolyMesh(poly_mesh, poly_mesh_folder)
+            direct = read_poly_mesh(poly_mesh_folder)
+            problems = check_mesh(direct, reference_dict)
+
+            if has_block_mesh:
+                shutil.copytree(
+                    os.path.join(base_case_folder, "system"),
+                    os.path.join(case_folder, "system"),
+                )
+                rod_maker.writeBlockMeshDict(
+                    reference_dict, os.path.join(case_folder, "system", "blockMeshDict")
+                )
+                subprocess.run(
+                    ["blockMesh"], cwd=case_folder, check=True, capture_output=True
+                )
+                reference = read_poly_mesh(
+                    os.path.join(case_folder, "constant", "polyMesh")
+                )
+                problems += compare_meshes(direct, reference)
+
+            n_cells = direct["owner"].max() + 1
+            status = "ok" if not problems else "; ".join(problems)
+            print(f"{name:>20}: {n_cells:6d} cells, {status}")
+            n_failed += bool(problems)
+    return n_failed
+
+
+if __name__ == "__main__":
+    base_case_folder = sys.argv[1] if len(sys.argv) > 1 else "baseCase/baseCase"
+    sys.exit(1 if check_polymesh(base_case_folder) else 0)
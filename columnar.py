@@ -0,0 +1,198 @@
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from foam_dict import write_atomic
+
+SCHEMA_FILE = "schema.json"
+HEADER_LENGTH = 128  # Bytes reserved for the header of the .npy column files
+
+
+def column_file(index):
+    return f"column_{index}.npy"
+
+
+def npy_header(dtype, n_rows, header_length=HEADER_LENGTH):
+    """
+    Return a version 1.0 .npy header for a 1D array, padded to header_length
+    bytes so the row count can grow without moving the data.
+    """
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (int(n_rows),),
+        }
+    )
+    prefix = np.lib.format.magic(1, 0) + struct.pack("<H", header_length - 10)
+    padding = header_length - len(prefix) - len(header) - 1
+    if padding < 0:
+        return None
+    return prefix + (header + " " * padding + "\n").encode("latin1")
+
+
+def save_npy_atomic(path, values):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        values = np.ascontiguousarray(values)
+        if values.ndim == 1:
+            file.write(npy_header(values.dtype, len(values)))
+            file.write(values.tobytes())
+        else:
+            np.save(file, values)
+    os.replace(tmp_path, path)
+
+
+def append_npy(path, values):
+    """
+    Append values to the 1D array stored in a .npy file, in place.
+
+    The data is written after the existing rows, then the shape in the header
+    is updated. If the new header does not fit in the old one, the whole file
+    is rewritten.
+    """
+    with open(path, "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(file)
+        header = npy_header(dtype, shape[0] + len(values), file.tell())
+        if version == (1, 0) and header is not None:
+            file.seek(0, os.SEEK_END)
+            file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            file.flush()
+            file.seek(0)
+            file.write(header)
+            return
+
+    existing = np.load(path)
+    save_npy_atomic(path, np.concatenate([existing, np.asarray(values, dtype=dtype)]))
+
+
+class ColumnarWriter:
+    """
+    Write a columnar dataset block by block, without holding it in memory.
+
+    The column files are created from the first block, or taken from the
+    existing dataset with append=True. Every block is appended to them as it
+    comes; the schema is written last by close, so readers never see
+    partial rows.
+    """
+
+    def __init__(self, folder, append=False):
+        self.folder = folder
+        self.columns = None
+        self.n_rows = 0
+        if append:
+            schema = read_schema(folder)
+            self.columns = schema["columns"]
+            self.n_rows = schema["n_rows"]
+        os.makedirs(folder, exist_ok=True)
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = []
+            for index, name in enumerate(df.columns):
+                dtype = df[name].to_numpy().dtype
+                if dtype.kind not in "biuf":
+                    raise ValueError(f"Column '{name}' is not numeric ({dtype})")
+                save_npy_atomic(
+                    os.path.join(self.folder, column_file(index)),
+                    np.empty(0, dtype=dtype),
+                )
+                self.columns.append(
+                    {"name": name, "dtype": dtype.str, "file": column_file(index)}
+                )
+        for column in self.columns:
+            append_npy(os.path.join(self.folder, column["file"]), df[column["name"]])
+        self.n_rows += len(df)
+
+    def close(self, case_ranges):
+        write_schema(self.folder, self.columns or [], self.n_rows, case_ranges)
+
+
+def write_columnar(folder, df, case_ranges):
+    """
+    Write a DataFrame as a columnar dataset.
+
+    Every column is stored as a typed .npy file. schema.json lists the column
+    names, dtypes and files, the number of rows, and the (start, stop) rows
+    of each case.
+
+    Args:
+        folder (str): Dataset folder, created if needed.
+        df (DataFrame): Numeric columns only, rows ordered by case.
+        case_ranges (dict): (start, stop) rows of each case name.
+    """
+    writer = ColumnarWriter(folder)
+    writer.write(df)
+    writer.close(case_ranges)
+
+
+def write_schema(folder, columns, n_rows, case_ranges):
+    cases = [
+        {"name": name, "start": int(start), "stop": int(stop)}
+        for name, (start, stop) in case_ranges.items()
+    ]
+    write_atomic(
+        os.path.join(folder, SCHEMA_FILE),
+        json.dumps({"n_rows": int(n_rows), "columns": columns, "cases": cases}),
+    )
+
+
+def read_schema(folder):
+    with open(os.path.join(folder, SCHEMA_FILE), "r") as file:
+        return json.load(file)
+
+
+class ColumnarDataset:
+    """
+    Read-only view of a columnar dataset written by parse.py.
+
+    The columns are memory-mapped, so opening the dataset costs no parsing
+    and only the pages that are used are read from disk.
+
+    Example:
+        dataset = ColumnarDataset("simulation_results_columns")
+        df = dataset.to_dataframe()
+        temperature = dataset.case(case_name)["volAverage(T)"]
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.schema = read_schema(folder)
+        n_rows = self.schema["n_rows"]
+        # Rows appended after the schema was written are not part of it yet
+        self.columns = {
+            column["name"]: np.load(
+                os.path.join(folder, column["file"]), mmap_mode="r"
+            )[:n_rows]
+            for column in self.schema["columns"]
+        }
+        self.cases = {
+            case["name"]: slice(case["start"], case["stop"])
+            for case in self.schema["cases"]
+        }
+
+    def __len__(self):
+        return self.schema["n_rows"]
+
+    def case(self, case_name):
+        """Return the columns of one case as NumPy views."""
+        rows = self.cases[case_name]
+        return {name: values[rows] for name, values in self.columns.items()}
+
+    def to_dataframe(self):
+        """Return the dataset as a DataFrame backed by the memory-mapped columns."""
+        return pd.DataFrame(self.columns, copy=False)
+
+    def case_labels(self):
+        """Return an array with the case name of every row."""
+        labels = np.empty(len(self), dtype=object)
+        for case_name, rows in self.cases.items():
+            labels[rows] = case_name
+        return labels
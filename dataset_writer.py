@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+
+from columnar import ColumnarWriter
+
+chunk_rows = 200_000  # Rows buffered before a block is written to disk
+compression_extensions = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+def csv_compression(csv_path):
+    """Return the compression of a CSV path from its extension, or None."""
+    return compression_extensions.get(os.path.splitext(csv_path)[1])
+
+
+def dataset_stem(csv_path):
+    """Strip the compression and .csv extensions of a CSV path."""
+    if csv_compression(csv_path):
+        csv_path = os.path.splitext(csv_path)[0]
+    return os.path.splitext(csv_path)[0]
+
+
+class DatasetWriter:
+    """
+    Stream the rows of a dataset to a CSV file and a columnar dataset.
+
+    Case frames are buffered until `chunk_rows` rows are collected, then
+    written as one block to both outputs, so memory use does not grow with
+    the campaign size. The CSV is compressed if its name ends with .gz, .bz2
+    or .xz; every block is then a separate compressed stream, which pandas
+    and gzip read as one file. The columnar dataset is not compressed so it
+    can still be memory-mapped.
+
+    Args:
+        csv_path (str): CSV file to write.
+        columns_folder (str): Columnar dataset folder (see columnar.py).
+        append (bool): Append to the existing CSV and columnar dataset
+            instead of starting new ones.
+        chunk_rows (int): Rows per written block.
+    """
+
+    def __init__(self, csv_path, columns_folder, append=False, chunk_rows=chunk_rows):
+        self.csv_path = csv_path
+        self.compression = csv_compression(csv_path)
+        self.columnar = ColumnarWriter(columns_folder, append)
+        self.chunk_rows = chunk_rows
+        self.write_header = not append
+        self.buffer = []
+        self.n_buffered = 0
+        self.n_rows = 0
+        if not append and os.path.exists(csv_path):
+            os.remove(csv_path)
+
+    def write(self, df):
+        self.buffer.append(df)
+        self.n_buffered += len(df)
+        if self.n_buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        block = pd.concat(self.buffer, ignore_index=True)
+        self.buffer = []
+        self.n_buffered = 0
+
+        block.to_csv(
+            self.csv_path,
+            mode="a",
+            header=self.write_header,
+            index=False,
+            compression=self.compression,
+        )
+        self.write_header = False
+        self.columnar.write(block)
+        self.n_rows += len(block)
+
+    def close(self, case_ranges):
+        """Write the last block and the columnar schema."""
+        self.flush()
+        if self.write_header:
+            # No rows at all, still write an empty CSV
+            pd.DataFrame().to_csv(
+                self.csv_path, index=False, compression=self.compression
+            )
+        self.columnar.close(case_ranges)
@@ -2,12 +2,22 @@ import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.linalg import LinAlgError, cholesky, solve_triangular
 from sklearn.linear_model import LinearRegression, Ridge
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import PolynomialFeatures, StandardScaler
 from sklearn.metrics import mean_squared_error
 import time
 
+input_columns = [
+    "lhgr",
+    "fuel_radius",
+    "gap_size",
+    "clad_thickness",
+    "coolant_temperature",
+    "time",
+]
+
 
 def linear_regression_model(
     df,
@@ -24,16 +34,7 @@ def linear_regression_model(
         os.makedirs(folder)
 
     # Sélection des variables d'entrée et de sortie
-    X = df[
-        [
-            "lhgr",
-            "fuel_radius",
-            "gap_size",
-            "clad_thickness",
-            "coolant_temperature",
-            "time",
-        ]
-    ]
+    X = df[input_columns]
     y = df["volAverage(T)"]
 
     # Standardisation des données pour éviter les problèmes de conditionnement
@@ -136,35 +137,120 @@ def linear_regression_model(
     return model, mse, rmse
 
 
-def evaluate_rmse_time(df, folder="plots", regularization=False, alpha=1.0):
-    results = []  # Pour stocker les résultats
-    for degree in range(1, 11):  # Degré de 1 à 11
-        print(f"Evaluating degree {degree}...")
-        start_time = time.time()
-
-        # Appel de la fonction de régression avec l'expansion des caractéristiques
-        model, mse, rmse = linear_regression_model(
-            df,
-            feature_expansion=True,
-            regularization=regularization,
-            folder=folder,
-            alpha=alpha,
-            plot_and_save=False,
-            plot_coefs=False,
-            degree=degree,
-        )
+def monomial_blocks(X, max_degree):
+    """
+    Yield the monomials of each degree 1..max_degree of the columns of X, in
+    the order of PolynomialFeatures. Each degree is built from the previous
+    one: the monomials starting with variable j are x_j times the monomials
+    of the previous degree whose first variable is j or higher.
+    """
+    n_features = X.shape[1]
+    block = X
+    starts = np.arange(n_features)  # Premier monôme commençant par x_j
+    yield block
+    for degree in range(2, max_degree + 1):
+        products = [X[:, j : j + 1] * block[:, starts[j] :] for j in range(n_features)]
+        starts = np.cumsum([0] + [product.shape[1] for product in products[:-1]])
+        block = np.hstack(products)
+        yield block
+
+
+def polynomial_degree_sweep(X_train, y_train, X_test, max_degree=10, alpha=0.0):
+    """
+    Fit the least-squares models of the polynomial expansions of degree
+    1..max_degree incrementally, and yield (degree, predictions on X_test).
+
+    The model of each degree is the one LinearRegression (alpha=0) or
+    Ridge(alpha) fit on PolynomialFeatures(degree): columns are centered, so
+    the intercept is not penalized. The Gram matrix of the centered columns is
+    extended with the new monomials of each degree, and its Cholesky factor is
+    extended by one block instead of being recomputed, so the whole sweep
+    costs about as much as the fit of the largest degree.
+    """
+    y_mean = y_train.mean()
+    y_centered = y_train - y_mean
+    train_columns = np.empty((len(X_train), 0))
+    test_columns = np.empty((len(X_test), 0))
+    L = np.empty((0, 0))  # Facteur de Cholesky de la matrice de Gram
+    z = np.empty(0)  # L^-1 A^T y
+
+    blocks = zip(
+        monomial_blocks(X_train, max_degree), monomial_blocks(X_test, max_degree)
+    )
+    for degree, (train_block, test_block) in enumerate(blocks, start=1):
+        # Colonnes centrées et normées, pour le conditionnement de la matrice de Gram
+        mean = train_block.mean(axis=0)
+        train_block = train_block - mean
+        norm = np.linalg.norm(train_block, axis=0)
+        norm[norm == 0] = 1.0
+        train_block /= norm
+        test_block = (test_block - mean) / norm
+
+        # Extension de la matrice de Gram et de son facteur de Cholesky par blocs
+        K = solve_triangular(L, train_columns.T @ train_block, lower=True)
+        S = train_block.T @ train_block - K.T @ K
+        S[np.diag_indices_from(S)] += alpha / norm**2
+        jitter = np.finfo(float).eps * (len(L) + len(S))
+        while True:
+            try:
+                L22 = cholesky(S, lower=True)
+                break
+            except LinAlgError:
+                # Monômes numériquement dépendants des précédents
+                S[np.diag_indices_from(S)] += jitter
+                jitter *= 10
+        L = np.block([[L, np.zeros(K.shape)], [K.T, L22]])
+        z_new = solve_triangular(L22, train_block.T @ y_centered - K.T @ z, lower=True)
+        z = np.concatenate([z, z_new])
+
+        train_columns = np.hstack([train_columns, train_block])
+        test_columns = np.hstack([test_columns, test_block])
+        coefs = solve_triangular(L, z, lower=True, trans="T")
+        yield degree, y_mean + test_columns @ coefs
+
+
+def evaluate_rmse_time(
+    df, folder="plots", regularization=False, alpha=1.0, max_degree=10
+):
+    # Création du dossier si non existant
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # Standardisation et séparation faites une seule fois pour tous les degrés,
+    # comme dans linear_regression_model
+    X_scaled = StandardScaler().fit_transform(df[input_columns])
+    y = df["volAverage(T)"].to_numpy()
+    train, test = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
 
-        elapsed_time = time.time() - start_time  # Temps de calcul
-        print(f"Time for degree {degree}: {elapsed_time:.4f} seconds")
+    results = []  # Pour stocker les résultats
+    start_time = time.time()
+    step_start = start_time
+    sweep = polynomial_degree_sweep(
+        X_scaled[train],
+        y[train],
+        X_scaled[test],
+        max_degree=max_degree,
+        alpha=alpha if regularization else 0.0,
+    )
+    for degree, y_pred in sweep:
+        rmse = np.sqrt(mean_squared_error(y[test], y_pred))
+        elapsed_time = time.time() - step_start  # Temps de calcul de ce degré
+        print(f"Degree {degree}: RMSE {rmse}, time {elapsed_time:.4f} seconds")
 
         # Enregistrement des résultats dans la liste
         results.append(
-            {"Degree": degree, "RMSE": rmse, "Computation Time": elapsed_time}
+            {
+                "Degree": degree,
+                "RMSE": rmse,
+                "Computation Time": elapsed_time,
+                "Cumulative Time": time.time() - start_time,
+            }
         )
+        step_start = time.time()
 
-        # Sauvegarde dans un fichier CSV
-        results_df = pd.DataFrame(results)
-        results_df.to_csv(f"{folder}/evaluation_results.csv", index=False)
+    # Sauvegarde dans un fichier CSV
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(f"{folder}/evaluation_results.csv", index=False)
 
     # Lecture des résultats et tracé des courbes
     results_df = pd.read_csv(f"{folder}/evaluation_results.csv")
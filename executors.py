@@ -0,0 +1,236 @@
+import os
+import stat
+import subprocess
+import sys
+import time
+
+from scheduler import CampaignScheduler, available_cores, wait_with_usage
+
+SUBMIT_SCRIPT = """#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --array=1-{n_tasks}{concurrency}
+#SBATCH --ntasks=1
+#SBATCH --cpus-per-task=1
+#SBATCH --time={time_limit}
+#SBATCH --output={log_folder}/task_%a.out
+
+# Submit with: sbatch {submit_path}
+{launcher_path} "$SLURM_ARRAY_TASK_ID"
+"""
+
+TASK_LAUNCHER = """#!/bin/bash
+# Run one case of the job array. The task id (1-based line of the case list)
+# is given as first argument, or taken from SLURM_ARRAY_TASK_ID.
+TASK_ID=${{1:-$SLURM_ARRAY_TASK_ID}}
+CASE_FOLDER=$(sed -n "${{TASK_ID}}p" "{case_list_path}")
+if [ -z "$CASE_FOLDER" ]; then
+    echo "No case for task $TASK_ID" >&2
+    exit 1
+fi
+cd "$CASE_FOLDER" || exit 1
+rm -f log.exitCode
+
+# The exit code is written on every exit, also when the batch system stops
+# the task (SIGTERM at the time limit, before SIGKILL)
+trap 'echo $? > log.exitCode' EXIT
+trap 'kill -TERM -- "-$ALLRUN_PID" 2>/dev/null; exit 143' TERM INT
+
+# Allrun runs in its own process group, so the trap stops all its processes
+set -m
+./Allrun > log.Allrun 2>&1 &
+ALLRUN_PID=$!
+wait "$ALLRUN_PID"
+"""
+
+
+def new_export_id(array_folder):
+    """Return an export id, from the current time, not used in array_folder."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    export_id = stamp
+    suffix = 1
+    while os.path.exists(os.path.join(array_folder, f"cases_{export_id}.txt")):
+        suffix += 1
+        export_id = f"{stamp}-{suffix}"
+    return export_id
+
+
+def latest_export_id(array_folder):
+    """Return the id of the latest export in array_folder."""
+    export_ids = [
+        name[len("cases_") : -len(".txt")]
+        for name in os.listdir(array_folder)
+        if name.startswith("cases_") and name.endswith(".txt")
+    ]
+    if not export_ids:
+        raise FileNotFoundError(f"No exported job array in {array_folder}")
+    return max(
+        export_ids,
+        key=lambda export_id: (
+            os.path.getmtime(os.path.join(array_folder, f"cases_{export_id}.txt")),
+            export_id,
+        ),
+    )
+
+
+def make_executable(path):
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def read_task_exit_code(case_folder):
+    """Return the exit code written by the array task of a case, or None."""
+    path = os.path.join(case_folder, "log.exitCode")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return int(file.read().strip())
+
+
+class LocalExecutor:
+    """Run the cases of a campaign on this host, one per scheduler slot."""
+
+    submits_remotely = False
+
+    def __init__(self, max_parallel_runs=None):
+        self.scheduler = CampaignScheduler(max_parallel_runs)
+
+    def run(self, cases, prepare_case, run_case):
+        """Prepare and run every case. Returns (case, result) pairs."""
+        return self.scheduler.run(cases, prepare_case, run_case)
+
+
+class BatchArrayExecutor:
+    """
+    Export the cases of a campaign as a batch job array.
+
+    Cases are prepared locally as usual. Instead of running them, each export
+    writes to `array_folder`, with its own export id (e.g. 20240101-120000)
+    so that an export never overwrites an array that is not yet submitted:
+    - `cases_<id>.txt`, the list of the case folders;
+    - `submit_array_<id>.sh`, a SLURM job-array submission script;
+    - `run_array_task_<id>.sh`, the per-task launcher. It runs the Allrun of
+      one case and writes its exit code to `log.exitCode` in the case folder,
+      also when the task is terminated at the time limit.
+    `run_array_locally` executes the tasks on this host for testing.
+    """
+
+    submits_remotely = True
+
+    def __init__(
+        self,
+        array_folder,
+        job_name="offbeat_campaign",
+        time_limit="24:00:00",
+        max_concurrent_tasks=None,
+    ):
+        self.array_folder = array_folder
+        self.job_name = job_name
+        self.time_limit = time_limit
+        self.max_concurrent_tasks = max_concurrent_tasks
+
+    def run(self, cases, prepare_case, run_case=None):
+        """
+        Prepare every case and write the job array. Returns (case, None)
+        pairs for the exported cases; run_case is not used.
+        """
+        prepared = []
+        for case in cases:
+            try:
+                prepared_case = prepare_case(case)
+            except Exception as e:
+                print(f"Error preparing case {case}: {e}")
+                continue
+            if prepared_case is not None:
+                prepared.append(prepared_case)
+
+        case_folders = [
+            case["case_folder"] if isinstance(case, dict) else case for case in prepared
+        ]
+        if not case_folders:
+            print("No cases to export as a job array")
+            return []
+        self.write_array(case_folders)
+        return [(case, None) for case in prepared]
+
+    def write_array(self, case_folders):
+        """
+        Write the case list, the task launcher and the submission script of a
+        new export. Returns the export id, or None without writing anything
+        if there are no cases (an empty array is not a valid job array).
+        """
+        if not case_folders:
+            return None
+        array_folder = os.path.abspath(self.array_folder)
+        os.makedirs(array_folder, exist_ok=True)
+        export_id = new_export_id(array_folder)
+        log_folder = os.path.join(array_folder, "logs", export_id)
+        os.makedirs(log_folder)
+
+        case_list_path = os.path.join(array_folder, f"cases_{export_id}.txt")
+        launcher_path = os.path.join(array_folder, f"run_array_task_{export_id}.sh")
+        submit_path = os.path.join(array_folder, f"submit_array_{export_id}.sh")
+
+        with open(case_list_path, "w") as file:
+            for case_folder in case_folders:
+                file.write(os.path.abspath(case_folder) + "\n")
+
+        with open(launcher_path, "w") as file:
+            file.write(TASK_LAUNCHER.format(case_list_path=case_list_path))
+        make_executable(launcher_path)
+
+        concurrency = (
+            f"%{self.max_concurrent_tasks}" if self.max_concurrent_tasks else ""
+        )
+        with open(submit_path, "w") as file:
+            file.write(
+                SUBMIT_SCRIPT.format(
+                    job_name=self.job_name,
+                    n_tasks=len(case_folders),
+                    concurrency=concurrency,
+                    time_limit=self.time_limit,
+                    log_folder=log_folder,
+                    submit_path=submit_path,
+                    launcher_path=launcher_path,
+                )
+            )
+        make_executable(submit_path)
+
+        print(f"Wrote a job array of {len(case_folders)} cases to {submit_path}")
+        return export_id
+
+
+def run_array_locally(array_folder, export_id=None, max_parallel_runs=None):
+    """
+    Stand-in for the batch system: run every task of an exported job array
+    (by default the latest export) on this host. Returns (task_id, metrics)
+    pairs.
+    """
+    array_folder = os.path.abspath(array_folder)
+    if export_id is None:
+        export_id = latest_export_id(array_folder)
+    launcher_path = os.path.join(array_folder, f"run_array_task_{export_id}.sh")
+    with open(os.path.join(array_folder, f"cases_{export_id}.txt"), "r") as file:
+        n_tasks = sum(1 for line in file if line.strip())
+
+    def run_task(task_id):
+        env = {**os.environ, "SLURM_ARRAY_TASK_ID": str(task_id)}
+        log_path = os.path.join(array_folder, "logs", export_id, f"task_{task_id}.out")
+        with open(log_path, "w") as log_file:
+            started_at = time.time()
+            process = subprocess.Popen(
+                [launcher_path], env=env, stdout=log_file, stderr=subprocess.STDOUT
+            )
+        return wait_with_usage(process, started_at)
+
+    scheduler = CampaignScheduler(max_parallel_runs or available_cores())
+    return scheduler.run(range(1, n_tasks + 1), lambda task_id: task_id, run_task)
+
+
+if __name__ == "__main__":
+    # Usage: python executors.py <array_folder> [export_id]
+    # Runs an exported job array (the latest by default) locally; run.py
+    # collects the results.
+    array_folder = sys.argv[1] if len(sys.argv) > 1 else "simulation_cases/job_array"
+    export_id = sys.argv[2] if len(sys.argv) > 2 else None
+    results = run_array_locally(array_folder, export_id)
+    failed = [task_id for task_id, metrics in results if metrics["exit_code"] != 0]
+    print(f"Ran {len(results)} array tasks, {len(failed)} failed.")
@@ -0,0 +1,240 @@
+import ast
+import os
+import tempfile
+
+
+def format_value(value):
+    """Format a Python value as an OpenFOAM entry value."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return "(" + " ".join(format_value(v) for v in value) + ")"
+    return str(value)
+
+
+def write_atomic(path, text):
+    """Write text to path through a temporary file and an atomic rename."""
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+        # Keep the permissions of the file being replaced
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class FoamDictionary:
+    """
+    In-process reader/writer for OpenFOAM dictionary files.
+
+    The file is parsed once into an index of entry positions. Edits are
+    collected with `set` and applied together by `write`, which replaces only
+    the edited values so comments and formatting are kept. Entries are
+    addressed with '/'-separated paths as in `foamDictionary -entry`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "r") as file:
+            self.text = file.read()
+        self.entries = {}  # entry path -> (start, end) of the value text
+        self.dicts = {"": len(self.text)}  # dict path -> position of its '}'
+        self.edits = {}
+        self._parse_dict(0, "")
+
+    # Parsing
+
+    def _skip(self, pos):
+        """Skip whitespace and comments starting at pos."""
+        text = self.text
+        while pos < len(text):
+            if text[pos].isspace():
+                pos += 1
+            elif text.startswith("//", pos):
+                end = text.find("\n", pos)
+                pos = len(text) if end < 0 else end + 1
+            elif text.startswith("/*", pos):
+                end = text.find("*/", pos + 2)
+                pos = len(text) if end < 0 else end + 2
+            else:
+                break
+        return pos
+
+    def _skip_string(self, pos):
+        """Return the position after the quoted string starting at pos."""
+        text = self.text
+        pos += 1
+        while pos < len(text) and text[pos] != '"':
+            pos += 2 if text[pos] == "\\" else 1
+        return pos + 1
+
+    def _read_keyword(self, pos):
+        text = self.text
+        if text[pos] == '"':
+            end = self._skip_string(pos)
+            return text[pos + 1 : end - 1], end
+        start = pos
+        depth = 0
+        while pos < len(text):
+            char = text[pos]
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif depth == 0 and (char.isspace() or char in "{;"):
+                break
+            pos += 1
+        return text[start:pos], pos
+
+    def _read_value(self, pos):
+        """Return the end of the value starting at pos (position of its ';')."""
+        text = self.text
+        depth = 0
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                pos = self._skip_string(pos)
+                continue
+            if text.startswith("//", pos) or text.startswith("/*", pos):
+                pos = self._skip(pos)
+                continue
+            if char in "([{":
+                depth += 1
+            elif char in ")]}":
+                depth -= 1
+            elif char == ";" and depth == 0:
+                return pos
+            pos += 1
+        raise ValueError(f"Unterminated entry in {self.path}")
+
+    def _parse_dict(self, pos, prefix):
+        text = self.text
+        while True:
+            pos = self._skip(pos)
+            if pos >= len(text):
+                return pos
+            if text[pos] == "}":
+                self.dicts[prefix] = pos
+                return pos + 1
+            if text[pos] == "#":
+                # Directive such as #include or #includeEtc
+                end = text.find("\n", pos)
+                pos = len(text) if end < 0 else end
+                continue
+            if text[pos] == ";":
+                pos += 1
+                continue
+
+            keyword, pos = self._read_keyword(pos)
+            path = prefix + "/" + keyword if prefix else keyword
+            pos = self._skip(pos)
+
+            if pos < len(text) and text[pos] == "{":
+                pos = self._parse_dict(pos + 1, path)
+            else:
+                end = self._read_value(pos)
+                value_end = end
+                while value_end > pos and text[value_end - 1].isspace():
+                    value_end -= 1
+                self.entries[path] = (pos, value_end)
+                pos = end + 1
+
+    # Access
+
+    def __contains__(self, entry):
+        return entry in self.entries or entry in self.edits
+
+    def get(self, entry):
+        """Return the (possibly edited) value text of an entry."""
+        if entry in self.edits:
+            return self.edits[entry]
+        start, end = self.entries[entry]
+        return self.text[start:end]
+
+    def set(self, entry, value):
+        """Set an entry value. Missing entries are added to their parent dict."""
+        parent = entry.rpartition("/")[0]
+        if entry not in self.entries and parent not in self.dicts:
+            raise KeyError(f"Dictionary '{parent}' not found in {self.path}")
+        self.edits[entry] = format_value(value)
+
+    def write(self, path=None):
+        """Apply all pending edits in one pass and write the file atomically."""
+        path = path or self.path
+        replacements = []
+        for entry, value in self.edits.items():
+            if entry in self.entries:
+                start, end = self.entries[entry]
+                replacements.append((start, end, value))
+            else:
+                parent, _, keyword = entry.rpartition("/")
+                close = self.dicts[parent]
+                # Insert on its own line, just before the closing brace
+                line_start = self.text.rfind("\n", 0, close) + 1
+                if not self.text[line_start:close].strip():
+                    close = line_start
+                indent = "    " * (parent.count("/") + 1) if parent else ""
+                replacements.append((close, close, f"{indent}{keyword} {value};\n"))
+
+        text = self.text
+        for start, end, value in sorted(replacements, key=lambda r: r[0], reverse=True):
+            text = text[:start] + value + text[end:]
+
+        write_atomic(path, text)
+
+
+def patch_foam_dict(path, edits):
+    """Load an OpenFOAM dictionary once, apply all edits and write it back."""
+    foam_dict = FoamDictionary(path)
+    for entry, value in edits.items():
+        foam_dict.set(entry, value)
+    foam_dict.write()
+
+
+def patch_rod_dict(path, edits):
+    """
+    Replace entries of a rodDict (a Python dictionary literal) in place.
+
+    The file is parsed with `ast`, never evaluated, and only the source text
+    of the edited values is rewritten so the comment section is kept.
+    """
+    with open(path, "r") as file:
+        text = file.read()
+
+    tree = ast.parse(text, mode="eval")
+    if not isinstance(tree.body, ast.Dict):
+        raise ValueError(f"{path} does not contain a dictionary")
+
+    # Offsets of the start of each line, to convert ast positions
+    line_starts = [0]
+    for line in text.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    def offset(lineno, col):
+        # ast columns are UTF-8 byte offsets
+        line = text[line_starts[lineno - 1] :]
+        return line_starts[lineno - 1] + len(line.encode()[:col].decode())
+
+    replacements = []
+    for key, value in zip(tree.body.keys, tree.body.values):
+        name = ast.literal_eval(key)
+        if name in edits:
+            start = offset(value.lineno, value.col_offset)
+            end = offset(value.end_lineno, value.end_col_offset)
+            replacements.append((start, end, repr(edits[name])))
+
+    missing = set(edits) - {ast.literal_eval(key) for key in tree.body.keys}
+    if missing:
+        raise KeyError(f"Entries {sorted(missing)} not found in {path}")
+
+    for start, end, value in sorted(replacements, reverse=True):
+        text = text[:start] + value + text[end:]
+
+    write_atomic(path, text)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+
+from foam_dict import write_atomic
+
+
+def hash_file(path):
+    """Return the sha256 of a file content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_states(case_path, files):
+    """Return the size, mtime and sha256 of output files of a case."""
+    states = {}
+    for name in files:
+        path = os.path.join(case_path, name)
+        stat = os.stat(path)
+        states[name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hash_file(path),
+        }
+    return states
+
+
+def folder_states(case_path, folders):
+    """
+    Return the size and mtime of the folders of a case that exist. Adding
+    or removing a file changes the mtime of its folder.
+    """
+    states = {}
+    for name in folders:
+        try:
+            stat = os.stat(os.path.join(case_path, name))
+        except FileNotFoundError:
+            continue
+        states[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return states
+
+
+def states_key(states):
+    """Return a hash of the content of the files recorded in states."""
+    digest = hashlib.sha256()
+    for name in sorted(states):
+        digest.update(f"{name}\0{states[name]['sha256']}\0".encode())
+    return digest.hexdigest()
+
+
+class IngestIndex:
+    """
+    Record of what has been ingested into a dataset, stored as JSON.
+
+    For every case, the size, mtime and sha256 of each output file it was
+    parsed from, the number of rows it contributed and the time-series
+    checks of its rows as read (see quality.py) are stored, in the
+    order the rows appear in the dataset. The size of the dataset file is
+    kept as well, so an interrupted write is detected and triggers a full
+    rebuild instead of duplicated rows. An index written for another
+    `version` of the dataset layout is discarded.
+
+    Cases found without output are recorded apart, with the size and mtime
+    of the folders their output would be written to, so they are not parsed
+    again until one of these folders changes.
+    """
+
+    def __init__(self, path, version=1):
+        self.path = path
+        self.version = version
+        self.cases = {}
+        self.no_output = {}
+        self.dataset_size = None
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                state = json.load(file)
+            if state.get("version", 1) == version:
+                self.cases = state["cases"]
+                self.no_output = state.get("no_output", {})
+                self.dataset_size = state["dataset_size"]
+
+    def matches(self, dataset_path):
+        """Check that the dataset file is the one this index describes."""
+        return (
+            os.path.exists(dataset_path)
+            and os.path.getsize(dataset_path) == self.dataset_size
+        )
+
+    def clear(self):
+        self.cases = {}
+        self.no_output = {}
+        self.dataset_size = None
+
+    def is_current(self, case_name, case_path, files):
+        """
+        Check whether a case was ingested from exactly these files.
+
+        Size and mtime are compared first. When they differ, the content hash
+        decides, so a file that was only touched is not parsed again.
+        """
+        entry = self.cases.get(case_name)
+        if entry is None or sorted(entry["files"]) != sorted(files):
+            return False
+
+        for name in files:
+            stat = os.stat(os.path.join(case_path, name))
+            recorded = entry["files"][name]
+            if (stat.st_size, stat.st_mtime_ns) == (
+                recorded["size"],
+                recorded["mtime_ns"],
+            ):
+                continue
+            if hash_file(os.path.join(case_path, name)) != recorded["sha256"]:
+                return False
+            recorded["size"] = stat.st_size
+            recorded["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def add(self, case_name, states, n_rows, checks):
+        """
+        Record a case whose rows were just appended to the dataset. states
+        comes from file_states, taken before the files were parsed; checks
+        are the counts of quality.check_time_series on its rows as read.
+        """
+        self.cases.pop(case_name, None)
+        self.no_output.pop(case_name, None)
+        self.cases[case_name] = {"files": states, "n_rows": n_rows, "checks": checks}
+
+    def add_no_output(self, case_name, folders):
+        """
+        Record a case that has no output. folders comes from folder_states,
+        for the folders its output would be written to.
+        """
+        self.no_output[case_name] = folders
+
+    def has_no_output(self, case_name, folders):
+        """Check whether a case was found without output in these folders."""
+        return self.no_output.get(case_name) == folders
+
+    def remove(self, case_name):
+        self.cases.pop(case_name, None)
+        self.no_output.pop(case_name, None)
+
+    def row_ranges(self):
+        """Return the (start, stop) dataset rows of each case."""
+        ranges = {}
+        start = 0
+        for case_name, entry in self.cases.items():
+            ranges[case_name] = (start, start + entry["n_rows"])
+            start += entry["n_rows"]
+        return ranges
+
+    def save(self, dataset_path):
+        self.dataset_size = os.path.getsize(dataset_path)
+        write_atomic(
+            self.path,
+            json.dumps(
+                {
+                    "version": self.version,
+                    "dataset_size": self.dataset_size,
+                    "cases": self.cases,
+                    "no_output": self.no_output,
+                }
+            ),
+        )
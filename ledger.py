@@ -0,0 +1,291 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUBMITTED = "submitted"  # Exported to a batch job array, waiting for its result
+
+
+def hash_folder(folder):
+    """
+    Hash the relative paths and contents of every file below folder,
+    leaving out the Python bytecode caches.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(name for name in dirs if name != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".pyc"):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).encode())
+            with open(path, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def case_key(params, base_case_hash):
+    """Hash the case parameters together with the base case content."""
+    payload = json.dumps(
+        {name: float(value) for name, value in params.items()}, sort_keys=True
+    )
+    return hashlib.sha256((payload + base_case_hash).encode()).hexdigest()[:16]
+
+
+class CampaignLedger:
+    """
+    Persistent record of the cases of a campaign, stored in SQLite.
+
+    Each case is identified by a hash of its parameters and of the base case
+    content, and moves through the states pending -> running -> done/failed.
+    Failed cases are retried until they have used `max_attempts` attempts.
+    The ledger can be shared between the scheduler threads.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cases (
+                    key TEXT PRIMARY KEY,
+                    case_name TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS cases_status ON cases (status)"
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metrics (
+                    key TEXT NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    exit_code INTEGER,
+                    wall_time REAL,
+                    user_time REAL,
+                    system_time REAL,
+                    max_rss_kb INTEGER,
+                    started_at REAL,
+                    PRIMARY KEY (key, attempt)
+                )
+                """
+            )
+
+    def _execute(self, query, args=()):
+        with self.lock, self.connection:
+            return self.connection.execute(query, args).fetchall()
+
+    def register(self, key, case_name, params):
+        """Add a case as pending unless it is already known."""
+        params = {name: float(value) for name, value in params.items()}
+        self._execute(
+            "INSERT OR IGNORE INTO cases (key, case_name, params, status, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, case_name, json.dumps(params), PENDING, time.time()),
+        )
+
+    def status(self, key):
+        """Return (status, attempts) for a case, or None if it is unknown."""
+        rows = self._execute(
+            "SELECT status, attempts FROM cases WHERE key = ?", (key,)
+        )
+        return rows[0] if rows else None
+
+    def should_run(self, key):
+        """Whether a case is not finished and still has attempts left."""
+        status, attempts = self.status(key)
+        if status in (DONE, SUBMITTED):
+            return False
+        return attempts < self.max_attempts
+
+    def mark_running(self, key):
+        """Start a new attempt for a case."""
+        self._execute(
+            "UPDATE cases SET status = ?, attempts = attempts + 1, error = NULL, "
+            "updated_at = ? WHERE key = ?",
+            (RUNNING, time.time(), key),
+        )
+
+    def mark_done(self, key):
+        self._execute(
+            "UPDATE cases SET status = ?, updated_at = ? WHERE key = ?",
+            (DONE, time.time(), key),
+        )
+
+    def mark_submitted(self, key):
+        self._execute(
+            "UPDATE cases SET status = ?, updated_at = ? WHERE key = ?",
+            (SUBMITTED, time.time(), key),
+        )
+
+    def mark_failed(self, key, error):
+        self._execute(
+            "UPDATE cases SET status = ?, error = ?, updated_at = ? WHERE key = ?",
+            (FAILED, str(error), time.time(), key),
+        )
+
+    def record_metrics(self, key, metrics):
+        """Store the resource usage of the current attempt of a case."""
+        self._execute(
+            "INSERT OR REPLACE INTO metrics (key, attempt, exit_code, wall_time, "
+            "user_time, system_time, max_rss_kb, started_at) "
+            "SELECT key, attempts, ?, ?, ?, ?, ?, ? FROM cases WHERE key = ?",
+            (
+                metrics["exit_code"],
+                metrics["wall_time"],
+                metrics["user_time"],
+                metrics["system_time"],
+                metrics["max_rss_kb"],
+                metrics["started_at"],
+                key,
+            ),
+        )
+
+    def export_metrics(self, output_csv):
+        """
+        Write one row per case attempt with the case parameters and its
+        resource usage to a CSV file. Returns the number of rows written.
+        """
+        rows = self._execute(
+            "SELECT c.case_name, c.params, c.status, m.attempt, m.exit_code, "
+            "m.wall_time, m.user_time, m.system_time, m.max_rss_kb, m.started_at "
+            "FROM metrics m JOIN cases c ON c.key = m.key "
+            "ORDER BY c.case_name, m.attempt"
+        )
+        param_names = []
+        for row in rows:
+            for name in json.loads(row[1]):
+                if name not in param_names:
+                    param_names.append(name)
+
+        metric_names = [
+            "attempt",
+            "exit_code",
+            "wall_time",
+            "user_time",
+            "system_time",
+            "max_rss_kb",
+            "started_at",
+        ]
+        with open(output_csv, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["case_name"] + param_names + ["status"] + metric_names)
+            for case_name, params, status, *metrics in rows:
+                params = json.loads(params)
+                writer.writerow(
+                    [case_name]
+                    + [params.get(name) for name in param_names]
+                    + [status]
+                    + metrics
+                )
+        return len(rows)
+
+    def recover_interrupted(self):
+        """Mark cases left running by a crashed campaign as failed."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE cases SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ?",
+                (FAILED, "interrupted", time.time(), RUNNING),
+            )
+        return cursor.rowcount
+
+    def expire_submitted(self, timeout):
+        """
+        Mark as failed the cases submitted to a job array more than timeout
+        seconds ago that still have no result, e.g. because their task was
+        killed without a chance to write its exit code, lost with its node,
+        or never submitted. Returns the number of expired cases.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE cases SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND updated_at < ?",
+                (FAILED, "no array task result", now, SUBMITTED, now - timeout),
+            )
+        return cursor.rowcount
+
+    def progress(self):
+        """Return the number of cases in each state."""
+        counts = {PENDING: 0, RUNNING: 0, SUBMITTED: 0, DONE: 0, FAILED: 0}
+        for status, count in self._execute(
+            "SELECT status, COUNT(*) FROM cases GROUP BY status"
+        ):
+            counts[status] = count
+        return counts
+
+    def done_cases(self):
+        """Return (case_name, params) for every finished case."""
+        return [
+            (case_name, json.loads(params))
+            for case_name, params in self._execute(
+                "SELECT case_name, params FROM cases WHERE status = ?", (DONE,)
+            )
+        ]
+
+    def runtime_samples(self):
+        """Return (params, wall_time) for every successful run."""
+        return [
+            (json.loads(params), wall_time)
+            for params, wall_time in self._execute(
+                "SELECT c.params, m.wall_time FROM metrics m "
+                "JOIN cases c ON c.key = m.key WHERE m.exit_code = 0"
+            )
+        ]
+
+    def submitted_cases(self):
+        """Return (key, case_name) for every case waiting on a job array."""
+        return self._execute(
+            "SELECT key, case_name FROM cases WHERE status = ?", (SUBMITTED,)
+        )
+
+    def failed_cases(self):
+        """Return (case_name, attempts, error) for every failed case."""
+        return self._execute(
+            "SELECT case_name, attempts, error FROM cases WHERE status = ? "
+            "ORDER BY case_name",
+            (FAILED,),
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+def print_progress(ledger):
+    """Print a one-line summary of the campaign progress."""
+    counts = ledger.progress()
+    total = sum(counts.values())
+    print(
+        f"Campaign progress: {counts[DONE]}/{total} done, "
+        f"{counts[RUNNING]} running, {counts[SUBMITTED]} submitted, "
+        f"{counts[FAILED]} failed, "
+        f"{counts[PENDING]} pending."
+    )
+
+
+if __name__ == "__main__":
+    ledger_path = os.path.join("simulation_cases", "campaign.db")
+    if not os.path.exists(ledger_path):
+        print(f"No campaign ledger found at {ledger_path}.")
+    else:
+        ledger = CampaignLedger(ledger_path)
+        print_progress(ledger)
+        for case_name, attempts, error in ledger.failed_cases():
+            print(f"- {case_name} (attempts: {attempts}): {error}")
@@ -0,0 +1,186 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import types
+
+from staging import link_file
+
+
+def read_rod_dict(path):
+    """Read a rodDict file without evaluating it."""
+    with open(path, "r") as file:
+        return ast.literal_eval(file.read())
+
+
+def load_rod_maker(path):
+    """
+    Import the rodMaker.py script of a case as a module. The source is
+    compiled here instead of going through the import system, so no
+    __pycache__ folder is written next to it: it would change the hash of
+    the base case (see ledger.hash_folder).
+    """
+    with open(path, "r") as file:
+        code = compile(file.read(), path, "exec")
+    module = types.ModuleType("rodMaker")
+    module.__file__ = path
+    exec(code, module.__dict__)
+    return module
+
+
+def geometry_key(rod_dict, rod_maker_path):
+    """Hash the rodDict entries and the rodMaker.py script of a geometry."""
+    digest = hashlib.sha256(json.dumps(rod_dict, sort_keys=True).encode())
+    with open(rod_maker_path, "rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+class MeshCache:
+    """
+    Content-addressed cache of meshes shared across simulation cases.
+
+    The mesh only depends on the rodDict entries (and on rodMaker.py), so
+    each unique mesh is generated once with rodMaker.py and blockMesh in
+    `cache_folder/<key>` and then linked into the `constant/polyMesh` folder
+    of every case that shares it.
+    """
+
+    def __init__(self, cache_folder, mode="hardlink"):
+        self.cache_folder = cache_folder
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.prebuilt = set()
+        self.lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def mesh_key(self, case_folder):
+        """Hash the rodDict entries and the rodMaker.py script of a case."""
+        rod_dict = read_rod_dict(os.path.join(case_folder, "rodDict"))
+        return geometry_key(rod_dict, os.path.join(case_folder, "rodMaker.py"))
+
+    def build_mesh(self, case_folder, mesh_folder):
+        """Run rodMaker and blockMesh for a case geometry in mesh_folder."""
+        build_folder = mesh_folder + ".build"
+        if os.path.exists(build_folder):
+            shutil.rmtree(build_folder)  # Left over by an interrupted build
+
+        # blockMesh needs the system dictionaries next to the blockMeshDict
+        shutil.copytree(
+            os.path.join(case_folder, "system"), os.path.join(build_folder, "system")
+        )
+
+        # Write the blockMeshDict in-process with the rodMaker.py of the case
+        rod_maker = load_rod_maker(os.path.join(case_folder, "rodMaker.py"))
+        rod_dict = read_rod_dict(os.path.join(case_folder, "rodDict"))
+        rod_maker.writeBlockMeshDict(
+            rod_dict, os.path.join(build_folder, "system", "blockMeshDict")
+        )
+
+        # 1D and 2Dsmeared meshes are written directly, without blockMesh
+        poly_mesh = (
+            rod_maker.makePolyMesh(rod_dict)
+            if rod_maker.writePolyMeshDirectly
+            else None
+        )
+        if poly_mesh is not None:
+            rod_maker.writePolyMesh(
+                poly_mesh, os.path.join(build_folder, "constant", "polyMesh")
+            )
+        else:
+            self.run_block_mesh(build_folder)
+
+        # Publish the finished mesh in one rename
+        os.rename(build_folder, mesh_folder)
+
+    def build_meshes(self, base_case_folder, rod_dicts):
+        """
+        Generate the missing meshes of many geometries in one process.
+
+        The rodDicts are the entries of the base case rodDict with the edits
+        of each case. Their blockMeshDicts and polyMeshes are written together
+        by rodMaker.writeRodMeshes, which builds the topology shared by the
+        geometries once; blockMesh only runs for the meshes it cannot write.
+        Returns the number of meshes generated.
+        """
+        rod_maker_path = os.path.join(base_case_folder, "rodMaker.py")
+        missing = {}
+        for rod_dict in rod_dicts:
+            key = geometry_key(rod_dict, rod_maker_path)
+            mesh_folder = os.path.join(self.cache_folder, key)
+            if key not in missing and not os.path.isdir(mesh_folder):
+                missing[key] = rod_dict
+        if not missing:
+            return 0
+
+        build_folders = {}
+        for key in missing:
+            build_folder = os.path.join(self.cache_folder, key) + ".build"
+            if os.path.exists(build_folder):
+                shutil.rmtree(build_folder)  # Left over by an interrupted build
+            shutil.copytree(
+                os.path.join(base_case_folder, "system"),
+                os.path.join(build_folder, "system"),
+            )
+            build_folders[key] = build_folder
+
+        rod_maker = load_rod_maker(rod_maker_path)
+        need_block_mesh = rod_maker.writeRodMeshes(
+            list(missing.values()), list(build_folders.values())
+        )
+        for build_folder in need_block_mesh:
+            self.run_block_mesh(build_folder)
+
+        # Publish the finished meshes; link_mesh counts them as misses
+        for key, build_folder in build_folders.items():
+            os.rename(build_folder, os.path.join(self.cache_folder, key))
+        self.prebuilt.update(missing)
+        return len(missing)
+
+    def run_block_mesh(self, build_folder):
+        """Run blockMesh on the blockMeshDict of build_folder."""
+        with open(os.path.join(build_folder, "log.blockMesh"), "w") as log_file:
+            code = subprocess.run(
+                ["blockMesh"],
+                cwd=build_folder,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            ).returncode
+        if code != 0:
+            raise RuntimeError(
+                f"blockMesh failed with code {code}, see {build_folder}/log.blockMesh"
+            )
+
+    def link_mesh(self, case_folder):
+        """Provide the mesh of a case from the cache. Returns the mesh key."""
+        key = self.mesh_key(case_folder)
+        mesh_folder = os.path.join(self.cache_folder, key)
+
+        with self.lock:
+            if key in self.prebuilt:
+                self.prebuilt.discard(key)
+                self.misses += 1
+            elif os.path.isdir(mesh_folder):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.build_mesh(case_folder, mesh_folder)
+
+        shutil.copytree(
+            os.path.join(mesh_folder, "constant", "polyMesh"),
+            os.path.join(case_folder, "constant", "polyMesh"),
+            copy_function=lambda src, dst: link_file(src, dst, self.mode),
+        )
+        return key
+
+    def print_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        print(
+            f"Mesh cache: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.0%} hit rate, {self.misses} meshes generated)."
+        )
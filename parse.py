@@ -1,5 +1,35 @@
 import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
+from columnar import ColumnarDataset, read_schema
+from dataset_writer import DatasetWriter, chunk_rows, dataset_stem
+from ingest_index import IngestIndex, file_states, folder_states, states_key
+from ledger import CampaignLedger
+from probes import (
+    cache_case_probes,
+    load_case_probes,
+    probe_cache_key,
+    probe_fields,
+    probe_files,
+    write_probe_dataset,
+)
+from quality import check_dataset, check_time_series, print_summary
+from resampling import resample_case
+from scheduler import available_cores
+from segments import folder_time, segment_files, stitch_segments
+
+parameter_columns = [
+    "lhgr",
+    "fuel_radius",
+    "gap_size",
+    "clad_thickness",
+    "coolant_temperature",
+]
 
 
 def extract_parameters_from_directory(directory_name):
@@ -46,64 +76,480 @@ def parse_volFieldValue_dat(filepath):
     return results
 
 
-def process_simulation_data(base_folder, output_csv):
+vol_field_columns = ["time", "volAverage(T)", "volAverage(Bu)"]
+
+
+def parse_float_column(values):
     """
-    Traverse the directory tree, process volFieldValue.dat files, and create a CSV.
+    Convert a column of strings to float64 like float() does. Returns the
+    values and a mask of the entries that are not numbers; literal nan
+    entries are kept as NaN, like in parse_volFieldValue_dat.
     """
-    data = []
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+    failed = np.isnan(numbers)
+    if failed.any():
+        strings = values[failed].astype(str).str.strip().str.lower()
+        failed[failed] = strings.str.lstrip("+-").to_numpy() != "nan"
+    return numbers, failed
+
 
-    for root, dirs, _ in os.walk(base_folder):
-        for directory in dirs:
-            case_path = os.path.join(root, directory)
-            print(f"Checking case directory: {case_path}")
+def read_volFieldValue_dat(filepath):
+    """
+    Read a whole volFieldValue.dat file at once with the pandas C parser.
 
-            # Construct the path to volFieldValue.dat
-            dat_file_path = os.path.join(
-                case_path,
-                "postProcessing",
-                "averageTemperatureAndBurnup",
-                "0",
-                "volFieldValue.dat",
-            )
-            print(f"Looking for file: {dat_file_path}")
+    Returns a dict with one float64 array per column of `vol_field_columns`.
+    Lines with a wrong number of columns or non-numeric values are skipped,
+    like in parse_volFieldValue_dat; nan and inf values are kept, so that
+    quality.py reports them.
+    """
+    try:
+        # No NA markers: only numbers give float columns, the other values
+        # (nan, empty or truncated fields) are checked below
+        df = pd.read_csv(
+            filepath,
+            sep="\t",
+            comment="#",
+            header=None,
+            names=vol_field_columns,
+            engine="c",
+            on_bad_lines="skip",
+            keep_default_na=False,
+            na_values=[],
+        )
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=vol_field_columns, dtype=np.float64)
 
-            if os.path.exists(dat_file_path):
-                print(f"Found file: {dat_file_path}")
+    columns = {}
+    invalid = np.zeros(len(df), dtype=bool)
+    for name in vol_field_columns:
+        if pd.api.types.is_numeric_dtype(df[name]):
+            columns[name] = df[name].to_numpy(dtype=np.float64)
+        else:
+            columns[name], failed = parse_float_column(df[name])
+            invalid |= failed
+    if invalid.any():
+        print(f"Skipped {int(invalid.sum())} invalid lines in {filepath}")
+        columns = {name: values[~invalid] for name, values in columns.items()}
+    return columns
 
-                # Extract parameters from the case directory name
-                params = extract_parameters_from_directory(directory)
-                print(f"Extracted parameters: {params}")
 
-                # Parse the volFieldValue.dat file for simulation results
-                results = parse_volFieldValue_dat(dat_file_path)
+def find_cases(base_folder):
+    """
+    Return the sorted (name, path) pairs of the case folders directly below
+    base_folder. Only one directory level is scanned.
+    """
+    with os.scandir(base_folder) as entries:
+        return sorted(
+            (entry.name, entry.path)
+            for entry in entries
+            if entry.name.startswith("lhgr_") and entry.is_dir()
+        )
 
-                if not results:
-                    print(f"No valid data found in file: {dat_file_path}")
 
-                # Combine parameters with each simulation result row
-                for result in results:
-                    row = {**params, **result}
-                    data.append(row)
-            else:
-                print(f"File not found: {dat_file_path}")
+def read_rod_pressure_dat(filepath):
+    """
+    Read the output of the writePressure (rodPressure) function object.
 
-    # Check if data was collected
-    if not data:
-        print("No data was collected. Check your folder structure and file contents.")
+    Returns a dict with the float64 arrays "time" and "rodPressure", taken
+    from the first two whitespace-separated columns.
+    """
+    try:
+        df = pd.read_csv(
+            filepath,
+            sep=r"\s+",
+            comment="#",
+            header=None,
+            usecols=[0, 1],
+            names=["time", "rodPressure"],
+            engine="c",
+            on_bad_lines="skip",
+        )
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=["time", "rodPressure"])
+
+    df = df.apply(pd.to_numeric, errors="coerce").dropna()
+    return {name: df[name].to_numpy(dtype=np.float64) for name in df.columns}
+
+
+def join_rod_pressure(results, pressure):
+    """
+    As-of join of the rod pressure on the time of the T/Bu rows: each row
+    gets the last pressure written at or before its time (NaN before the
+    first one). Both arguments are dicts of column arrays. Rows with a NaN
+    time are dropped.
+    """
+    results = pd.DataFrame(results)
+    # Rows without a valid time cannot be placed in time
+    finite_time = np.isfinite(results["time"].to_numpy())
+    if not finite_time.all():
+        print(f"Dropped {int((~finite_time).sum())} rows without a valid time")
+        results = results[finite_time]
+    results = results.sort_values("time", kind="stable")
+    pressure = pd.DataFrame(pressure).sort_values("time", kind="stable")
+    return pd.merge_asof(results, pressure, on="time", direction="backward")
+
+
+# Bump when the columns of the dataset or the index entries change, to
+# re-ingest every case
+dataset_version = 4
+
+vol_field_object = "averageTemperatureAndBurnup"
+rod_pressure_object = "writePressure"
+
+
+def vol_field_files(case_path):
+    """Return the volFieldValue.dat files of every time segment of a case."""
+    return segment_files(case_path, vol_field_object, "volFieldValue.dat")
+
+
+def rod_pressure_files(case_path):
+    """Return the .dat files of the writePressure function object."""
+    folder = os.path.join(case_path, "postProcessing", rod_pressure_object)
+    try:
+        first_segment = min(
+            (name for name in os.listdir(folder) if folder_time(name) is not None),
+            key=folder_time,
+        )
+    except (FileNotFoundError, ValueError):
+        return []
+    names = sorted(
+        name
+        for name in os.listdir(os.path.join(folder, first_segment))
+        if name.endswith(".dat")
+    )
+    return segment_files(case_path, rod_pressure_object, names[0]) if names else []
+
+
+def read_segments(case_path, files, read_dat):
+    """Read the output files of the time segments of a case and stitch them."""
+    return stitch_segments([read_dat(os.path.join(case_path, path)) for path in files])
+
+
+def read_case_vol_field(case_path):
+    """
+    Return the volFieldValue.dat columns of a case, stitched across restarts,
+    or None if the case has no volFieldValue.dat file.
+    """
+    return read_segments(case_path, vol_field_files(case_path), read_volFieldValue_dat)
+
+
+def vol_field_folders(case_path):
+    """
+    Return the folders a new volFieldValue.dat file of a case would change,
+    relative to the case folder: the case and postProcessing folders, the
+    function object folder and its time segments.
+    """
+    folder = os.path.join("postProcessing", vol_field_object)
+    try:
+        segments = sorted(os.listdir(os.path.join(case_path, folder)))
+    except FileNotFoundError:
+        segments = []
+    return ["", "postProcessing", folder] + [
+        os.path.join(folder, name) for name in segments
+    ]
+
+
+def case_output_files(case_path):
+    """
+    Return the output files parse_case reads and the probes files,
+    relative to the case folder.
+    """
+    files = vol_field_files(case_path)
+    if not files:
+        return []
+    files += rod_pressure_files(case_path)
+    for field in probe_fields:
+        files += probe_files(case_path, field)
+    return files
+
+
+def parse_case(case, resample=None):
+    """
+    Read the results of one case. Returns a DataFrame with the case
+    parameters broadcast over the result rows, or None if the case has no
+    volFieldValue.dat file. The output of restarted runs is stitched across
+    time segments. The rod pressure is joined on time; it is NaN if the case
+    has no writePressure output. With resample set to a method of
+    resampling.py, the rows are resampled before the parameters are added.
+
+    The counts of quality.check_time_series on the stitched rows, taken
+    before the join sorts them by time, are returned along with the
+    DataFrame (None if there is no volFieldValue.dat file).
+    """
+    directory, case_path = case
+    results = read_case_vol_field(case_path)
+    if results is None:
+        return None, None
+
+    params = extract_parameters_from_directory(directory)
+    if not len(results["time"]):
+        print(f"No valid data found in case: {case_path}")
+    checks = check_time_series(results)
+
+    pressure = read_segments(
+        case_path, rod_pressure_files(case_path), read_rod_pressure_dat
+    )
+    if pressure is None:
+        pressure = {"time": np.empty(0), "rodPressure": np.empty(0)}
+    results = join_rod_pressure(results, pressure)
+    if resample:
+        results = resample_case(results, resample)
+
+    # Parameters missing from a malformed name are NaN, see quality.py
+    for position, name in enumerate(parameter_columns):
+        results.insert(position, name, np.full(len(results), params.get(name, np.nan)))
+    return results, checks
+
+
+def ingest_case(case, resample=None, probe_cache=None):
+    """
+    Record the state of the output files of a case, then parse it. With
+    probe_cache set to a folder, the probes of the case are saved there as
+    well (see update_probe_dataset).
+
+    Returns the file states, the DataFrame and the checks of parse_case. For
+    a case without volFieldValue.dat file, the DataFrame is None and the
+    states are those of the folders its output would be written to.
+    """
+    name, case_path = case
+    files = case_output_files(case_path)
+    if not files:
+        return folder_states(case_path, vol_field_folders(case_path)), None, None
+    states = file_states(case_path, files)
+    frame, checks = parse_case(case, resample)
+    if probe_cache and frame is not None:
+        cache_case_probes(
+            case_path, probe_cache_path(probe_cache, name), states_key(states)
+        )
+    return states, frame, checks
+
+
+def columnar_ranges(folder):
+    """Return the case row ranges of a columnar dataset, or None if it is missing."""
+    try:
+        schema = read_schema(folder)
+    except FileNotFoundError:
+        return None
+    return {case["name"]: (case["start"], case["stop"]) for case in schema["cases"]}
+
+
+def probe_cache_path(folder, case_name):
+    """Return the probe cache file of a case (see update_probe_dataset)."""
+    return os.path.join(folder, case_name + ".npz")
+
+
+def update_probe_dataset(folder, cache_folder, cases, index, max_workers):
+    """
+    Save the probe tensors of the ingested cases. The probes of every case
+    are cached at ingestion, tagged with the content of the files recorded
+    in the ingestion index; only the cases whose cache is missing or out of
+    date are read again, in a process pool. The caches of the cases no
+    longer in the index are removed.
+    """
+    cases = [(name, case_path) for name, case_path in cases if name in index.cases]
+    keep = {os.path.basename(probe_cache_path(cache_folder, name)) for name, _ in cases}
+    for file_name in os.listdir(cache_folder):
+        if file_name not in keep:
+            os.remove(os.path.join(cache_folder, file_name))
+
+    missing = []
+    for name, case_path in cases:
+        path = probe_cache_path(cache_folder, name)
+        key = states_key(index.cases[name]["files"])
+        if probe_cache_key(path) != key:
+            missing.append((case_path, path, key))
+    if missing:
+        chunksize = max(1, len(missing) // (4 * max_workers))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(cache_case_probes, *zip(*missing), chunksize=chunksize))
+
+    def load_probes(name):
+        return load_case_probes(probe_cache_path(cache_folder, name))[0]
+
+    locations = None
+    for name, _ in cases:
+        probes, locations = load_case_probes(probe_cache_path(cache_folder, name))
+        if probes is not None:
+            break
+    names = [name for name, _ in cases]
+    n_found = write_probe_dataset(folder, names, load_probes, locations)
+    print(f"Saved the probes of {n_found} cases to {folder}")
+
+
+def imap_bounded(executor, function, items, window):
+    """
+    Like executor.map, but with at most `window` tasks submitted ahead, so
+    finished results do not pile up in memory while they are written.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def read_kept_rows(csv_path, case_ranges, removed, chunk_rows):
+    """
+    Yield the rows of a dataset CSV in blocks of chunk_rows, without the
+    rows of the removed cases.
+    """
+    starts = np.array([start for start, _ in case_ranges.values()], dtype=np.int64)
+    is_removed = np.array([name in removed for name in case_ranges])
+    offset = 0
+    for chunk in pd.read_csv(
+        csv_path, chunksize=chunk_rows, float_precision="round_trip"
+    ):
+        rows = np.arange(offset, offset + len(chunk))
+        case_index = np.searchsorted(starts, rows, side="right") - 1
+        offset += len(chunk)
+        yield chunk[~is_removed[case_index]]
+
+
+def process_simulation_data(
+    base_folder, output_csv, max_workers=None, chunk_rows=chunk_rows, resample=None
+):
+    """
+    Find the case folders below base_folder, parse their volFieldValue.dat
+    and rod pressure files across a process pool, and update the CSV.
+
+    Only new or changed cases are parsed, as recorded by the ingestion index
+    next to the CSV (`<output_csv>.index.json`); cases without output are
+    skipped until their output folders change. The rows of new cases are
+    appended; the CSV is only rewritten when cases changed or disappeared.
+    The same rows are kept in a columnar dataset (`<output_csv>_columns`,
+    see columnar.py) that can be memory-mapped without parsing, and the
+    probe time series of the cases as (case, time, probe) tensors
+    (`<output_csv>_probes`, see probes.py), built from the probes of each
+    case cached at ingestion (`<output_csv>_probe_cache`).
+
+    Rows are streamed to disk in blocks of chunk_rows (see
+    dataset_writer.py), so memory use does not grow with the campaign. The
+    CSV is compressed if output_csv ends with .gz, .bz2 or .xz.
+
+    resample ("burnup", "log_time" or "lttb", see resampling.py) shrinks the
+    time series of every case at ingestion, instead of keeping every time
+    step.
+
+    The whole dataset is then checked by quality.py, with one row per case
+    in `<output_csv>_quality.csv`. The time steps and NaN/inf values are
+    also counted on the rows of each case as read, before they are sorted
+    for the rod pressure join, and kept in the ingestion index.
+    """
+    max_workers = max_workers or available_cores()
+    # Changing the resampling method changes every row, so it is part of the
+    # version of the dataset
+    index = IngestIndex(output_csv + ".index.json", [dataset_version, resample])
+    if not index.matches(output_csv):
+        index.clear()  # Missing or partly written CSV, rebuild it
+
+    cases = find_cases(base_folder)
+    case_names = {name for name, _ in cases}
+    to_parse = [
+        (name, case_path)
+        for name, case_path in cases
+        if not index.is_current(name, case_path, case_output_files(case_path))
+        and not index.has_no_output(
+            name, folder_states(case_path, vol_field_folders(case_path))
+        )
+    ]
+    for name in list(index.no_output):
+        if name not in case_names:
+            index.remove(name)
+    stale = [name for name in index.cases if name not in case_names]
+    stale += [name for name, _ in to_parse if name in index.cases]
+    print(
+        f"Found {len(cases)} case folders in {base_folder}: "
+        f"{len(to_parse)} new or changed, {len(stale)} to replace or remove"
+    )
+
+    stem = dataset_stem(output_csv)
+    columns_folder = stem + "_columns"
+    old_ranges = index.row_ranges()
+    # Appending is only possible if the columnar dataset matches the CSV
+    rewrite = stale or not index.cases or columnar_ranges(columns_folder) != old_ranges
+    if rewrite:
+        folder, name = os.path.split(output_csv)
+        csv_path = os.path.join(folder, ".tmp_" + name)
+        writer = DatasetWriter(csv_path, columns_folder + ".tmp", False, chunk_rows)
     else:
-        print(f"Collected {len(data)} rows of data.")
+        writer = DatasetWriter(output_csv, columns_folder, True, chunk_rows)
+
+    probe_cache = stem + "_probe_cache"
+    os.makedirs(probe_cache, exist_ok=True)
+
+    n_missing = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        ingested = imap_bounded(
+            executor,
+            partial(ingest_case, resample=resample, probe_cache=probe_cache),
+            to_parse,
+            4 * max_workers,
+        )
+        if rewrite and index.cases:
+            # Keep the rows of the unchanged cases
+            for block in read_kept_rows(output_csv, old_ranges, set(stale), chunk_rows):
+                writer.write(block)
+        for name in stale:
+            index.remove(name)
+
+        for (name, _), (states, frame, checks) in zip(to_parse, ingested):
+            if frame is None:
+                # Not parsed again until its output folders change
+                index.add_no_output(name, states)
+                n_missing += 1
+                continue
+            writer.write(frame)
+            index.add(name, states, len(frame), checks)
+
+    writer.close(index.row_ranges())
+    if rewrite:
+        os.replace(csv_path, output_csv)
+        if os.path.exists(columns_folder):
+            shutil.rmtree(columns_folder)
+        os.rename(columns_folder + ".tmp", columns_folder)
+    index.save(output_csv)
+
+    if n_missing:
+        print(f"{n_missing} cases have no volFieldValue.dat file")
+    if not index.cases:
+        print("No data was collected. Check your folder structure and file contents.")
+
+    # The time-series checks of the rows as read, before the join sorted them
+    time_series_checks = {name: entry["checks"] for name, entry in index.cases.items()}
+    report = check_dataset(
+        ColumnarDataset(columns_folder), parameter_columns, time_series_checks
+    )
+    report.to_csv(stem + "_quality.csv")
+    print_summary(report)
+
+    # The probe tensors share one time index, so they are rebuilt from the
+    # per-case caches on changes
+    probes_dataset_folder = stem + "_probes"
+    if to_parse or stale or not os.path.exists(probes_dataset_folder):
+        update_probe_dataset(
+            probes_dataset_folder, probe_cache, cases, index, max_workers
+        )
 
-    # Convert the collected data into a DataFrame
-    df = pd.DataFrame(data)
+    n_rows = sum(entry["n_rows"] for entry in index.cases.values())
+    print(
+        f"Data successfully saved to {output_csv}: {n_rows} rows from {len(index.cases)} cases"
+    )
 
-    # Save to a CSV file
-    df.to_csv(output_csv, index=False)
-    print(f"Data successfully saved to {output_csv}")
 
+if __name__ == "__main__":
+    # Specify the base folder containing simulation cases and the output CSV file name
+    base_folder = "simulation_cases"
+    output_csv = "simulation_results.csv"
+    resample = None  # Or "burnup", "log_time", "lttb" to shrink the time series
 
-# Specify the base folder containing simulation cases and the output CSV file name
-base_folder = "simulation_cases"
-output_csv = "simulation_results.csv"
+    # Run the script
+    process_simulation_data(base_folder, output_csv, resample=resample)
 
-# Run the script
-process_simulation_data(base_folder, output_csv)
+    # Export the per-case resource usage recorded by run.py next to the results
+    ledger_path = os.path.join(base_folder, "campaign.db")
+    metrics_csv = "campaign_metrics.csv"
+    if os.path.exists(ledger_path):
+        n_rows = CampaignLedger(ledger_path).export_metrics(metrics_csv)
+        print(f"Exported {n_rows} case metrics to {metrics_csv}")
@@ -0,0 +1,279 @@
+import json
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from columnar import save_npy_atomic
+from foam_dict import write_atomic
+from segments import segment_files, stitch_segments
+
+probe_fields = ["T", "Bu"]
+block_bytes = 2**24  # Bytes of a probe tensor written through one mapping
+location_pattern = re.compile(r"^#\s*Probe\s+\d+\s*\(([^)]*)\)", re.MULTILINE)
+
+
+def read_probe_file(filepath):
+    """
+    Read a scalar probes output file (e.g. postProcessing/probes/0/T).
+
+    Returns the times and a float32 array with one row per time and one
+    column per probe.
+    """
+    try:
+        df = pd.read_csv(
+            filepath, sep=r"\s+", comment="#", header=None, engine="c"
+        ).apply(pd.to_numeric, errors="coerce")
+    except pd.errors.EmptyDataError:
+        return np.empty(0), np.empty((0, 0), dtype=np.float32)
+    df = df.dropna()
+    return df[0].to_numpy(np.float64), df.iloc[:, 1:].to_numpy(np.float32)
+
+
+def read_probe_locations(filepath):
+    """Return the probe locations listed in the header of a probes file."""
+    with open(filepath, "r") as file:
+        header = "".join(line for line in file if line.startswith("#"))
+    return np.array(
+        [
+            [float(x) for x in match.split()]
+            for match in location_pattern.findall(header)
+        ]
+    )
+
+
+def probe_files(case_path, field=probe_fields[0]):
+    """Return the probes output files of a field in every time segment."""
+    return segment_files(case_path, "probes", field)
+
+
+def read_case_probes(case_path):
+    """
+    Read every field of `probe_fields` for one case, stitched across the
+    time segments of restarted runs. Returns (times, values) with values a
+    dict of (time, probe) arrays, or None if a field is missing.
+    """
+    times = None
+    values = {}
+    for field in probe_fields:
+        segments = []
+        for path in probe_files(case_path, field):
+            field_times, field_values = read_probe_file(os.path.join(case_path, path))
+            segments.append({"time": field_times, "values": field_values})
+        stitched = stitch_segments(segments)
+        if stitched is None:
+            return None
+        field_times, values[field] = stitched["time"], stitched["values"]
+        if times is None or len(field_times) < len(times):
+            times = field_times
+    # The fields may be one row apart if the run was stopped while writing
+    values = {field: array[: len(times)] for field, array in values.items()}
+    return times, values
+
+
+def probe_time_index(case_times, max_times=1000):
+    """
+    Return the time index shared by the cases: the union of their times, or
+    max_times log-spaced points over the same range if the union is longer
+    (adaptive time steps give every case its own times). The log spacing
+    keeps the early transient, whose steps are seconds long, next to the
+    steps of months later in the irradiation.
+
+    case_times is iterated once; only the union, while it is at most
+    max_times long, and the range are kept in memory.
+    """
+    union = np.empty(0)
+    start = first_positive = end = np.nan
+    for times in case_times:
+        if not len(times):
+            continue
+        start, end = np.fmin(start, times.min()), np.fmax(end, times.max())
+        positive = times[times > 0]
+        if len(positive):
+            first_positive = np.fmin(first_positive, positive.min())
+        if union is not None:
+            union = np.union1d(union, times)
+            if len(union) > max_times:
+                union = None
+    if union is not None:
+        return union
+    return log_time_grid(start, first_positive, end, max_times)
+
+
+def log_time_grid(start, first_positive, end, n_times):
+    """
+    Return n_times points from start to end, log-spaced from the first
+    positive time; a start at or before time zero is kept as the first point.
+    """
+    if start > 0:
+        return np.geomspace(start, end, n_times)
+    return np.concatenate([[start], np.geomspace(first_positive, end, n_times - 1)])
+
+
+def interpolate_rows(times, values, time_index):
+    """
+    Linearly interpolate the (time, probe) values of a case onto time_index,
+    for all probes at once. Times outside the case run are NaN.
+    """
+    result = np.full((len(time_index), values.shape[1]), np.nan, dtype=np.float32)
+    if len(times) == 0:
+        return result
+    inside = (time_index >= times[0]) & (time_index <= times[-1])
+    grid = time_index[inside]
+
+    upper = np.clip(np.searchsorted(times, grid), 1, max(len(times) - 1, 1))
+    lower = upper - 1
+    if len(times) == 1:
+        lower = upper = np.zeros(len(grid), dtype=int)
+    span = times[upper] - times[lower]
+    weight = np.divide(
+        grid - times[lower], span, out=np.zeros(len(grid)), where=span > 0
+    )[:, None]
+    result[inside] = (1 - weight) * values[lower] + weight * values[upper]
+    return result
+
+
+def cache_case_probes(case_path, path, key):
+    """
+    Read the probes of one case and save them to the .npz cache at path,
+    tagged with key (see ingest_index.states_key). A case without probes is
+    cached too, so it is not read again.
+    """
+    arrays = {"key": np.array(key)}
+    probes = read_case_probes(case_path)
+    if probes is not None:
+        times, fields = probes
+        arrays["time"] = times
+        arrays.update({f"field_{field}": fields[field] for field in probe_fields})
+        arrays["locations"] = read_probe_locations(
+            os.path.join(case_path, probe_files(case_path)[0])
+        )
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def probe_cache_key(path):
+    """Return the key of a probe cache, or None if it is missing or unreadable."""
+    try:
+        with np.load(path) as cache:
+            return str(cache["key"])
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
+
+
+def load_case_probes(path):
+    """
+    Return the probes saved by cache_case_probes as (probes, locations),
+    with probes as returned by read_case_probes, or (None, None).
+    """
+    with np.load(path) as cache:
+        if "time" not in cache:
+            return None, None
+        fields = {field: cache[f"field_{field}"] for field in probe_fields}
+        return (cache["time"], fields), cache["locations"]
+
+
+def write_probe_dataset(
+    folder, case_names, load_probes, locations=None, max_times=1000
+):
+    """
+    Build the probe tensors of a campaign and save them in folder.
+
+    Args:
+        folder (str): Output folder, created if needed.
+        case_names (list): Names of the cases.
+        load_probes (callable): Returns the probes of a case from its name,
+            as returned by read_case_probes; cases without probes (None) are
+            left out.
+        locations (array): Optional probe locations, one row per probe.
+        max_times (int): Maximum length of the shared time index.
+
+    Every field is stored as a float32 array `<field>.npy` of shape
+    (case, time, probe), next to `time.npy`, `locations.npy` (if given)
+    and `cases.json` with the names of the cases with probes, in order,
+    whose number is returned.
+
+    The cases are loaded one at a time, twice: once for the shared time
+    index and the number of probes, then to write their interpolated rows
+    into the memory-mapped tensors, block_bytes at a time. Only one case is
+    held in memory, not the tensors.
+    """
+    os.makedirs(folder, exist_ok=True)
+    found = []
+    n_probes = 0
+
+    def case_times():
+        nonlocal n_probes
+        for name in case_names:
+            probes = load_probes(name)
+            if probes is None:
+                continue
+            times, fields = probes
+            found.append(name)
+            n_probes = max([n_probes] + [values.shape[1] for values in fields.values()])
+            yield times
+
+    time_index = probe_time_index(case_times(), max_times)
+
+    # The tensors are mapped a block of cases at a time: the written pages
+    # of a mapping count in the RSS until it is closed
+    paths = {field: os.path.join(folder, f"{field}.npy") for field in probe_fields}
+    for path in paths.values():
+        np.lib.format.open_memmap(
+            path + ".tmp",
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(found), len(time_index), n_probes),
+        ).flush()
+    block_cases = max(1, block_bytes // max(1, 4 * len(time_index) * n_probes))
+    for start in range(0, len(found), block_cases):
+        tensors = {
+            field: np.load(path + ".tmp", mmap_mode="r+")
+            for field, path in paths.items()
+        }
+        for i in range(start, min(start + block_cases, len(found))):
+            times, fields = load_probes(found[i])
+            for field, tensor in tensors.items():
+                values = fields[field]
+                tensor[i, :, : values.shape[1]] = interpolate_rows(
+                    times, values, time_index
+                )
+                tensor[i, :, values.shape[1] :] = np.nan
+        for tensor in tensors.values():
+            tensor.flush()
+        del tensors, tensor
+    for path in paths.values():
+        os.replace(path + ".tmp", path)
+
+    save_npy_atomic(os.path.join(folder, "time.npy"), time_index)
+    if locations is not None:
+        save_npy_atomic(os.path.join(folder, "locations.npy"), locations)
+    write_atomic(os.path.join(folder, "cases.json"), json.dumps(found))
+    return len(found)
+
+
+class ProbeDataset:
+    """
+    Memory-mapped probe tensors written by write_probe_dataset.
+
+    Example:
+        probes = ProbeDataset("simulation_results_probes")
+        profile = probes.fields["T"][probes.case_index[case_name], -1]
+    """
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, "cases.json"), "r") as file:
+            self.cases = json.load(file)
+        self.case_index = {name: i for i, name in enumerate(self.cases)}
+        self.time = np.load(os.path.join(folder, "time.npy"))
+        self.fields = {
+            field: np.load(os.path.join(folder, f"{field}.npy"), mmap_mode="r")
+            for field in probe_fields
+        }
+        locations_path = os.path.join(folder, "locations.npy")
+        self.locations = (
+            np.load(locations_path) if os.path.exists(locations_path) else None
+        )
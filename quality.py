@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarDataset
+
+temperature_range = (250.0, 3500.0)  # K, below coolant to above UO2 melting
+pressure_range = (0.0, 50e6)  # Pa
+ERROR_CHECKS = [
+    "non_monotonic_time",
+    "duplicate_time",
+    "non_finite",
+    "impossible_temperature",
+    "impossible_pressure",
+    "missing_parameters",
+]
+# Checks also counted by check_time_series on the rows of a case as read
+TIME_SERIES_CHECKS = ["non_monotonic_time", "duplicate_time", "non_finite"]
+
+
+def count_per_case(rows, starts):
+    """Count flagged row indices per case, cases given by their start rows."""
+    cases = np.searchsorted(starts, rows, side="right") - 1
+    return np.bincount(cases, minlength=len(starts))
+
+
+def check_time_series(columns):
+    """
+    Count the backward and duplicate time steps and the rows with a NaN/inf
+    value of one case, on its columns as read (a dict of arrays with a
+    "time" array). parse.py drops the rows without a valid time and sorts
+    the rows by time to join the rod pressure, which hides these rows from
+    check_dataset, so they are counted at ingestion.
+    """
+    steps = np.diff(columns["time"])
+    non_finite = np.zeros(len(columns["time"]), dtype=bool)
+    for values in columns.values():
+        non_finite |= ~np.isfinite(values)
+    return {
+        "non_monotonic_time": int((steps < 0).sum()),
+        "duplicate_time": int((steps == 0).sum()),
+        "non_finite": int(non_finite.sum()),
+    }
+
+
+def check_dataset(dataset, parameter_columns=(), time_series_checks=None):
+    """
+    Check every row of a columnar dataset, vectorized over whole columns.
+
+    Returns a DataFrame with one row per case: its number of rows, the
+    number of rows failing each check of ERROR_CHECKS (for
+    missing_parameters, the number of parameters that are NaN), the number
+    of rows without a rod pressure, and "ok" if no check failed.
+
+    time_series_checks optionally maps case names to the counts of
+    check_time_series taken at ingestion; for the checks of
+    TIME_SERIES_CHECKS, the larger of these and the dataset counts is
+    reported.
+    """
+    names = list(dataset.cases)
+    starts = np.array([rows.start for rows in dataset.cases.values()], dtype=np.int64)
+    stops = np.array([rows.stop for rows in dataset.cases.values()], dtype=np.int64)
+    columns = dataset.columns
+    report = {"n_rows": stops - starts}
+
+    # Time steps within a case; the steps across case boundaries are ignored
+    steps = np.diff(columns["time"]) if "time" in columns else np.empty(0)
+    boundary = np.zeros(len(steps), dtype=bool)
+    boundary[starts[(starts > 0) & (starts <= len(steps))] - 1] = True
+    report["non_monotonic_time"] = count_per_case(
+        np.flatnonzero((steps < 0) & ~boundary) + 1, starts
+    )
+    report["duplicate_time"] = count_per_case(
+        np.flatnonzero((steps == 0) & ~boundary) + 1, starts
+    )
+
+    result_columns = [
+        name
+        for name in columns
+        if name not in parameter_columns and name != "rodPressure"
+    ]
+    non_finite = np.zeros(len(dataset), dtype=bool)
+    for name in result_columns:
+        non_finite |= ~np.isfinite(columns[name])
+    if "rodPressure" in columns:
+        non_finite |= np.isinf(columns["rodPressure"])
+    report["non_finite"] = count_per_case(np.flatnonzero(non_finite), starts)
+
+    for check in TIME_SERIES_CHECKS:
+        counts = [
+            (time_series_checks or {}).get(name, {}).get(check, 0) for name in names
+        ]
+        report[check] = np.maximum(report[check], np.array(counts, dtype=np.int64))
+
+    for check, name, (low, high) in [
+        ("impossible_temperature", "volAverage(T)", temperature_range),
+        ("impossible_pressure", "rodPressure", pressure_range),
+    ]:
+        if name in columns:
+            values = columns[name]
+            # Non-finite values are counted by non_finite
+            outside = np.isfinite(values) & ((values < low) | (values > high))
+            report[check] = count_per_case(np.flatnonzero(outside), starts)
+        else:
+            report[check] = np.zeros(len(names), dtype=np.int64)
+
+    # The parameters are constant within a case, check its first row
+    first_rows = np.minimum(starts, max(len(dataset) - 1, 0))
+    missing = np.zeros(len(names), dtype=np.int64)
+    for name in parameter_columns:
+        if name in columns and len(dataset):
+            missing += np.isnan(columns[name][first_rows]).astype(np.int64)
+        else:
+            missing += 1
+    report["missing_parameters"] = np.where(stops > starts, missing, 0)
+
+    if "rodPressure" in columns:
+        report["missing_pressure"] = count_per_case(
+            np.flatnonzero(np.isnan(columns["rodPressure"])), starts
+        )
+
+    report = pd.DataFrame(report, index=pd.Index(names, name="case"))
+    report["ok"] = (report[ERROR_CHECKS] == 0).all(axis=1) & (report["n_rows"] > 0)
+    return report
+
+
+def print_summary(report):
+    failed = report[~report["ok"]]
+    print(f"Data quality: {len(failed)} of {len(report)} cases failed a check")
+    for check in ERROR_CHECKS:
+        n_cases = int((report[check] > 0).sum())
+        if n_cases:
+            unit = "parameters" if check == "missing_parameters" else "rows"
+            print(f"  {check}: {n_cases} cases, {int(report[check].sum())} {unit}")
+    n_empty = int((report["n_rows"] == 0).sum())
+    if n_empty:
+        print(f"  no rows: {n_empty} cases")
+
+
+if __name__ == "__main__":
+    # Usage: python quality.py [columnar_dataset_folder] [ingestion_index]
+    from parse import parameter_columns
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else "simulation_results_columns"
+    index_path = (
+        sys.argv[2] if len(sys.argv) > 2 else "simulation_results.csv.index.json"
+    )
+    time_series_checks = None
+    if os.path.exists(index_path):
+        with open(index_path, "r") as file:
+            cases = json.load(file)["cases"]
+        time_series_checks = {
+            name: entry.get("checks", {}) for name, entry in cases.items()
+        }
+    report = check_dataset(
+        ColumnarDataset(folder), parameter_columns, time_series_checks
+    )
+    print_summary(report)
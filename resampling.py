@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+RESAMPLING_METHODS = ["burnup", "log_time", "lttb"]
+
+burnup_step = 500.0  # Spacing of the burnup grid, in the unit of volAverage(Bu)
+points_per_decade = 20  # Density of the log-time grid
+lttb_points = 100  # Rows kept per case by LTTB
+
+
+def interpolate_at(df, times):
+    """Linearly interpolate every column of a case at the given times."""
+    time = df["time"].to_numpy()
+    return pd.DataFrame(
+        {
+            name: times if name == "time" else np.interp(times, time, df[name])
+            for name in df.columns
+        }
+    )
+
+
+def burnup_grid_times(time, burnup, step=burnup_step):
+    """
+    Return the times at which the burnup of a case crosses the multiples of
+    step. The grid is common to all cases; each case covers it up to its
+    final burnup.
+    """
+    burnup = np.maximum.accumulate(burnup)  # Guard against round-off dips
+    grid = np.arange(np.ceil(burnup[0] / step), np.floor(burnup[-1] / step) + 1)
+    return np.interp(grid * step, burnup, time)
+
+
+def log_time_grid(time, per_decade=points_per_decade):
+    """
+    Return the times of the common log-spaced grid 10**(k / per_decade) that
+    lie within the run of a case, after its initial time 0 if it has one.
+    """
+    positive = time[time > 0]
+    if not len(positive):
+        return time[:1]
+    k = np.arange(
+        np.ceil(per_decade * np.log10(positive[0])),
+        np.floor(per_decade * np.log10(positive[-1])) + 1,
+    )
+    grid = 10 ** (k / per_decade)
+    return np.concatenate([time[:1], grid]) if time[0] == 0 else grid
+
+
+def lttb_indices(x, y, n_points=lttb_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling: return the indices of
+    n_points rows that preserve the visual shape of y(x). The first and last
+    rows are always kept.
+    """
+    n = len(x)
+    if n <= n_points or n_points < 3:
+        return np.arange(n)
+
+    # Bucket edges for the n_points - 2 inner points
+    edges = np.linspace(1, n - 1, n_points - 1).astype(int)
+    selected = np.empty(n_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    for i in range(n_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average point of the next bucket (the last row for the last bucket)
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+
+        a = selected[i]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (next_y - y[a])
+        )
+        selected[i + 1] = start + np.argmax(area)
+    return selected
+
+
+def resample_case(df, method):
+    """
+    Resample the result rows of one case.
+
+    Args:
+        df (DataFrame): Rows of the case, sorted by time, with a "time" and
+            a "volAverage(Bu)" column and any other numeric columns.
+        method (str): "burnup" interpolates every column on the common
+            burnup grid, "log_time" on the common log-time grid, and "lttb"
+            keeps the `lttb_points` rows that best preserve the temperature
+            curve.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"Unknown resampling method '{method}'")
+    if df.empty:
+        return df
+
+    time = df["time"].to_numpy()
+    if method == "burnup":
+        return interpolate_at(
+            df, burnup_grid_times(time, df["volAverage(Bu)"].to_numpy())
+        )
+    if method == "log_time":
+        return interpolate_at(df, log_time_grid(time))
+    indices = lttb_indices(time, df["volAverage(T)"].to_numpy())
+    return df.iloc[indices].reset_index(drop=True)
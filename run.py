@@ -3,11 +3,26 @@ import shutil
 import numpy as np
 import subprocess
 import math
+import sys
 import time
-
-# List to keep track of running processes
-running_processes = []
-max_parallel_runs = 4  # Maximum number of parallel runs allowed
+from functools import partial
+from executors import BatchArrayExecutor, LocalExecutor, read_task_exit_code
+from foam_dict import FoamDictionary, patch_rod_dict
+from ledger import CampaignLedger, case_key, hash_folder, print_progress
+from mesh_cache import MeshCache, read_rod_dict
+from parse import read_case_vol_field
+from sampling import AdaptiveSampler, ParameterSpace, space_filling_cases
+from runtime_model import RuntimeModel, lpt_makespan
+from scheduler import available_cores, wait_with_usage
+from staging import stage_case
+from watchdog import Watchdog
+
+max_parallel_runs = available_cores()  # Maximum number of parallel runs allowed
+
+# "local" runs the cases on this host. "array" only prepares them and exports
+# a new SLURM job array to array_folder (see executors.py); the next run.py
+# collects the results of the finished array tasks.
+executor_backend = "local"
 
 # Define the ranges
 lhgr_range = np.linspace(10e3, 40e3, 10)  # LHGR in W/m
@@ -18,14 +33,55 @@ coolant_temperature_range = np.linspace(
     290 + 273.15, 330 + 273.15, 2
 )  # Coolant temp in K
 
+# Sampling of the parameter space: "grid" runs the full-factorial sweep over the
+# ranges above, "sobol" and "lhs" draw n_sampled_cases space-filling cases, and
+# "adaptive" adds cases where a surrogate of the finished cases is most uncertain
+sampling_method = "grid"
+n_sampled_cases = 128
+parameter_bounds = {
+    "lhgr": (lhgr_range[0], lhgr_range[-1]),
+    "fuel_outer_radius": (fuel_outer_radius_range[0], fuel_outer_radius_range[-1]),
+    "gap_size": (gap_size_range[0], gap_size_range[-1]),
+    "clad_thickness": (clad_thickness_range[0], clad_thickness_range[-1]),
+    "coolant_temperature": (
+        coolant_temperature_range[0],
+        coolant_temperature_range[-1],
+    ),
+}
+# Sampled values are rounded to the precision of the case folder name
+case_name_resolution = {
+    "lhgr": 0.1,
+    "fuel_outer_radius": 1e-4,
+    "gap_size": 1e-7,
+    "clad_thickness": 1e-4,
+    "coolant_temperature": 0.1,
+}
+
 # Constants
 base_density = 10960 * 0.95  # kg/m3
 burnup_target = 20e6  # Wd/kg
 base_case_folder = "baseCase"
 output_base = "simulation_cases"
-
-# Create output folder if it doesn't exist
-os.makedirs(output_base, exist_ok=True)
+ledger_path = os.path.join(output_base, "campaign.db")
+max_attempts = 3  # Attempts per case before it is left as failed
+# "copy", "hardlink" or "symlink" (see staging.py). Links save disk space;
+# whether they are also faster depends on the filesystem, see
+# benchmarks/bench_staging.py
+staging_mode = "copy"
+use_mesh_cache = True  # Generate each unique mesh once and share it
+mesh_cache_folder = os.path.join(output_base, "mesh_cache")
+array_folder = os.path.join(output_base, "job_array")
+# Cases exported to a job array without a result after this delay (queue wait
+# plus the task time limit) are marked failed and retried
+submitted_timeout = 3 * 24 * 3600  # s
+
+# Watchdog limits: a case is killed when it exceeds its wall time budget
+# (min_wall_time_budget plus wall_time_per_simulated_day for each simulated
+# day), when its simulation time stops advancing for stall_timeout seconds,
+# or when its deltaT collapses toward minDeltaT (see watchdog.py)
+min_wall_time_budget = 3600  # s
+wall_time_per_simulated_day = 30  # s
+stall_timeout = 1800  # s
 
 
 def calculate_runtime(Q, density):
@@ -36,53 +92,38 @@ def calculate_runtime(Q, density):
     return runtime
 
 
-def modify_endTime(case_folder, end_time):
+def modify_endTime(control_dict, end_time):
     """Modify endTime in controlDict."""
-    control_dict_path = os.path.join(case_folder, "system", "controlDict")
-    subprocess.run(
-        [
-            "foamDictionary",
-            control_dict_path,
-            "-entry",
-            "endTime",
-            "-set",
-            str(end_time),
-        ]
-    )
-    subprocess.run(
-        [
-            "foamDictionary",
-            control_dict_path,
-            "-entry",
-            "maxDeltaT",
-            "-set",
-            str(end_time / 200),
-        ]
-    )
+    control_dict.set("endTime", str(end_time))
+    control_dict.set("maxDeltaT", str(end_time / 200))
 
 
-def modify_heatSource(case_folder, end_time, lhgr):
+def modify_heatSource(solver_dict, end_time, lhgr):
     """Modify heatSourceOptions and other entries in solverDict."""
-    solver_dict_path = os.path.join(case_folder, "constant", "solverDict")
-    subprocess.run(
-        [
-            "foamDictionary",
-            solver_dict_path,
-            "-entry",
-            "heatSourceOptions/timePoints",
-            "-set",
-            f"(0 60 1e15)",
-        ]
-    )
-    subprocess.run(
-        [
-            "foamDictionary",
-            solver_dict_path,
-            "-entry",
-            "heatSourceOptions/lhgr",
-            "-set",
-            f"(0 {lhgr} {lhgr})",
-        ]
+    solver_dict.set("heatSourceOptions/timePoints", f"(0 60 1e15)")
+    solver_dict.set("heatSourceOptions/lhgr", f"(0 {lhgr} {lhgr})")
+
+
+def rod_dict_edits(r_fuel, r_inner_clad, r_outer_clad):
+    """Return the rodDict radius entries, in mm, of radii given in m."""
+    r_fuel = float(r_fuel) * 1e3  # Convert to mm
+    r_inner_clad = float(r_inner_clad) * 1e3  # Convert to mm
+    r_outer_clad = float(r_outer_clad) * 1e3  # Convert to mm
+    return {
+        "rOuterFuel": [r_fuel],
+        "rInnerClad": [r_inner_clad, r_inner_clad],
+        "rOuterClad": [r_outer_clad, r_outer_clad],
+    }
+
+
+def case_radii(case):
+    """Return the fuel outer, clad inner and clad outer radii of a case."""
+    fuel_outer_radius = case["fuel_outer_radius"]
+    clad_inner_radius = fuel_outer_radius + case["gap_size"]
+    return (
+        fuel_outer_radius,
+        clad_inner_radius,
+        clad_inner_radius + case["clad_thickness"],
     )
 
 
@@ -90,58 +131,30 @@ def modify_rodDict(case_folder, r_fuel, r_inner_clad, r_outer_clad):
     """Modify rodDict Python dictionary for radii."""
     rod_dict_path = os.path.join(case_folder, "rodDict")
 
-    # Read the existing Python dictionary
-    with open(rod_dict_path, "r") as file:
-        rod_dict = eval(file.read())  # Convert string to Python dictionary
+    # Rewrite only the modified entries, keeping the comment section
+    patch_rod_dict(rod_dict_path, rod_dict_edits(r_fuel, r_inner_clad, r_outer_clad))
 
-    # Modify the necessary entries
-    rod_dict["rOuterFuel"] = [r_fuel * 1e3]  # Convert to mm
-    rod_dict["rInnerClad"] = [r_inner_clad * 1e3, r_inner_clad * 1e3]  # Convert to mm
-    rod_dict["rOuterClad"] = [r_outer_clad * 1e3, r_outer_clad * 1e3]  # Convert to mm
 
-    # Write back the modified dictionary
-    with open(rod_dict_path, "w") as file:
-        file.write(str(rod_dict))
+def build_case_meshes(mesh_cache, cases):
+    """Generate the meshes of all the geometries of a list of cases at once."""
+    base_rod_dict = read_rod_dict(os.path.join(base_case_folder, "rodDict"))
+    rod_dicts = [
+        {**base_rod_dict, **rod_dict_edits(*case_radii(case))} for case in cases
+    ]
+    n_built = mesh_cache.build_meshes(base_case_folder, rod_dicts)
+    if n_built:
+        print(f"Generated {n_built} meshes for {len(cases)} cases.")
 
 
-def modify_materials(case_folder, r_fuel, gap_size):
+def modify_materials(solver_dict, r_fuel, gap_size):
     """Modify materials entries in solverDict."""
-    solver_dict_path = os.path.join(case_folder, "constant", "solverDict")
-    subprocess.run(
-        [
-            "foamDictionary",
-            solver_dict_path,
-            "-entry",
-            "materials/fuel/DiamCold",
-            "-set",
-            f"{2 * r_fuel}",
-        ]
-    )
-    subprocess.run(
-        [
-            "foamDictionary",
-            solver_dict_path,
-            "-entry",
-            "materials/fuel/GapCold",
-            "-set",
-            f"{2 * gap_size}",
-        ]
-    )
+    solver_dict.set("materials/fuel/DiamCold", f"{2 * r_fuel}")
+    solver_dict.set("materials/fuel/GapCold", f"{2 * gap_size}")
 
 
-def modify_coolant_temperature(case_folder, coolant_temperature):
+def modify_coolant_temperature(T_field, coolant_temperature):
     """Modify coolant temperature in boundaryField."""
-    boundary_field_path = os.path.join(case_folder, "0", "T")
-    subprocess.run(
-        [
-            "foamDictionary",
-            boundary_field_path,
-            "-entry",
-            "boundaryField/cladOuter/value",
-            "-set",
-            f"uniform {coolant_temperature}",
-        ]
-    )
+    T_field.set("boundaryField/cladOuter/value", f"uniform {coolant_temperature}")
 
 
 def calculate_fuel_area(r_fuel):
@@ -149,72 +162,315 @@ def calculate_fuel_area(r_fuel):
     return math.pi * (r_fuel**2)
 
 
-def run_case(case_folder):
-    """Run the case without waiting for completion."""
-    os.chdir(case_folder)
+def generate_grid_cases():
+    """Yield the parameters of every case in the full-factorial sweep."""
+    for lhgr in lhgr_range:
+        for fuel_outer_radius in fuel_outer_radius_range:
+            for gap_size in gap_size_range:
+                for clad_thickness in clad_thickness_range:
+                    for coolant_temperature in coolant_temperature_range:
+                        yield {
+                            "lhgr": lhgr,
+                            "fuel_outer_radius": fuel_outer_radius,
+                            "gap_size": gap_size,
+                            "clad_thickness": clad_thickness,
+                            "coolant_temperature": coolant_temperature,
+                        }
+
+
+def read_case_target(case_folder):
+    """Return the final fuel volume-average temperature of a finished case."""
+    results = read_case_vol_field(case_folder)
+    if results is None or not len(results["time"]):
+        return None
+    return float(results["volAverage(T)"][-1])
+
+
+def completed_results(ledger, space):
+    """Return the (params, targets) arrays of the finished cases."""
+    params = []
+    targets = []
+    for case_name, case in ledger.done_cases():
+        target = read_case_target(os.path.join(output_base, case_name))
+        if target is not None:
+            params.append([case[name] for name in space.names])
+            targets.append(target)
+    return np.array(params), np.array(targets)
+
+
+def generate_cases(ledger):
+    """Yield the parameters of the cases to run, following sampling_method."""
+    space = ParameterSpace(parameter_bounds, case_name_resolution)
+    if sampling_method == "grid":
+        yield from generate_grid_cases()
+    elif sampling_method in ("sobol", "lhs"):
+        yield from space_filling_cases(space, n_sampled_cases, sampling_method)
+    elif sampling_method == "adaptive":
+        sampler = AdaptiveSampler(space, batch_size=max_parallel_runs)
+        yield from sampler.generate(
+            partial(completed_results, ledger, space), n_sampled_cases
+        )
+    else:
+        raise ValueError(f"Unknown sampling method '{sampling_method}'")
+
+
+def get_case_name(case):
+    """Build the case folder name from the case parameters."""
+    return (
+        f"lhgr_{case['lhgr']:.1f}"
+        f"_fuelRadius_{case['fuel_outer_radius']*1e3:.1f}"
+        f"_gap_{case['gap_size']*1e6:.1f}"
+        f"_clad_{case['clad_thickness']*1e3:.1f}"
+        f"_coolant_{case['coolant_temperature']:.1f}"
+    )
 
-    # Step 1: Run Allclean
-    subprocess.Popen(["./Allclean"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-    # Step 2: Run Allrun
-    process = subprocess.Popen(
-        ["./Allrun"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+def get_end_time(case):
+    """Calculate the simulated time needed to reach the burnup target."""
+    # Calculate fuel area and Q
+    fuel_area = calculate_fuel_area(case["fuel_outer_radius"])
+    Q = case["lhgr"] / fuel_area
+
+    # Calculate end time
+    return calculate_runtime(Q, base_density)
+
+
+def prepare_case(case, mesh_cache=None):
+    """Create the case folder from the base case and modify its files."""
+    fuel_outer_radius = case["fuel_outer_radius"]
+    gap_size = case["gap_size"]
+    end_time = get_end_time(case)
+
+    case_folder = os.path.join(output_base, get_case_name(case))
+    print(case_folder)
+
+    # Stage the case folder from the base case
+    if os.path.exists(case_folder):
+        shutil.rmtree(case_folder)  # Remove the existing directory
+    stage_case(base_case_folder, case_folder, staging_mode)
+
+    # Modify case files, loading and writing each dictionary once
+    control_dict = FoamDictionary(os.path.join(case_folder, "system", "controlDict"))
+    modify_endTime(control_dict, end_time)
+    control_dict.write()
+
+    solver_dict = FoamDictionary(os.path.join(case_folder, "constant", "solverDict"))
+    modify_heatSource(solver_dict, end_time, case["lhgr"])
+    modify_materials(solver_dict, fuel_outer_radius, gap_size)
+    solver_dict.write()
+
+    T_field = FoamDictionary(os.path.join(case_folder, "0", "T"))
+    modify_coolant_temperature(T_field, case["coolant_temperature"])
+    T_field.write()
+
+    modify_rodDict(case_folder, *case_radii(case))
+
+    # Link a shared mesh; Allrun only generates the mesh if it is missing
+    if mesh_cache is not None:
+        mesh_cache.link_mesh(case_folder)
+
+    return case_folder
+
+
+def get_wall_time_budget(end_time):
+    """Wall time allowed for a case, scaled by its simulated time."""
+    return min_wall_time_budget + end_time / (24 * 3600) * wall_time_per_simulated_day
+
+
+def run_case(case_folder, watchdog=None):
+    """
+    Run the case and wait for completion. Returns the exit code, wall time,
+    CPU times and peak memory of Allrun, and the reason the watchdog killed
+    the case (None if it was not killed).
+    """
+    control_dict = FoamDictionary(os.path.join(case_folder, "system", "controlDict"))
+    end_time = float(control_dict.get("endTime"))
+    min_delta_t = float(control_dict.get("minDeltaT"))
+
+    # Case folders are staged fresh, so no Allclean is needed (it would
+    # also remove the mesh linked from the mesh cache).
+    # Run Allrun in its own session so the watchdog can kill the whole case
+    with open(os.path.join(case_folder, "log.Allrun"), "w") as log_file:
+        started_at = time.time()
+        process = subprocess.Popen(
+            ["./Allrun"],
+            cwd=case_folder,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    if watchdog is not None:
+        watchdog.watch(
+            process,
+            os.path.join(case_folder, "log.offbeat"),
+            get_wall_time_budget(end_time),
+            min_delta_t,
+        )
+    try:
+        metrics = wait_with_usage(process, started_at)
+    finally:
+        killed_reason = watchdog.unwatch(process) if watchdog is not None else None
+
+    metrics["killed_reason"] = killed_reason
+    return metrics
+
+
+def track_cases(ledger, cases, base_case_hash):
+    """Register cases in the ledger and yield only those that still need to run."""
+    for case in cases:
+        key = case_key(case, base_case_hash)
+        ledger.register(key, get_case_name(case), case)
+        if ledger.should_run(key):
+            yield {**case, "key": key}
+
+
+def prepare_tracked_case(ledger, mesh_cache, case):
+    """Prepare a case, recording the new attempt in the ledger."""
+    ledger.mark_running(case["key"])
+    try:
+        case["case_folder"] = prepare_case(case, mesh_cache)
+    except Exception as e:
+        ledger.mark_failed(case["key"], e)
+        raise
+    return case
+
+
+def order_longest_first(ledger, cases):
+    """
+    Sort cases by decreasing predicted wall time (longest-processing-time
+    first) and print the predicted makespan. Without enough recorded runs to
+    fit the runtime model, cases are sorted by their simulated end time.
+    """
+    cases = list(cases)
+    runtime_model = RuntimeModel()
+    if not cases:
+        return cases, None
+    if not runtime_model.fit(ledger.runtime_samples()):
+        print("Not enough recorded runs for the runtime model, ordering by endTime.")
+        return sorted(cases, key=get_end_time, reverse=True), None
+
+    predicted = runtime_model.predict(cases)
+    order = np.argsort(predicted)[::-1]
+    makespan = lpt_makespan(predicted[order], max_parallel_runs)
+    print(
+        f"Predicted makespan for {len(cases)} cases on {max_parallel_runs} slots: "
+        f"{makespan:.0f} s ({makespan / 3600:.2f} h)"
     )
-
-    os.chdir("../..")
-    running_processes.append(process)
-
-    # Check if the number of running processes exceeds the limit
-    if len(running_processes) >= max_parallel_runs:
-        wait_for_cases_to_finish()
-
-
-def wait_for_cases_to_finish():
-    """Wait for running cases to finish."""
-    global running_processes
-    while running_processes:
-        for process in running_processes:
-            # Check if the process has finished
-            if process.poll() is not None:
-                running_processes.remove(process)  # Remove completed processes
-        time.sleep(1)  # Avoid busy waiting
-
-
-# Main loop
-for lhgr in lhgr_range:
-    for fuel_outer_radius in fuel_outer_radius_range:
-        for gap_size in gap_size_range:
-            for clad_thickness in clad_thickness_range:
-                for coolant_temperature in coolant_temperature_range:
-                    # Calculate fuel area and Q
-                    fuel_area = calculate_fuel_area(fuel_outer_radius)
-                    Q = lhgr / fuel_area
-
-                    # Calculate end time
-                    end_time = calculate_runtime(Q, base_density)
-
-                    # Construct case folder name
-                    case_name = f"lhgr_{lhgr:.1f}_fuelRadius_{fuel_outer_radius*1e3:.1f}_gap_{gap_size*1e6:.1f}_clad_{clad_thickness*1e3:.1f}_coolant_{coolant_temperature:.1f}"
-                    case_folder = os.path.join(output_base, case_name)
-
-                    print(case_folder)
-
-                    # Copy the base case folder
-                    if os.path.exists(case_folder):
-                        shutil.rmtree(case_folder)  # Remove the existing directory
-                    shutil.copytree(base_case_folder, case_folder)
-
-                    # Modify case files
-                    modify_endTime(case_folder, end_time)
-                    modify_heatSource(case_folder, end_time, lhgr)
-                    modify_rodDict(
-                        case_folder,
-                        fuel_outer_radius,
-                        fuel_outer_radius + gap_size,
-                        fuel_outer_radius + gap_size + clad_thickness,
-                    )
-                    modify_materials(case_folder, fuel_outer_radius, gap_size)
-                    modify_coolant_temperature(case_folder, coolant_temperature)
-
-                    # Run the case
-                    run_case(case_folder)
+    return [cases[i] for i in order], makespan
+
+
+def collect_submitted_cases(ledger):
+    """
+    Record the outcome of cases exported to a job array, from the exit code
+    written by their array task. Returns the number of finished cases.
+    """
+    collected = 0
+    for key, case_name in ledger.submitted_cases():
+        code = read_task_exit_code(os.path.join(output_base, case_name))
+        if code is None:
+            continue  # Not run yet
+        if code == 0:
+            ledger.mark_done(key)
+        else:
+            ledger.mark_failed(key, f"Array task exited with code {code}")
+        collected += 1
+    return collected
+
+
+def run_tracked_case(ledger, watchdog, case):
+    """Run a prepared case and record its outcome in the ledger."""
+    try:
+        metrics = run_case(case["case_folder"], watchdog)
+    except Exception as e:
+        ledger.mark_failed(case["key"], e)
+        raise
+    ledger.record_metrics(case["key"], metrics)
+    code = metrics["exit_code"]
+    if metrics["killed_reason"] is not None:
+        ledger.mark_failed(case["key"], f"Killed: {metrics['killed_reason']}")
+    elif code == 0:
+        ledger.mark_done(case["key"])
+    else:
+        ledger.mark_failed(case["key"], f"Allrun exited with code {code}")
+    return metrics
+
+
+if __name__ == "__main__":
+    # Create output folder if it doesn't exist
+    os.makedirs(output_base, exist_ok=True)
+
+    ledger = CampaignLedger(ledger_path, max_attempts)
+    interrupted = ledger.recover_interrupted()
+    if interrupted:
+        print(f"{interrupted} cases were interrupted by a previous run.")
+    collected = collect_submitted_cases(ledger)
+    if collected:
+        print(f"Collected the results of {collected} cases run by the job array.")
+    expired = ledger.expire_submitted(submitted_timeout)
+    if expired:
+        print(
+            f"{expired} cases exported to a job array had no result after "
+            f"{submitted_timeout / 3600:.0f} h and were marked failed."
+        )
+
+    # Finished cases are skipped, failed ones retried while attempts are left
+    cases = track_cases(ledger, generate_cases(ledger), hash_folder(base_case_folder))
+
+    # Adaptive designs are proposed on the fly and cannot be reordered
+    predicted_makespan = None
+    if sampling_method != "adaptive":
+        cases, predicted_makespan = order_longest_first(ledger, cases)
+
+    mesh_cache = MeshCache(mesh_cache_folder) if use_mesh_cache else None
+    prepare = partial(prepare_tracked_case, ledger, mesh_cache)
+
+    # Cases known upfront have their meshes generated in one batch
+    if mesh_cache is not None and isinstance(cases, list):
+        build_case_meshes(mesh_cache, cases)
+
+    if executor_backend == "array":
+        # Cases are only prepared here and run by the batch system
+        executor = BatchArrayExecutor(array_folder)
+        results = executor.run(cases, prepare)
+        for case, _ in results:
+            ledger.mark_submitted(case["key"])
+        if mesh_cache is not None:
+            mesh_cache.print_stats()
+        print_progress(ledger)
+        sys.exit()
+
+    executor = LocalExecutor(max_parallel_runs)
+    watchdog = Watchdog(stall_timeout=stall_timeout)
+    watchdog.start()
+
+    started_at = time.time()
+    try:
+        results = executor.run(
+            cases, prepare, partial(run_tracked_case, ledger, watchdog)
+        )
+    except KeyboardInterrupt:
+        # Cases run in their own sessions, so they do not get the interrupt
+        watchdog.kill_all()
+        raise
+    watchdog.stop()
+    makespan = time.time() - started_at
+
+    print(f"Ran {len(results)} cases in {makespan:.0f} s ({makespan / 3600:.2f} h).")
+    if predicted_makespan is not None:
+        print(
+            f"Predicted makespan was {predicted_makespan:.0f} s "
+            f"({predicted_makespan / 3600:.2f} h)."
+        )
+    ran = [metrics for _, metrics in results if metrics is not None]
+    if ran:
+        print(
+            f"Wall time per case: {np.mean([m['wall_time'] for m in ran]):.1f} s "
+            f"(max {max(m['wall_time'] for m in ran):.1f} s), "
+            f"peak memory {max(m['max_rss_kb'] for m in ran) / 1024:.1f} MiB."
+        )
+    if mesh_cache is not None:
+        mesh_cache.print_stats()
+    print_progress(ledger)
+    for case_name, attempts, error in ledger.failed_cases():
+        print(f"- {case_name} (attempts: {attempts}): {error}")
@@ -0,0 +1,58 @@
+import heapq
+
+import numpy as np
+
+# Sweep parameters used as regression features
+FEATURES = [
+    "lhgr",
+    "fuel_outer_radius",
+    "gap_size",
+    "clad_thickness",
+    "coolant_temperature",
+]
+
+
+class RuntimeModel:
+    """
+    Power-law regression of case wall time on the sweep parameters.
+
+    Fits log(wall_time) = c0 + sum(c_i * log(param_i)) by least squares on
+    the runs recorded in the campaign ledger.
+    """
+
+    def __init__(self, features=FEATURES):
+        self.features = features
+        self.coef = None
+
+    def _design(self, params):
+        logs = np.log([[p[name] for name in self.features] for p in params])
+        return np.hstack([np.ones((len(params), 1)), logs])
+
+    def fit(self, samples):
+        """
+        Fit on (params, wall_time) samples. Returns False, leaving the model
+        unfitted, if there are too few samples.
+        """
+        if len(samples) < len(self.features) + 2:
+            return False
+        params = [p for p, _ in samples]
+        wall_times = np.array([t for _, t in samples])
+        self.coef, *_ = np.linalg.lstsq(
+            self._design(params), np.log(wall_times), rcond=None
+        )
+        return True
+
+    def predict(self, params):
+        """Predicted wall time in seconds for each params dict."""
+        return np.exp(self._design(params) @ self.coef)
+
+
+def lpt_makespan(durations, n_slots):
+    """
+    Makespan of running jobs in the given order on n_slots slots, each job
+    starting on the first slot to free up.
+    """
+    slots = [0.0] * n_slots
+    for duration in durations:
+        heapq.heappush(slots, heapq.heappop(slots) + duration)
+    return max(slots)
@@ -0,0 +1,188 @@
+import warnings
+
+import numpy as np
+from scipy.stats import qmc
+from sklearn.ensemble import RandomForestRegressor
+
+
+def draw(sampler, n_samples):
+    """Draw from a qmc sampler, also for sample sizes that are not powers of 2."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return sampler.random(n_samples)
+
+
+def unit_samples(n_dims, n_samples, method="sobol", seed=0):
+    """Draw space-filling samples in the unit hypercube."""
+    if method == "sobol":
+        sampler = qmc.Sobol(d=n_dims, scramble=True, seed=seed)
+    elif method == "lhs":
+        sampler = qmc.LatinHypercube(d=n_dims, seed=seed)
+    else:
+        raise ValueError(f"Unknown sampling method '{method}'")
+    return draw(sampler, n_samples)
+
+
+class ParameterSpace:
+    """
+    Box of sweep parameters.
+
+    Args:
+        bounds (dict): (lower, upper) bounds for each parameter.
+        resolution (dict): Optional resolution for each parameter. Samples are
+            snapped to it, e.g. to match the precision of the case folder name.
+    """
+
+    def __init__(self, bounds, resolution=None):
+        self.names = list(bounds)
+        self.lower = np.array([bounds[name][0] for name in self.names], dtype=float)
+        self.upper = np.array([bounds[name][1] for name in self.names], dtype=float)
+        resolution = resolution or {}
+        self.resolution = np.array([resolution.get(name, 0.0) for name in self.names])
+
+    def to_params(self, unit_points):
+        """Scale unit hypercube points to parameter values (one row per case)."""
+        values = self.lower + unit_points * (self.upper - self.lower)
+        snap = self.resolution > 0
+        values[:, snap] = (
+            np.round(values[:, snap] / self.resolution[snap]) * self.resolution[snap]
+        )
+        return np.clip(values, self.lower, self.upper)
+
+    def to_unit(self, values):
+        return (np.asarray(values, dtype=float) - self.lower) / (
+            self.upper - self.lower
+        )
+
+    def as_case(self, values):
+        return {name: float(value) for name, value in zip(self.names, values)}
+
+
+def space_filling_cases(space, n_cases, method="sobol", seed=0):
+    """Return a list of case parameter dicts from a Sobol or Latin hypercube design."""
+    values = space.to_params(unit_samples(len(space.names), n_cases, method, seed))
+    return [space.as_case(row) for row in np.unique(values, axis=0)]
+
+
+class AdaptiveSampler:
+    """
+    Active-learning design of experiments.
+
+    Starts with a Sobol design of `n_initial` cases, then repeatedly fits a
+    random forest surrogate on the completed cases and proposes the next
+    `batch_size` cases where the spread of the tree predictions (the
+    predicted uncertainty) is highest. Cases already proposed but not yet
+    finished are penalised so a batch does not pile up in one region.
+    """
+
+    def __init__(
+        self,
+        space,
+        n_initial=32,
+        batch_size=8,
+        n_candidates=4096,
+        min_distance=0.05,
+        min_fit_cases=8,
+        seed=0,
+    ):
+        self.space = space
+        self.n_initial = n_initial
+        self.batch_size = batch_size
+        self.n_candidates = n_candidates
+        self.min_distance = min_distance
+        self.min_fit_cases = min_fit_cases
+        self.seed = seed
+        self.proposed = set()
+
+    def _new(self, values):
+        """Keep only rows that were not proposed before."""
+        rows = []
+        for row in values:
+            key = tuple(np.round(row, 12))
+            if key not in self.proposed:
+                self.proposed.add(key)
+                rows.append(row)
+        return rows
+
+    def fit_surrogate(self, params, targets):
+        model = RandomForestRegressor(n_estimators=100, random_state=self.seed)
+        model.fit(self.space.to_unit(params), targets)
+        return model
+
+    def propose(self, params, targets, n_cases, round_index=0):
+        """
+        Propose up to n_cases new cases from completed (params, targets).
+
+        params is an array with one row per completed case, in the order of
+        `space.names`.
+        """
+        candidates = self.space.to_params(
+            unit_samples(
+                len(self.space.names),
+                self.n_candidates,
+                "sobol",
+                self.seed + 1 + round_index,
+            )
+        )
+        model = self.fit_surrogate(params, targets)
+        unit_candidates = self.space.to_unit(candidates)
+        per_tree = np.stack(
+            [tree.predict(unit_candidates) for tree in model.estimators_]
+        )
+        uncertainty = per_tree.std(axis=0)
+
+        # Greedy selection, skipping candidates too close to proposed cases
+        taken = (
+            self.space.to_unit(np.array(list(self.proposed)))
+            if self.proposed
+            else np.empty((0, len(self.space.names)))
+        )
+        selected = []
+        for index in np.argsort(uncertainty)[::-1]:
+            point = unit_candidates[index]
+            if (
+                len(taken)
+                and np.min(np.linalg.norm(taken - point, axis=1)) < self.min_distance
+            ):
+                continue
+            new = self._new(candidates[index : index + 1])
+            if not new:
+                continue
+            selected.append(new[0])
+            taken = np.vstack([taken, point])
+            if len(selected) == n_cases:
+                break
+        return [self.space.as_case(row) for row in selected]
+
+    def generate(self, get_results, n_cases):
+        """
+        Yield up to n_cases case parameter dicts.
+
+        get_results is called before each new batch and returns the
+        (params, targets) arrays of the cases completed so far. Until enough
+        cases have completed to fit the surrogate, the Sobol sequence is
+        continued instead.
+        """
+        n_yielded = 0
+        sobol = qmc.Sobol(d=len(self.space.names), scramble=True, seed=self.seed)
+
+        def next_sobol(n):
+            return [
+                self.space.as_case(row)
+                for row in self._new(self.space.to_params(draw(sobol, n)))
+            ]
+
+        queue = next_sobol(self.n_initial)
+        round_index = 0
+        while n_yielded < n_cases:
+            if not queue:
+                params, targets = get_results()
+                if len(targets) >= self.min_fit_cases:
+                    queue = self.propose(params, targets, self.batch_size, round_index)
+                    round_index += 1
+                if not queue:
+                    queue = next_sobol(self.batch_size)
+                if not queue:
+                    return  # The snapped parameter space is exhausted
+            yield queue.pop(0)
+            n_yielded += 1
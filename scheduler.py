@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+import time
+
+
+def available_cores():
+    """Return the number of CPU cores this process is allowed to run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def wait_with_usage(process, started_at):
+    """
+    Wait for a subprocess.Popen process and return its resource usage.
+
+    The process is reaped with os.wait4, so the CPU times and peak RSS
+    include every descendant the process waited for (e.g. the solvers
+    started by Allrun). Linux counts the memory inherited from this process
+    at fork time, so the peak RSS never reads below the driver's own RSS.
+    """
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "exit_code": process.returncode,
+        "wall_time": time.time() - started_at,
+        "user_time": usage.ru_utime,
+        "system_time": usage.ru_stime,
+        "max_rss_kb": usage.ru_maxrss,  # kilobytes on Linux
+        "started_at": started_at,
+    }
+
+
+class CampaignScheduler:
+    """
+    Run simulation cases on a fixed number of slots.
+
+    A new case is started as soon as any slot frees up, instead of waiting for
+    a whole batch to drain. Case preparation runs in its own thread and keeps
+    up to `prepare_ahead` cases ready while the simulations are running.
+    """
+
+    def __init__(self, max_parallel_runs=None, prepare_ahead=None):
+        self.max_parallel_runs = max_parallel_runs or available_cores()
+        self.prepare_ahead = prepare_ahead or self.max_parallel_runs
+
+    def run(self, cases, prepare_case, run_case):
+        """
+        Prepare and run every case, returning a list of (case, result) pairs.
+
+        Args:
+            cases (iterable): Case descriptions, consumed lazily.
+            prepare_case (callable): Called with a case description in the
+                preparation thread. Returns the object handed to `run_case`,
+                or None to skip the case.
+            run_case (callable): Called in a slot thread; blocks until the
+                case has finished and returns its result.
+        """
+        ready = queue.Queue(maxsize=self.prepare_ahead)
+        results = []
+        results_lock = threading.Lock()
+
+        def prepare_all():
+            try:
+                for case in cases:
+                    try:
+                        prepared = prepare_case(case)
+                    except Exception as e:
+                        print(f"Error preparing case {case}: {e}")
+                        continue
+                    if prepared is not None:
+                        ready.put(prepared)
+            finally:
+                # One stop marker per slot
+                for _ in range(self.max_parallel_runs):
+                    ready.put(None)
+
+        def slot_worker():
+            while True:
+                prepared = ready.get()
+                if prepared is None:
+                    return
+                try:
+                    result = run_case(prepared)
+                except Exception as e:
+                    print(f"Error running case {prepared}: {e}")
+                    result = None
+                with results_lock:
+                    results.append((prepared, result))
+
+        threads = [threading.Thread(target=prepare_all, daemon=True)]
+        threads += [
+            threading.Thread(target=slot_worker, daemon=True)
+            for _ in range(self.max_parallel_runs)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
@@ -0,0 +1,74 @@
+import os
+import re
+
+import numpy as np
+
+time_suffix = r"(_[-+.\deE]+)?"
+
+
+def folder_time(name):
+    """Return the time of a time directory name, or None if it is not one."""
+    try:
+        return float(name)
+    except ValueError:
+        return None
+
+
+def segment_files(case_path, function_object, file_name):
+    """
+    Return the output files of a function object in every time segment.
+
+    A run restarted from `latestTime` writes its function object output to
+    a new `postProcessing/<function_object>/<restartTime>/` directory (and
+    OpenFOAM adds a `_<time>` suffix if the file name is taken). The files
+    are returned relative to the case folder, in time order.
+    """
+    folder = os.path.join("postProcessing", function_object)
+    try:
+        names = os.listdir(os.path.join(case_path, folder))
+    except FileNotFoundError:
+        return []
+
+    stem, extension = os.path.splitext(file_name)
+    pattern = re.compile(re.escape(stem) + time_suffix + re.escape(extension) + "$")
+    files = []
+    for name in names:
+        start = folder_time(name)
+        if start is None:
+            continue
+        for file in os.listdir(os.path.join(case_path, folder, name)):
+            match = pattern.match(file)
+            if match:
+                suffix = folder_time(match.group(1)[1:]) if match.group(1) else start
+                files.append((start, suffix, os.path.join(folder, name, file)))
+    return [path for _, _, path in sorted(files)]
+
+
+def stitch_segments(segments):
+    """
+    Join the column arrays read from consecutive time segments.
+
+    segments is a list of dicts of arrays in time order, each with a "time"
+    array; the other arrays share its first dimension. A restart recomputes
+    the steps after the last written time, so rows of a segment at or after
+    the first time of any later segment are dropped. Returns None if there
+    are no segments.
+    """
+    if not segments:
+        return None
+    non_empty = [segment for segment in segments if len(segment["time"])]
+    if len(non_empty) <= 1:
+        return non_empty[0] if non_empty else segments[0]
+    segments = non_empty
+
+    # First time of the segments that follow each segment
+    first_times = np.array([segment["time"][0] for segment in segments])
+    cutoffs = np.append(np.minimum.accumulate(first_times[::-1])[::-1][1:], np.inf)
+
+    lengths = [len(segment["time"]) for segment in segments]
+    times = np.concatenate([segment["time"] for segment in segments])
+    keep = times < np.repeat(cutoffs, lengths)
+    return {
+        name: np.concatenate([segment[name] for segment in segments])[keep]
+        for name in segments[0]
+    }
@@ -0,0 +1,58 @@
+import os
+import shutil
+
+STAGING_MODES = ("copy", "hardlink", "symlink")
+
+# Files modified for every case; these are always real copies
+CASE_FILES = (
+    "rodDict",
+    os.path.join("system", "controlDict"),
+    os.path.join("constant", "solverDict"),
+    os.path.join("0", "T"),
+)
+
+
+def link_file(src, dst, mode="hardlink"):
+    """Link dst to src, falling back to a copy if a hard link is not possible."""
+    if mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return dst
+    try:
+        os.link(src, dst)
+    except OSError:  # e.g. cross-device link
+        shutil.copy2(src, dst)
+    return dst
+
+
+def stage_case(base_case_folder, case_folder, mode="copy", case_files=CASE_FILES):
+    """
+    Create a case folder from the base case.
+
+    With mode "copy" the whole base case is copied. With "hardlink" or
+    "symlink" only `case_files` are copied and every other file is linked to
+    the base case, so staging a case costs a few inodes instead of a full copy.
+    Hard links fall back to a copy when the case folder is on another device.
+    Linking always saves disk space, but whether it is faster than copying
+    depends on the filesystem: measure with benchmarks/bench_staging.py.
+
+    Note that linked files are shared with the base case: they must only be
+    replaced (as `foam_dict` does), never modified in place.
+    """
+    if mode not in STAGING_MODES:
+        raise ValueError(
+            f"Unknown staging mode '{mode}', expected one of {STAGING_MODES}"
+        )
+
+    if mode == "copy":
+        shutil.copytree(base_case_folder, case_folder)
+        return
+
+    base_case_folder = os.path.abspath(base_case_folder)
+    case_files = {os.path.normpath(path) for path in case_files}
+
+    def link_or_copy(src, dst):
+        if os.path.relpath(src, base_case_folder) in case_files:
+            return shutil.copy2(src, dst)
+        return link_file(src, dst, mode)
+
+    shutil.copytree(base_case_folder, case_folder, copy_function=link_or_copy)
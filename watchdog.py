@@ -0,0 +1,167 @@
+import os
+import re
+import signal
+import threading
+import time
+
+time_pattern = re.compile(rb"^Time = ([-+.\deE]+)", re.MULTILINE)
+delta_t_pattern = re.compile(rb"^deltaT = ([-+.\deE]+)", re.MULTILINE)
+
+
+class WatchedCase:
+    """Progress of one running case, as read from its log file."""
+
+    def __init__(self, process, log_path, wall_time_budget, min_delta_t):
+        self.process = process
+        self.log_path = log_path
+        self.wall_time_budget = wall_time_budget
+        self.min_delta_t = min_delta_t
+        self.started_at = time.time()
+        self.log_offset = 0
+        self.sim_time = None
+        self.delta_t = None
+        self.last_progress = self.started_at  # Wall time the sim time last advanced
+        self.collapsed_since = None  # Wall time deltaT first collapsed
+        self.reason = None
+        self.terminated_at = None
+
+    def read_log(self):
+        """Read the lines appended to the log since the last check."""
+        try:
+            with open(self.log_path, "rb") as file:
+                file.seek(self.log_offset)
+                chunk = file.read()
+        except FileNotFoundError:
+            return
+        # Only consume complete lines
+        end = chunk.rfind(b"\n") + 1
+        self.log_offset += end
+        chunk = chunk[:end]
+
+        now = time.time()
+        times = time_pattern.findall(chunk)
+        if times:
+            sim_time = float(times[-1])
+            if self.sim_time is None or sim_time > self.sim_time:
+                self.last_progress = now
+            self.sim_time = sim_time
+        delta_ts = delta_t_pattern.findall(chunk)
+        if delta_ts:
+            self.delta_t = float(delta_ts[-1])
+
+
+class Watchdog:
+    """
+    Background thread that kills stalled or diverging cases.
+
+    Every `check_interval` seconds the log of each watched case is tailed
+    for its simulation time and deltaT. A case is killed when:
+    - its simulation time has not advanced for `stall_timeout` seconds;
+    - its deltaT has stayed below `collapse_factor * minDeltaT` for
+      `collapse_timeout` seconds;
+    - it has run longer than its wall time budget.
+    The whole process group of the case is sent SIGTERM, then SIGKILL after
+    `kill_grace` seconds.
+    """
+
+    def __init__(
+        self,
+        check_interval=30,
+        stall_timeout=1800,
+        collapse_factor=10,
+        collapse_timeout=600,
+        kill_grace=30,
+    ):
+        self.check_interval = check_interval
+        self.stall_timeout = stall_timeout
+        self.collapse_factor = collapse_factor
+        self.collapse_timeout = collapse_timeout
+        self.kill_grace = kill_grace
+        self.cases = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def watch(self, process, log_path, wall_time_budget, min_delta_t):
+        """
+        Start watching a process. It must have been started in its own
+        session (start_new_session=True) so the whole case can be killed.
+        """
+        with self.lock:
+            self.cases[process.pid] = WatchedCase(
+                process, log_path, wall_time_budget, min_delta_t
+            )
+
+    def unwatch(self, process):
+        """Stop watching a process. Returns why it was killed, or None."""
+        with self.lock:
+            case = self.cases.pop(process.pid, None)
+        return case.reason if case else None
+
+    def check_case(self, case):
+        """Return the reason to kill a case, or None if it is healthy."""
+        now = time.time()
+        case.read_log()
+
+        if now - case.started_at > case.wall_time_budget:
+            return f"wall time budget of {case.wall_time_budget:.0f} s exceeded"
+
+        if now - case.last_progress > self.stall_timeout:
+            return (
+                f"simulation time stalled at {case.sim_time} for "
+                f"{now - case.last_progress:.0f} s"
+            )
+
+        if (
+            case.delta_t is not None
+            and case.delta_t <= self.collapse_factor * case.min_delta_t
+        ):
+            if case.collapsed_since is None:
+                case.collapsed_since = now
+            elif now - case.collapsed_since > self.collapse_timeout:
+                return (
+                    f"deltaT collapsed to {case.delta_t} "
+                    f"(minDeltaT {case.min_delta_t})"
+                )
+        else:
+            case.collapsed_since = None
+
+        return None
+
+    def kill_all(self):
+        """Kill every watched case."""
+        with self.lock:
+            cases = list(self.cases.values())
+        for case in cases:
+            case.reason = "campaign interrupted"
+            case.terminated_at = time.time()
+            self.kill(case, signal.SIGKILL)
+
+    def kill(self, case, sig):
+        try:
+            os.killpg(case.process.pid, sig)
+        except ProcessLookupError:
+            pass  # Already finished
+
+    def _run(self):
+        while not self.stop_event.wait(self.check_interval):
+            with self.lock:
+                cases = list(self.cases.values())
+
+            for case in cases:
+                if case.reason is None:
+                    reason = self.check_case(case)
+                    if reason is not None:
+                        print(f"Watchdog: killing {case.log_path}: {reason}")
+                        case.reason = reason
+                        case.terminated_at = time.time()
+                        self.kill(case, signal.SIGTERM)
+                elif time.time() - case.terminated_at > self.kill_grace:
+                    self.kill(case, signal.SIGKILL)